@@ -0,0 +1,5 @@
+"""Замеры производительности на синтетических данных разного размера.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run --sizes 10 50 100 -o benchmarks/results/current.json
+"""
@@ -0,0 +1,113 @@
+"""Синтетические данные для замеров: N групп, M преподавателей, K аудиторий.
+
+Формат совпадает с файлом «💾 Сохранить», поэтому результат можно открыть
+в приложении или передать в python -m schedule_engine.
+"""
+import argparse
+import json
+import random
+from datetime import date
+
+from schedule_engine.constants import DAYS
+
+SUBJECTS = [
+    ('Математика', 'общий', 4), ('Русский язык', 'общий', 3), ('Литература', 'общий', 2),
+    ('Английский язык', 'общий', 3), ('История', 'общий', 2), ('Физика', 'общий', 3),
+    ('Информатика', 'основное', 3), ('Химия', 'основное', 2), ('Биология', 'основное', 2),
+    ('Экономика', 'дополнительное', 2), ('Черчение', 'дополнительное', 2), ('Физкультура', 'общий', 2),
+]
+GROUP_TYPES = ['основное', 'основное', 'основное', 'дополнительное']
+CAPACITIES = [15, 20, 25, 30, 35, 40]
+FIRST_BELL = 8 * 60
+LESSON_MINUTES = 45
+BREAK_MINUTES = 10
+
+
+def make_bell_schedule(lessons_per_day):
+    """'8:00-8:45,8:55-9:40,...' на lessons_per_day уроков"""
+    slots = []
+    start = FIRST_BELL
+    for _ in range(lessons_per_day):
+        end = start + LESSON_MINUTES
+        slots.append(f"{start // 60}:{start % 60:02d}-{end // 60}:{end % 60:02d}")
+        start = end + BREAK_MINUTES
+    return ','.join(slots)
+
+
+def make_dataset(n_groups, n_teachers=None, n_classrooms=None, weeks=2, days_per_week=5,
+                 lessons_per_day=6, seed=0):
+    """Данные учебного заведения заданного размера (одинаковые при одинаковом seed).
+
+    По умолчанию преподавателей в 1.6 раза больше групп, аудиторий — в 1.1
+    раза: при таком соотношении решатель размещает почти все часы, и замеры
+    отражают рабочую, а не вырожденную нагрузку.
+    """
+    rng = random.Random(seed)
+    n_teachers = n_teachers or max(4, int(n_groups * 1.6))
+    n_classrooms = n_classrooms or max(3, int(n_groups * 1.1))
+    subjects = [
+        {'id': i, 'name': name, 'group_type': group_type, 'hours_per_week': hours, 'description': ''}
+        for i, (name, group_type, hours) in enumerate(SUBJECTS, 1)
+    ]
+    groups = [
+        {'id': i, 'name': f"Г-{i}", 'type': rng.choice(GROUP_TYPES), 'students': rng.randint(12, 35),
+         'course': str(rng.randint(1, 4)), 'specialty': ''}
+        for i in range(1, n_groups + 1)
+    ]
+    work_days = DAYS[:days_per_week]
+    teachers = []
+    for i in range(1, n_teachers + 1):
+        # Каждый предмет ведут хотя бы два преподавателя, остальные — случайные
+        own = {SUBJECTS[(i - 1) % len(SUBJECTS)][0]} | {name for name, _, _ in rng.sample(SUBJECTS, 2)}
+        teachers.append({
+            'id': i,
+            'name': f"Преподаватель {i}",
+            'subject_hours': {name: rng.choice([36, 72, 108]) for name in sorted(own)},
+            'max_hours': rng.choice([18, 24, 30]),
+            'max_lessons_per_day': rng.choice([4, 5, 6]),
+            'forbidden_days': rng.choice(['', '', work_days[-1]]),
+            'preferred_days': ', '.join(rng.sample(work_days, 2)) if rng.random() < 0.3 else '',
+            'experience': rng.randint(0, 30),
+            'phone': '',
+            'email': '',
+        })
+    classrooms = [
+        {'id': i, 'name': str(100 + i), 'capacity': rng.choice(CAPACITIES), 'equipment': ''}
+        for i in range(1, n_classrooms + 1)
+    ]
+    settings = {
+        'days_per_week': days_per_week,
+        'lessons_per_day': lessons_per_day,
+        'weeks': weeks,
+        'start_date': date(2025, 9, 1).isoformat(),
+        'bell_schedule': make_bell_schedule(lessons_per_day),
+        'school_name': 'Синтетический колледж',
+        'academic_year': '2025-2026',
+    }
+    return {
+        'settings': settings,
+        'groups': groups,
+        'teachers': teachers,
+        'classrooms': classrooms,
+        'subjects': subjects,
+        'holidays': [],
+        'substitutions': [],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синтетические данные для замеров')
+    parser.add_argument('groups', type=int, help='Число групп')
+    parser.add_argument('-o', '--output', required=True, help='Путь к JSON-файлу')
+    parser.add_argument('--teachers', type=int, default=None)
+    parser.add_argument('--classrooms', type=int, default=None)
+    parser.add_argument('--weeks', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    data = make_dataset(args.groups, args.teachers, args.classrooms, weeks=args.weeks, seed=args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""Замеры горячих путей генерации, фильтрации, отчетов и сохранения.
+
+Для каждого размера строятся синтетические данные (benchmarks.datagen),
+каждая операция выполняется --repeat раз, в JSON пишутся лучшее и медианное
+время. Операции движка замеряются всегда; методы окна PyQt5
+(filter_schedule, update_reports, ...) — если установлены PyQt5 и openpyxl,
+на платформе offscreen с подмененными диалогами.
+
+Сравнение с прошлым прогоном:
+    python -m benchmarks.run --sizes 10 50 100 -o new.json --compare old.json
+код возврата 1, если какая-то операция стала медленнее порога --threshold.
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import schedule_engine as engine
+from benchmarks.datagen import make_dataset
+
+DEFAULT_SIZES = [10, 50, 100]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25
+
+
+class BenchmarkError(Exception):
+    """Метод приложения сообщил об ошибке через QMessageBox.critical"""
+
+
+def measure(func, repeat, setup=None):
+    """Время func(setup()) по repeat запускам; setup не входит в замер"""
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return {'best': round(min(times), 6), 'median': round(statistics.median(times), 6), 'runs': repeat}
+
+
+def bench_engine(data, repeat, workdir):
+    """Операции движка без графического интерфейса"""
+    results = {}
+    structure = engine.create_schedule_structure(data)
+    results['create_schedule_structure'] = measure(lambda _: engine.create_schedule_structure(data), repeat)
+
+    results['assign_subjects_to_groups'] = measure(
+        lambda schedule: engine.assign_subjects_to_groups(schedule, data, rng=random.Random(0)),
+        repeat, setup=structure.copy)
+
+    with_subjects = engine.assign_subjects_to_groups(structure.copy(), data, rng=random.Random(0))
+    results['assign_teachers_and_classrooms'] = measure(
+        lambda schedule: engine.assign_teachers_and_classrooms(schedule, data, rng=random.Random(0)),
+        repeat, setup=with_subjects.copy)
+
+    results['generate_schedule[solver]'] = measure(
+        lambda _: engine.generate_schedule(data, seed=0, mode='solver'), repeat)
+
+    schedule = engine.generate_schedule(data, seed=0, mode='solver')
+    results['check_conflicts'] = measure(lambda _: engine.find_conflicts(schedule), repeat)
+
+    path = os.path.join(workdir, 'engine_state.json')
+
+    def save(_):
+        state = dict(data, schedule=engine.schedule_to_records(schedule))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def load(_):
+        state = engine.load_state(path)
+        engine.schedule_from_json(state.get('schedule', []), state.get('settings'))
+
+    results['save_state'] = measure(save, repeat)
+    results['load_state'] = measure(load, repeat)
+    return results, schedule
+
+
+class QtHarness:
+    """Окно ScheduleApp на платформе offscreen; диалоги заменены заглушками.
+
+    Файловые диалоги возвращают open_path/save_path, вопросы — «Да»,
+    QMessageBox.critical выбрасывает BenchmarkError, чтобы ошибка не
+    превратилась в быстрый, но бессмысленный замер.
+    """
+
+    def __init__(self, workdir):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        # Бэкапы и архив приложения пишутся в ~/AppData — уводим их во временный каталог
+        os.environ['HOME'] = workdir
+        from PyQt5.QtWidgets import QApplication, QFileDialog, QInputDialog, QMessageBox
+        import schedule_app_qt
+
+        self.open_path = ''
+        self.save_path = ''
+        harness = self
+
+        def critical(*args, **kwargs):
+            raise BenchmarkError(args[2] if len(args) > 2 else 'critical')
+
+        QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.Ok)
+        QMessageBox.warning = staticmethod(lambda *a, **k: QMessageBox.Ok)
+        QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.Yes)
+        QMessageBox.critical = staticmethod(critical)
+        QFileDialog.getOpenFileName = staticmethod(lambda *a, **k: (harness.open_path, ''))
+        QFileDialog.getSaveFileName = staticmethod(lambda *a, **k: (harness.save_path, ''))
+        QInputDialog.getInt = staticmethod(lambda *a, **k: (1, False))
+
+        self.qapp = QApplication.instance() or QApplication([])
+        self.window = schedule_app_qt.ScheduleApp()
+        if self.window.backup_timer is not None:
+            self.window.backup_timer.stop()
+
+
+def bench_app(data, schedule, repeat, workdir):
+    """Методы окна PyQt5 на тех же данных; {'skipped': причина}, если окно не создать"""
+    try:
+        harness = QtHarness(workdir)
+    except ImportError as e:
+        return {'skipped': f"нет зависимости: {e.name}"}
+    window = harness.window
+    cwd = os.getcwd()
+    # Относительные пути приложения — во временный каталог
+    os.chdir(workdir)
+    try:
+        harness.open_path = os.path.join(workdir, 'app_state.json')
+        with open(harness.open_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(data, schedule=engine.schedule_to_records(schedule)), f, ensure_ascii=False)
+        results = {'load_data': measure(lambda _: window.load_data(), repeat)}
+        results['filter_schedule'] = measure(lambda _: window.filter_schedule(), repeat)
+        results['update_reports'] = measure(lambda _: window.update_reports(), repeat)
+        results['check_conflicts'] = measure(lambda _: window.check_conflicts(), repeat)
+        # Время главного потока и время до окончания фоновой записи снимка
+        results['create_backup'] = measure(lambda _: window.create_backup(snapshot=True), repeat)
+        results['create_backup+flush'] = measure(
+            lambda _: (window.create_backup(snapshot=True), window.backup_writer.flush()), repeat)
+        harness.save_path = os.path.join(workdir, 'export.xlsx')
+        results['export_to_excel'] = measure(lambda _: window.export_to_excel(), repeat)
+        return results
+    finally:
+        os.chdir(cwd)
+
+
+def run(sizes, repeat, weeks, with_app=True):
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'results': [],
+    }
+    for size in sizes:
+        data = make_dataset(size, weeks=weeks, seed=size)
+        with tempfile.TemporaryDirectory(prefix='schedule_bench_') as workdir:
+            engine_results, schedule = bench_engine(data, repeat, workdir)
+            entry = {
+                'groups': size,
+                'teachers': len(data['teachers']),
+                'classrooms': len(data['classrooms']),
+                'weeks': weeks,
+                'rows': len(schedule),
+                'engine': engine_results,
+            }
+            if with_app:
+                entry['app'] = bench_app(copy.deepcopy(data), schedule, repeat, workdir)
+        report['results'].append(entry)
+        print_entry(entry)
+    return report
+
+
+def print_entry(entry):
+    print(f"== {entry['groups']} групп, {entry['rows']} строк расписания")
+    for section in ('engine', 'app'):
+        timings = entry.get(section)
+        if not timings:
+            continue
+        if 'skipped' in timings:
+            print(f"  {section}: пропущено ({timings['skipped']})")
+            continue
+        for name, timing in timings.items():
+            print(f"  {section}.{name:<32} {timing['best'] * 1000:10.1f} мс")
+
+
+def compare(report, baseline, threshold):
+    """Операции, ставшие медленнее baseline более чем в threshold раз"""
+    old = {}
+    for entry in baseline.get('results', []):
+        for section in ('engine', 'app'):
+            for name, timing in entry.get(section, {}).items():
+                if isinstance(timing, dict):
+                    old[(entry['groups'], section, name)] = timing['best']
+    regressions = []
+    for entry in report['results']:
+        for section in ('engine', 'app'):
+            for name, timing in entry.get(section, {}).items():
+                before = old.get((entry['groups'], section, name))
+                if not isinstance(timing, dict) or not before:
+                    continue
+                ratio = timing['best'] / before
+                if ratio > threshold:
+                    regressions.append((entry['groups'], f"{section}.{name}", before, timing['best'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description='Замеры производительности расписания')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Размеры (число групп)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Запусков на операцию')
+    parser.add_argument('--weeks', type=int, default=2, help='Недель в расписании')
+    parser.add_argument('--no-app', action='store_true', help='Не замерять методы окна PyQt5')
+    parser.add_argument('-o', '--output', default=None, help='Куда сохранить результаты (JSON)')
+    parser.add_argument('--compare', default=None, help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Во сколько раз операция может замедлиться без ошибки')
+    args = parser.parse_args(argv)
+    # Предупреждения генератора о неразмещенных часах не относятся к замерам
+    logging.basicConfig(level=logging.ERROR)
+
+    report = run(args.sizes, args.repeat, args.weeks, with_app=not args.no_app)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for groups, name, before, after, ratio in regressions:
+            print(f"Замедление: {name} ({groups} групп) {before * 1000:.1f} → {after * 1000:.1f} мс (x{ratio:.2f})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
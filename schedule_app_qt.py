@@ -1,18 +1,16 @@
 import sys
+import copy
 import json
 import os
-import random
 import shutil
-import zipfile
-import itertools
 from datetime import datetime, timedelta
 from pathlib import Path
 import pandas as pd
 import openpyxl
 from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QSortFilterProxyModel, QModelIndex
-from PyQt5.QtGui import QFont, QIcon, QColor, QPalette, QStandardItemModel, QStandardItem
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QSortFilterProxyModel, QModelIndex, QAbstractTableModel
+from PyQt5.QtGui import QFont, QIcon, QColor, QPalette, QKeySequence
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QLabel, QPushButton,
@@ -20,10 +18,11 @@ from PyQt5.QtWidgets import (
     QDialog, QLineEdit, QFormLayout, QDialogButtonBox, QGroupBox, QScrollArea,
     QTreeView, QTableView, QAbstractItemView, QMenu, QAction, QDateEdit, QCalendarWidget,
     QFrame, QSizePolicy, QCheckBox, QSpinBox, QDoubleSpinBox, QMenuBar, QToolBar,
-    QTextEdit, QListWidget, QListWidgetItem, QInputDialog
+    QTextEdit, QListWidget, QListWidgetItem, QInputDialog, QStyledItemDelegate, QStyleOptionViewItem
 )
 import calendar
 from datetime import datetime as dt_datetime
+import schedule_engine as engine
 
 COLORS = {
     'primary': '#4a6fa5',
@@ -194,6 +193,141 @@ class TimeSortProxyModel(QSortFilterProxyModel):
         except ValueError:
             return left_data < right_data
 
+
+class ScheduleTableModel(QAbstractTableModel):
+    """Сетка недели (пары × дни) поверх engine.ScheduleGrid.
+
+    Ячейки не хранятся объектами: show() берет у раскладки позиции строк
+    недели с учетом фильтров и читает поля только этих строк. Если набор пар
+    и дней не изменился, модель не сбрасывается, а dataChanged отправляется
+    только для изменившихся ячеек.
+    """
+    STATUS_COLORS = {engine.STATUS_CONFIRMED: QColor('#d4edda'), engine.STATUS_PLANNED: QColor('#fff3cd')}
+    OTHER_COLOR = QColor('#999999')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.grid = None
+        self.headers = ['Время'] + engine.DAYS
+        self.times = []
+        self.cells = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.times)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self.headers):
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.column() == 0:
+            return self.times[index.row()] if role == Qt.DisplayRole else None
+        lesson = self.cells.get((index.row(), index.column()))
+        if lesson is None:
+            return None
+        subject, teacher, classroom, status = lesson
+        if role == Qt.DisplayRole:
+            return f"{subject}\n{teacher}\n{classroom}"
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.BackgroundRole:
+            return self.STATUS_COLORS.get(status, self.OTHER_COLOR)
+        return None
+
+    def show(self, schedule, week, days, group=None, teacher=None, classroom=None):
+        """Показывает неделю week; True — если модель сброшена (другие пары или дни)"""
+        if self.grid is None or self.grid.schedule is not schedule:
+            self.grid = engine.ScheduleGrid(schedule)
+        times, positions = self.grid.cells(week, len(days), group, teacher, classroom, busy_first=True)
+        # Столбец 0 — время, дни начинаются с 1
+        cells = {(row, day + 1): lesson for (row, day), lesson in self.grid.lessons(positions).items()}
+        headers = ['Время'] + list(days)
+        if times != self.times or headers != self.headers:
+            self.beginResetModel()
+            self.times, self.headers, self.cells = times, headers, cells
+            self.endResetModel()
+            return True
+        changed = [cell for cell in set(cells) | set(self.cells) if cells.get(cell) != self.cells.get(cell)]
+        self.cells = cells
+        for row, col in changed:
+            index = self.index(row, col)
+            self.dataChanged.emit(index, index)
+        return False
+
+def _hours_lines(hours):
+    """'Предмет: N ч' по строке на предмет или '—'"""
+    return "\n".join(f"{subject}: {count} ч" for subject, count in hours.items()) or "—"
+
+
+class TeachersTableModel(QAbstractTableModel):
+    """Вкладка «Преподаватели»: строки — self.teachers, факт — из engine.LoadLedger"""
+    HEADERS = [
+        'ID', 'ФИО',
+        'План по предметам', 'Макс. часов',
+        'Квалификация', 'Стаж',
+        'План всего', 'Факт всего',
+        'Факт по предметам', 'Остаток часов', 'Свободных часов'
+    ]
+    MULTILINE_COLUMNS = (2, 8)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return self.rows[index.row()][index.column()]
+        return None
+
+    def set_teachers(self, teachers, fact_hours):
+        """Пересчитывает строки: fact_hours — {id: {предмет: часы}} для всех преподавателей сразу"""
+        self.beginResetModel()
+        self.rows = [self._row(teacher, fact_hours.get(teacher['id'], {})) for teacher in teachers]
+        self.endResetModel()
+
+    @staticmethod
+    def _row(teacher, fact_by_subject):
+        subject_hours = teacher.get('subject_hours', {}) or {}
+        plan_total = sum(subject_hours.values())
+        fact_total = sum(fact_by_subject.values())
+        remaining = max(0, plan_total - fact_total)
+        return [
+            str(teacher['id']), teacher['name'],
+            _hours_lines(subject_hours), str(teacher.get('max_hours', 0)),
+            teacher.get('qualification', ''), str(teacher.get('experience', 0)),
+            str(plan_total), str(fact_total),
+            _hours_lines(fact_by_subject), str(remaining), str(remaining)
+        ]
+
+    def teacher_id(self, row):
+        return int(self.rows[row][0])
+
+
+class MultilineDelegate(QStyledItemDelegate):
+    """Многострочные ячейки (по строке на предмет) с выравниванием по верху — без QLabel в каждой ячейке"""
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        option.displayAlignment = Qt.AlignLeft | Qt.AlignTop
+        option.features |= QStyleOptionViewItem.WrapText
+
 # ========================
 # УНИВЕРСАЛЬНЫЙ ДИАЛОГ
 # ========================
@@ -252,7 +386,92 @@ class BaseEntityDialog(QDialog):
         return result
 
 
+class GenerationWorker(QThread):
+    """Генерация расписания в фоновом потоке.
+
+    Работает со снимком данных и не трогает расписание главного окна:
+    готовый DataFrame передается сигналом schedule_ready и подменяется
+    целиком в слоте главного потока.
+    """
+    progress = pyqtSignal(int, int)
+    schedule_ready = pyqtSignal(object, object)  # расписание, зерно лучшего запуска (или None)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, data, mode, restarts, parent=None):
+        super().__init__(parent)
+        self.data = data
+        self.mode = mode
+        self.restarts = restarts
+
+    def run(self):
+        try:
+            if self.restarts > 1:
+                result = engine.best_of_n(self.data, self.restarts, mode=self.mode,
+                                          progress=self.progress.emit, cancel=self.isInterruptionRequested)
+                schedule, seed = result.schedule, result.seed
+            else:
+                schedule = engine.generate_schedule(self.data, mode=self.mode,
+                                                    progress=self.progress.emit, cancel=self.isInterruptionRequested)
+                seed = None
+        except engine.GenerationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.schedule_ready.emit(schedule, seed)
+
+
+class OptimizationWorker(QThread):
+    """Локальный поиск по копии расписания в фоновом потоке"""
+    progress = pyqtSignal(int, int)  # лучшая стоимость, процент бюджета времени
+    result_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, schedule, data, time_limit, parent=None):
+        super().__init__(parent)
+        self.schedule = schedule
+        self.data = data
+        self.time_limit = time_limit
+
+    def run(self):
+        try:
+            result = engine.optimize_schedule(
+                self.schedule, self.data, time_limit=self.time_limit,
+                progress=lambda cost, fraction: self.progress.emit(int(cost), int(fraction * 100)),
+                cancel=self.isInterruptionRequested)
+        except engine.GenerationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.result_ready.emit(result)
+
+
+class ArchiveCatalogWorker(QThread):
+    """Дочитывает сводки новых архивов в каталог, не блокируя вкладку «Архив»"""
+    catalog_ready = pyqtSignal(int)  # сколько файлов разобрано
+
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent)
+        self.catalog = catalog
+
+    def run(self):
+        try:
+            parsed = self.catalog.refresh()
+        except Exception:
+            parsed = 0
+        self.catalog_ready.emit(parsed)
+
+
 class ScheduleApp(QMainWindow):
+    # Сигналы потока записи бэкапов (engine.BackupWriter) в главный поток
+    backup_written = pyqtSignal(object)
+    backup_failed = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("🎓 Система автоматического составления расписания")
@@ -270,15 +489,23 @@ class ScheduleApp(QMainWindow):
             'backup_interval': 30,
             'max_backups': 10,
             'last_academic_year_update': datetime.now().year,
+            'generation_mode': 'solver',
+            'generation_restarts': 1,
+            'storage_backend': 'json',
+            'backup_format': 'zip',
+            'backup_compression': 6,
+            'archive_format': 'json',
             'bell_schedule': '8:00-8:45,8:55-9:40,9:50-10:35,10:45-11:30,11:40-12:25,12:35-13:20'
         }
-        self.groups = []
-        self.teachers = []
-        self.classrooms = []
-        self.subjects = []
+        self.groups = engine.EntityRegistry()
+        self.teachers = engine.EntityRegistry()
+        self.classrooms = engine.EntityRegistry()
+        self.subjects = engine.EntityRegistry()
         self.schedule = pd.DataFrame()
         self.substitutions = []
         self.holidays = []
+        self.engine_worker = None
+        self._optimize_source = None
         self.backup_timer = None
         self.last_backup_time = None
         self.next_backup_time = None
@@ -288,11 +515,47 @@ class ScheduleApp(QMainWindow):
         self.archive_dir = Path.home() / "AppData" / "Local" / "ScheduleApp" / "schedule_archive"
         if not self.archive_dir.exists():
             self.archive_dir.mkdir(parents=True, exist_ok=True)
+        # Сводки архивов для вкладки «Архив» (catalog.json в archive_dir)
+        self.archive_catalog = engine.ArchiveCatalog(self.archive_dir)
+        self.catalog_worker = None
+        # Необязательное хранилище SQLite (настройка 'storage_backend')
+        self.db_path = self.backup_dir.parent / "schedule.db"
+        self.store = None
+        self._stored_schedule = None
+        # Снимки и журнал правок пишутся в фоновом потоке
+        self.backup_written.connect(self._on_backup_written)
+        self.backup_failed.connect(self._on_backup_failed)
+        self.backup_writer = engine.BackupWriter(on_written=self.backup_written.emit,
+                                                 on_error=self.backup_failed.emit)
+        self._journaled_schedule = None
+        # Отмена и повтор правок (Ctrl+Z / Ctrl+Y); шаг закрывается в create_backup
+        self.history = engine.EditHistory()
+        # Счетчики подтвержденных занятий преподавателей, обновляются в _set_lesson/_clear_lesson
+        self.load_ledger = engine.LoadLedger()
+        # Данные отчетов пересчитываются только после изменения расписания
+        self.report_cache = engine.ReportCache()
+        self._shown_reports = None
+        # Обработчики правок только отмечают устаревшие представления (self.refresh.mark)
+        self.refresh = engine.RefreshScheduler(lambda callback: QTimer.singleShot(0, callback))
         self.create_widgets()
-        self.load_data()
+        self._register_views()
+        if not self._open_store():
+            self.load_data()
         self.start_auto_backup()
         self.check_and_update_experience()
 
+    def _register_views(self):
+        """Представления для self.refresh; номера вкладок — как в create_widgets"""
+        self.refresh.current_tab = self.notebook.currentIndex
+        # Список преподавателей нужен и фильтру на вкладке «Расписание»
+        self.refresh.register('teachers', self.load_teachers_data, tabs=(1, 4))
+        self.refresh.register('grid', self.filter_schedule, tabs=(4,))
+        self.refresh.register('reports', self.update_reports, tabs=(5,))
+        self.refresh.register('archive', self.load_archive_list, tabs=(7,))
+        # Бэкап закрывает шаг отмены, поэтому идет последним и не зависит от вкладки
+        self.refresh.register('backup', self.create_backup)
+        self.notebook.currentChanged.connect(self.refresh.tab_changed)
+
     # ========================
     # УНИВЕРСАЛЬНЫЕ МЕТОДЫ
     # ========================
@@ -314,7 +577,7 @@ class ScheduleApp(QMainWindow):
         entity_id = int(tree_widget.item(row, id_column).text())
         if QMessageBox.question(self, "Подтверждение", f"Удалить {entity_name}?") == QMessageBox.Yes:
             entity_list[:] = [e for e in entity_list if e['id'] != entity_id]
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def open_entity_dialog(self, title, fields, data=None, validate_fn=None):
         dialog = BaseEntityDialog(self, title, fields, data)
@@ -346,6 +609,15 @@ class ScheduleApp(QMainWindow):
         file_menu.addAction(settings_action)
         file_menu.addAction(backup_action)
         file_menu.addAction(about_action)
+        edit_menu = menubar.addMenu("Правка")
+        undo_action = QAction("↩️ Отменить", self)
+        undo_action.setShortcut(QKeySequence.Undo)
+        undo_action.triggered.connect(self.undo)
+        redo_action = QAction("↪️ Повторить", self)
+        redo_action.setShortcuts([QKeySequence("Ctrl+Y"), QKeySequence(QKeySequence.Redo)])
+        redo_action.triggered.connect(self.redo)
+        edit_menu.addAction(undo_action)
+        edit_menu.addAction(redo_action)
         help_menu = menubar.addMenu("Помощь")
         check_update_action = QAction("🔄 Проверить обновления", self)
         check_update_action.triggered.connect(self.check_for_updates)
@@ -417,11 +689,17 @@ class ScheduleApp(QMainWindow):
 
         main_layout.addWidget(buttons_frame)
 
-        # Индикатор прогресса
+        # Индикатор прогресса и отмена генерации
+        progress_layout = QHBoxLayout()
         self.progress = QProgressBar()
         self.progress.setRange(0, 0)
         self.progress.hide()
-        main_layout.addWidget(self.progress)
+        progress_layout.addWidget(self.progress, 1)
+        self.cancel_generation_btn = QPushButton("✖ Отмена")
+        self.cancel_generation_btn.clicked.connect(self.cancel_generation)
+        self.cancel_generation_btn.hide()
+        progress_layout.addWidget(self.cancel_generation_btn)
+        main_layout.addLayout(progress_layout)
 
         # Вкладки
         self.notebook = QTabWidget()
@@ -487,14 +765,12 @@ class ScheduleApp(QMainWindow):
         btn_layout.addWidget(recalculate_btn)
         btn_layout.addStretch()
         layout.addWidget(btn_frame)
-        self.teachers_tree = QTableWidget(0, 11)
-        self.teachers_tree.setHorizontalHeaderLabels([
-            'ID', 'ФИО',
-            'План по предметам', 'Макс. часов',
-            'Квалификация', 'Стаж',
-            'План всего', 'Факт всего',
-            'Факт по предметам', 'Остаток часов', 'Свободных часов'
-        ])
+        self.teachers_model = TeachersTableModel(self)
+        self.teachers_tree = QTableView()
+        self.teachers_tree.setModel(self.teachers_model)
+        self.teachers_delegate = MultilineDelegate(self.teachers_tree)
+        for column in TeachersTableModel.MULTILINE_COLUMNS:
+            self.teachers_tree.setItemDelegateForColumn(column, self.teachers_delegate)
         self.teachers_tree.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.teachers_tree.setSelectionBehavior(QAbstractItemView.SelectRows)
         layout.addWidget(self.teachers_tree, 1)
@@ -593,7 +869,8 @@ class ScheduleApp(QMainWindow):
             ("📅 Календарь", self.show_calendar),
             ("🌐 Экспорт на сайт", self.export_to_website),
             ("⏱️ Найти свободное время", self.find_free_slot),
-            ("➡️ Перенести занятие", self.reschedule_lesson)
+            ("➡️ Перенести занятие", self.reschedule_lesson),
+            ("♻️ Перегенерировать часть", self.regenerate_partial)
         ]
         for text, command in buttons:
             btn = QPushButton(text)
@@ -601,10 +878,10 @@ class ScheduleApp(QMainWindow):
             buttons_layout.addWidget(btn)
         buttons_layout.addStretch()
         layout.addWidget(schedule_buttons_frame)
-        self.schedule_model = QStandardItemModel()
-        self.schedule_model.setHorizontalHeaderLabels(['Время', 'Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'])
+        self.schedule_model = ScheduleTableModel(self)
         self.schedule_proxy_model = TimeSortProxyModel(self)
         self.schedule_proxy_model.setSourceModel(self.schedule_model)
+        self.schedule_proxy_model.sort(0, Qt.AscendingOrder)
         self.schedule_view = QTableView()
         self.schedule_view.setModel(self.schedule_proxy_model)
         self.schedule_view.setColumnWidth(0, 100)
@@ -733,7 +1010,7 @@ class ScheduleApp(QMainWindow):
             data['id'] = new_id
             self.groups.append(data)
             self.load_groups_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def edit_group(self):
         selected = self.groups_tree.selectedItems()
@@ -741,7 +1018,7 @@ class ScheduleApp(QMainWindow):
             return
         row = selected[0].row()
         group_id = int(self.groups_tree.item(row, 0).text())
-        group = next((g for g in self.groups if g['id'] == group_id), None)
+        group = self.groups.by_id(group_id)
         if not group:
             return
         fields = [
@@ -754,8 +1031,9 @@ class ScheduleApp(QMainWindow):
         data = self.open_entity_dialog("Редактировать группу", fields, data=group, validate_fn=lambda d: bool(d.get('name')))
         if data:
             group.update(data)
+            self.groups.touch()
             self.load_groups_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def delete_group(self):
         self.delete_entity(self.groups, self.groups_tree, entity_name="группу")
@@ -788,7 +1066,7 @@ class ScheduleApp(QMainWindow):
             data['id'] = new_id
             self.classrooms.append(data)
             self.load_classrooms_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def edit_classroom(self):
         selected = self.classrooms_tree.selectedItems()
@@ -796,7 +1074,7 @@ class ScheduleApp(QMainWindow):
             return
         row = selected[0].row()
         classroom_id = int(self.classrooms_tree.item(row, 0).text())
-        classroom = next((c for c in self.classrooms if c['id'] == classroom_id), None)
+        classroom = self.classrooms.by_id(classroom_id)
         if not classroom:
             return
         fields = [
@@ -809,8 +1087,9 @@ class ScheduleApp(QMainWindow):
         data = self.open_entity_dialog("Редактировать аудиторию", fields, data=classroom, validate_fn=lambda d: bool(d.get('name')))
         if data:
             classroom.update(data)
+            self.classrooms.touch()
             self.load_classrooms_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def delete_classroom(self):
         self.delete_entity(self.classrooms, self.classrooms_tree, entity_name="аудиторию")
@@ -844,7 +1123,7 @@ class ScheduleApp(QMainWindow):
             data['id'] = new_id
             self.subjects.append(data)
             self.load_subjects_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def edit_subject(self):
         selected = self.subjects_tree.selectedItems()
@@ -852,7 +1131,7 @@ class ScheduleApp(QMainWindow):
             return
         row = selected[0].row()
         subject_id = int(self.subjects_tree.item(row, 0).text())
-        subject = next((s for s in self.subjects if s['id'] == subject_id), None)
+        subject = self.subjects.by_id(subject_id)
         if not subject:
             return
         fields = [
@@ -866,8 +1145,9 @@ class ScheduleApp(QMainWindow):
         data = self.open_entity_dialog("Редактировать предмет", fields, data=subject, validate_fn=lambda d: bool(d.get('name')))
         if data:
             subject.update(data)
+            self.subjects.touch()
             self.load_subjects_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def delete_subject(self):
         self.delete_entity(self.subjects, self.subjects_tree, entity_name="предмет")
@@ -883,63 +1163,9 @@ class ScheduleApp(QMainWindow):
     # ПРЕПОДАВАТЕЛИ — ЗАГРУЗКА ДАННЫХ
     # ========================
     def load_teachers_data(self):
-        self.teachers_tree.setRowCount(0)
-        for teacher in self.teachers:
-            row = self.teachers_tree.rowCount()
-            self.teachers_tree.insertRow(row)
-            
-            # ID и ФИО
-            self.teachers_tree.setItem(row, 0, QTableWidgetItem(str(teacher['id'])))
-            self.teachers_tree.setItem(row, 1, QTableWidgetItem(teacher['name']))
-            
-            # План по предметам (многострочный с <br>)
-            subject_hours = teacher.get('subject_hours', {})
-            plan_subjects_str = ""
-            for subj, hours in subject_hours.items():
-                plan_subjects_str += f"{subj}: {hours} ч<br>"
-            if not plan_subjects_str:
-                plan_subjects_str = "—"
-            plan_label = QLabel(plan_subjects_str)
-            plan_label.setWordWrap(True)
-            plan_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
-            self.teachers_tree.setCellWidget(row, 2, plan_label)
-            
-            # Макс. часов
-            max_hours = teacher.get('max_hours', 0)
-            self.teachers_tree.setItem(row, 3, QTableWidgetItem(str(max_hours)))
-            
-            # Квалификация и Стаж
-            qualification = teacher.get('qualification', '')
-            experience = teacher.get('experience', 0)
-            self.teachers_tree.setItem(row, 4, QTableWidgetItem(qualification))
-            self.teachers_tree.setItem(row, 5, QTableWidgetItem(str(experience)))
-            
-            # Расчет нагрузки
-            load_info = self.calculate_teacher_load(teacher['id'])
-            plan_total = load_info['plan']
-            fact_total = load_info['fact']
-            remaining = load_info['remaining']
-            
-            self.teachers_tree.setItem(row, 6, QTableWidgetItem(str(plan_total)))
-            self.teachers_tree.setItem(row, 7, QTableWidgetItem(str(fact_total)))
-            
-            # Факт по предметам (многострочный с <br>)
-            fact_subjects_str = ""
-            fact_by_subject = load_info['fact_by_subject']
-            if fact_total > 0 and fact_by_subject:
-                for subj, count in fact_by_subject.items():
-                    fact_subjects_str += f"{subj}: {count} ч<br>"
-            if not fact_subjects_str:
-                fact_subjects_str = "—"
-            fact_label = QLabel(fact_subjects_str)
-            fact_label.setWordWrap(True)
-            fact_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
-            self.teachers_tree.setCellWidget(row, 8, fact_label)
-            
-            # Остаток и Свободных часов
-            self.teachers_tree.setItem(row, 9, QTableWidgetItem(str(remaining)))
-            self.teachers_tree.setItem(row, 10, QTableWidgetItem(str(remaining)))
-        
+        # Факт всех преподавателей — из счетчиков журнала нагрузки, без прохода по расписанию
+        self.teachers_model.set_teachers(self.teachers, self._teacher_loads().fact_hours())
+
         # Обновление фильтра преподавателей
         self.teacher_filter_var.clear()
         self.teacher_filter_var.addItem("")
@@ -965,51 +1191,37 @@ class ScheduleApp(QMainWindow):
     # АРХИВ — ЗАГРУЗКА ДАННЫХ
     # ========================
     def load_archive_list(self):
+        """Список архива по каталогу сводок; неразобранные файлы дочитываются в фоне"""
         self.archive_tree.setRowCount(0)
         try:
-            archive_files = [f for f in os.listdir(self.archive_dir) if f.endswith('.json')]
-            archive_files.sort(key=lambda x: os.path.getmtime(os.path.join(self.archive_dir, x)), reverse=True)
-            
-            for filename in archive_files:
-                filepath = os.path.join(self.archive_dir, filename)
-                stat = os.stat(filepath)
-                creation_time = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-                
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    groups_count = len(data.get('groups', []))
-                    teachers_count = len(data.get('teachers', []))
-                    classrooms_count = len(data.get('classrooms', []))
-                    subjects_count = len(data.get('subjects', []))
-                    
-                    # Правильно считаем количество занятий
-                    schedule = data.get('schedule', [])
-                    lessons_count = len([s for s in schedule if s.get('status') in ['подтверждено', 'запланировано']])
-                    
-                    row = self.archive_tree.rowCount()
-                    self.archive_tree.insertRow(row)
-                    self.archive_tree.setItem(row, 0, QTableWidgetItem(filename))
-                    self.archive_tree.setItem(row, 1, QTableWidgetItem(creation_time))
-                    self.archive_tree.setItem(row, 2, QTableWidgetItem(str(groups_count)))
-                    self.archive_tree.setItem(row, 3, QTableWidgetItem(str(teachers_count)))
-                    self.archive_tree.setItem(row, 4, QTableWidgetItem(str(classrooms_count)))
-                    self.archive_tree.setItem(row, 5, QTableWidgetItem(str(subjects_count)))
-                    self.archive_tree.setItem(row, 6, QTableWidgetItem(str(lessons_count)))
-                    
-                except Exception as e:
-                    # Упрощенная обработка ошибок
-                    row = self.archive_tree.rowCount()
-                    self.archive_tree.insertRow(row)
-                    self.archive_tree.setItem(row, 0, QTableWidgetItem(filename))
-                    self.archive_tree.setItem(row, 1, QTableWidgetItem(creation_time))
-                    for i in range(2, 7):
-                        self.archive_tree.setItem(row, i, QTableWidgetItem("Ошибка"))
-                        
+            pending = False
+            for filename, mtime, summary in self.archive_catalog.entries():
+                creation_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+                row = self.archive_tree.rowCount()
+                self.archive_tree.insertRow(row)
+                self.archive_tree.setItem(row, 0, QTableWidgetItem(filename))
+                self.archive_tree.setItem(row, 1, QTableWidgetItem(creation_time))
+                if summary is None:
+                    pending = True
+                    values = ["…"] * 5
+                elif 'error' in summary:
+                    values = ["Ошибка"] * 5
+                else:
+                    values = [summary['groups'], summary['teachers'], summary['classrooms'], summary['subjects'],
+                              engine.lessons_count(summary, ['подтверждено', 'запланировано'])]
+                for col, value in enumerate(values, 2):
+                    self.archive_tree.setItem(row, col, QTableWidgetItem(str(value)))
+            if pending and (self.catalog_worker is None or not self.catalog_worker.isRunning()):
+                self.catalog_worker = ArchiveCatalogWorker(self.archive_catalog, self)
+                self.catalog_worker.catalog_ready.connect(self._on_archive_catalog_ready)
+                self.catalog_worker.start()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки списка архива: {e}")
 
+    def _on_archive_catalog_ready(self, parsed):
+        if parsed:
+            self.refresh.mark('archive')
+
     # ========================
     # ОСТАЛЬНЫЕ МЕТОДЫ (БЕЗ ИЗМЕНЕНИЙ)
     # ========================
@@ -1029,7 +1241,7 @@ class ScheduleApp(QMainWindow):
             if 'experience' not in teacher:
                 teacher['experience'] = 0
         
-        self.load_teachers_data()
+        self.refresh.mark('teachers')
         QMessageBox.information(self, "Успех", "Данные преподавателей исправлены")
 
     def recalculate_teacher_hours(self):
@@ -1039,7 +1251,7 @@ class ScheduleApp(QMainWindow):
             return
 
         # Обновляем данные в таблице
-        self.load_teachers_data()
+        self.refresh.mark('teachers')
         QMessageBox.information(self, "Успех", "Часы преподавателей успешно пересчитаны!")
 
     def add_teacher(self):
@@ -1132,7 +1344,7 @@ class ScheduleApp(QMainWindow):
         if not name:
             QMessageBox.warning(self, "Предупреждение", "Введите ФИО преподавателя")
             return
-        new_id = len(self.teachers) + 1
+        new_id = max([t['id'] for t in self.teachers], default=0) + 1
         new_teacher = {
             'id': new_id,
             'name': name,
@@ -1147,18 +1359,16 @@ class ScheduleApp(QMainWindow):
             'max_lessons_per_day': max_lessons_per_day
         }
         self.teachers.append(new_teacher)
-        self.load_teachers_data()
-        self.create_backup()
+        self.refresh.mark('teachers', 'backup')
         dialog.accept()
 
     def edit_teacher(self):
-        selected_items = self.teachers_tree.selectedItems()
-        if not selected_items:
+        selected_rows = self.teachers_tree.selectionModel().selectedRows()
+        if not selected_rows:
             QMessageBox.information(self, "Информация", "Выберите преподавателя для редактирования")
             return
-        row = selected_items[0].row()
-        teacher_id = int(self.teachers_tree.item(row, 0).text())
-        teacher = next((t for t in self.teachers if t['id'] == teacher_id), None)
+        teacher_id = self.teachers_model.teacher_id(selected_rows[0].row())
+        teacher = self.teachers.by_id(teacher_id)
         if not teacher:
             return
         dialog = QDialog(self)
@@ -1242,10 +1452,11 @@ class ScheduleApp(QMainWindow):
         if not name:
             QMessageBox.warning(self, "Предупреждение", "Введите ФИО преподавателя")
             return
-        teacher = next((t for t in self.teachers if t['id'] == teacher_id), None)
+        teacher = self.teachers.by_id(teacher_id)
         if not teacher:
             return
         teacher['name'] = name
+        self.teachers.touch()
         teacher['subject_hours'] = subject_hours
         teacher['max_hours'] = max_hours
         teacher['plan_hours'] = plan_hours
@@ -1255,21 +1466,18 @@ class ScheduleApp(QMainWindow):
         teacher['forbidden_days'] = forbidden_days
         teacher['preferred_days'] = preferred_days
         teacher['max_lessons_per_day'] = max_lessons_per_day
-        self.load_teachers_data()
-        self.create_backup()
+        self.refresh.mark('teachers', 'backup')
         dialog.accept()
 
     def delete_teacher(self):
-        selected_items = self.teachers_tree.selectedItems()
-        if not selected_items:
+        selected_rows = self.teachers_tree.selectionModel().selectedRows()
+        if not selected_rows:
             QMessageBox.information(self, "Информация", "Выберите преподавателя для удаления")
             return
         if QMessageBox.question(self, "Подтверждение", "Удалить выбранного преподавателя?") == QMessageBox.Yes:
-            row = selected_items[0].row()
-            teacher_id = int(self.teachers_tree.item(row, 0).text())
-            self.teachers = [t for t in self.teachers if t['id'] != teacher_id]
-            self.load_teachers_data()
-            self.create_backup()
+            teacher_id = self.teachers_model.teacher_id(selected_rows[0].row())
+            self.teachers[:] = [t for t in self.teachers if t['id'] != teacher_id]
+            self.refresh.mark('teachers', 'backup')
 
     def update_all_experience(self):
         if QMessageBox.question(self, "Подтверждение", "Вы уверены, что хотите увеличить стаж всех преподавателей на 1 год?") == QMessageBox.Yes:
@@ -1277,13 +1485,10 @@ class ScheduleApp(QMainWindow):
             for teacher in self.teachers:
                 teacher['experience'] = teacher.get('experience', 0) + 1
                 updated_count += 1
-            self.load_teachers_data()
-            self.create_backup()
+            self.refresh.mark('teachers', 'backup')
             QMessageBox.information(self, "Успех", f"Стаж обновлен у {updated_count} преподавателей")
 
     def generate_schedule_thread(self):
-        self.progress.show()
-        self.statusBar.showMessage("Генерация расписания...")
         self.generate_schedule()
 
     def generate_schedule(self):
@@ -1293,135 +1498,262 @@ class ScheduleApp(QMainWindow):
         if not self.settings.get('bell_schedule'):
             QMessageBox.warning(self, "Предупреждение", "Необходимо настроить расписание звонков")
             return
-        self.schedule = pd.DataFrame()
-        self.create_schedule_structure()
-        self.assign_subjects_to_groups()
-        self.assign_teachers_and_classrooms()
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
-        QMessageBox.information(self, "Успех", "Расписание успешно сгенерировано!")
-        # Добавьте эту строку, чтобы скрыть индикатор прогресса
+        if self.engine_worker is not None and self.engine_worker.isRunning():
+            QMessageBox.information(self, "Информация", "Дождитесь завершения текущей операции")
+            return
+        # Поток получает копию данных: правки в окне во время генерации его не затрагивают
+        data = copy.deepcopy(self._engine_data())
+        restarts = self.settings.get('generation_restarts', 1)
+        worker = GenerationWorker(data, self.settings.get('generation_mode', 'solver'), restarts, self)
+        worker.progress.connect(self._on_generation_progress)
+        worker.schedule_ready.connect(self._on_schedule_generated)
+        worker.failed.connect(self._on_generation_failed)
+        worker.cancelled.connect(self._on_generation_cancelled)
+        worker.finished.connect(worker.deleteLater)
+        self.engine_worker = worker
+        self.progress.setRange(0, 0)
+        self.progress.show()
+        self.cancel_generation_btn.setEnabled(True)
+        self.cancel_generation_btn.show()
+        self.statusBar.showMessage("Генерация расписания..." if restarts <= 1 else f"Генерация расписания: {restarts} запусков...")
+        worker.start()
+
+    def cancel_generation(self):
+        if self.engine_worker is not None and self.engine_worker.isRunning():
+            self.engine_worker.requestInterruption()
+            self.cancel_generation_btn.setEnabled(False)
+            self.statusBar.showMessage("Отмена...")
+
+    def _finish_generation(self):
+        self.engine_worker = None
         self.progress.hide()
+        self.progress.setRange(0, 0)
+        self.cancel_generation_btn.hide()
+
+    def _on_generation_progress(self, done, total):
+        self.progress.setRange(0, total)
+        self.progress.setValue(done)
+
+    def _on_schedule_generated(self, schedule, seed):
+        self._finish_generation()
+        self.schedule = schedule
+        self.refresh.mark('grid', 'reports', 'backup')
+        if seed is not None:
+            self.statusBar.showMessage(f"Расписание сгенерировано (лучший запуск: зерно {seed})")
+        else:
+            self.statusBar.showMessage("Расписание сгенерировано")
+        unplaced = self.schedule.attrs.get('unplaced', 0)
+        if unplaced:
+            QMessageBox.information(self, "Успех", f"Расписание сгенерировано. Не удалось разместить часов: {unplaced}")
+        else:
+            QMessageBox.information(self, "Успех", "Расписание успешно сгенерировано!")
+
+    def _on_generation_failed(self, message):
+        self._finish_generation()
+        self.statusBar.showMessage("Ошибка генерации")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка генерации расписания: {message}")
+
+    def _on_generation_cancelled(self):
+        self._finish_generation()
+        self.statusBar.showMessage("Генерация отменена, расписание не изменено")
+
+    def closeEvent(self, event):
+        # Отложенный бэкап последнего действия
+        self.refresh.flush()
+        if self.engine_worker is not None and self.engine_worker.isRunning():
+            self.engine_worker.requestInterruption()
+            self.engine_worker.wait()
+        if self.catalog_worker is not None and self.catalog_worker.isRunning():
+            self.catalog_worker.wait()
+        if self.store is not None:
+            self._sync_store()
+            self.store.close()
+        self.backup_writer.close()
+        super().closeEvent(event)
+
+    def _engine_data(self):
+        return {
+            'settings': self.settings,
+            'groups': self.groups,
+            'teachers': self.teachers,
+            'classrooms': self.classrooms,
+            'subjects': self.subjects,
+            'holidays': self.holidays
+        }
+
+    def _set_lesson(self, rows, **fields):
+        """Единая точка записи занятий в self.schedule (см. engine.set_lesson)"""
+        self.history.before_lessons(self.schedule, rows)
+        engine.set_lesson(self.schedule, rows, **fields)
+        self._refresh_load(rows)
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+
+    def _clear_lesson(self, rows):
+        self.history.before_lessons(self.schedule, rows)
+        engine.clear_lesson(self.schedule, rows)
+        self._refresh_load(rows)
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+
+    def _teacher_loads(self):
+        """Журнал нагрузки текущего расписания; после замены расписания строится заново"""
+        if self.load_ledger.schedule is not self.schedule:
+            self.load_ledger = engine.LoadLedger(self.schedule)
+        return self.load_ledger
+
+    def _refresh_load(self, rows):
+        # Журнал чужого расписания не трогаем: _teacher_loads все равно построит новый
+        if self.load_ledger.schedule is self.schedule:
+            self.load_ledger.refresh(rows)
+
+    # ========================
+    # ХРАНИЛИЩЕ SQLITE
+    # ========================
+    def _state_data(self):
+        return dict(self._engine_data(), substitutions=self.substitutions)
+
+    def _open_store(self):
+        """Загружает данные из SQLite, если в прошлый раз было выбрано это хранилище"""
+        if not self.db_path.exists():
+            return False
+        try:
+            store = engine.SQLiteStore(self.db_path)
+            if not store.has_state() or store.load_settings().get('storage_backend') != 'sqlite':
+                store.close()
+                return False
+            data, schedule = store.load_state()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка чтения базы {self.db_path}: {e}")
+            return False
+        self.store = store
+        self._apply_state(data, schedule)
+        self._stored_schedule = schedule
+        return True
+
+    def _apply_state(self, data, schedule):
+        """Заменяет данные приложения (из базы или бэкапа) и обновляет вкладки"""
+        self.settings.update(data['settings'])
+        self.groups = engine.EntityRegistry(data['groups'])
+        self.teachers = engine.EntityRegistry(data['teachers'])
+        self.classrooms = engine.EntityRegistry(data['classrooms'])
+        self.subjects = engine.EntityRegistry(data['subjects'])
+        self.holidays = data['holidays']
+        self.substitutions = data['substitutions']
+        self.schedule = schedule
+        self.load_groups_data()
+        self.load_classrooms_data()
+        self.load_subjects_data()
+        self.load_holidays_data()
+        self.refresh.mark('teachers', 'grid', 'reports')
+
+    def _set_storage_backend(self, backend):
+        self.settings['storage_backend'] = backend
+        if backend == 'sqlite' and self.store is None:
+            self.store = engine.SQLiteStore(self.db_path)
+            self._stored_schedule = None
+            self._sync_store()
+        elif backend != 'sqlite' and self.store is not None:
+            # В базе остается отметка 'json', и при следующем запуске она не загружается
+            self.store.save_state(self._state_data())
+            self.store.close()
+            self.store = None
+
+    def _sync_store(self):
+        """Сохраняет в SQLite изменившиеся разделы состояния; расписание целиком — только если его заменили"""
+        if self.store is None:
+            return
+        replaced = self.schedule is not self._stored_schedule
+        try:
+            self.store.save_state(self._state_data(), self.schedule if replaced else None)
+        except Exception as e:
+            # База — дополнительное хранилище: ее ошибка не должна срывать бэкап и сохранение
+            self.statusBar.showMessage(f"Ошибка записи в базу: {e}")
+            return
+        self._stored_schedule = self.schedule
+
+    def _store_lessons(self, rows):
+        """Точечное сохранение измененных занятий"""
+        if self.store is None or self.schedule is not self._stored_schedule:
+            return
+        try:
+            self.store.update_lessons(self.schedule, rows)
+        except Exception as e:
+            # Следующая синхронизация перепишет расписание целиком
+            self._stored_schedule = None
+            self.statusBar.showMessage(f"Ошибка записи в базу: {e}")
+
+    # ========================
+    # ЖУРНАЛ ИЗМЕНЕНИЙ
+    # ========================
+    def _journal_lessons(self, rows):
+        if self.schedule is self._journaled_schedule:
+            self.backup_writer.lessons(engine.lesson_records(self.schedule, rows))
+
+    def _journal_state(self):
+        """Ставит изменения в очередь журнала; False — нужен полный снимок"""
+        if self.schedule is not self._journaled_schedule:
+            return False
+        if self.backup_writer.records >= self.settings.get('journal_snapshot_every', engine.DEFAULT_SNAPSHOT_EVERY):
+            return False
+        self.backup_writer.state(copy.deepcopy(self._state_data()))
+        return True
+
+    # ========================
+    # ОТМЕНА И ПОВТОР
+    # ========================
+    def undo(self):
+        self._apply_history(self.history.undo, "Нечего отменять")
+
+    def redo(self):
+        self._apply_history(self.history.redo, "Нечего повторять")
+
+    def _apply_history(self, step, empty_message):
+        # Незакрытые правки (например, без create_backup) становятся отдельным шагом
+        self.history.commit(self.schedule, self._state_data())
+        rows = step(self.schedule, self._state_data())
+        if rows is None:
+            self.statusBar.showMessage(empty_message, 3000)
+            return
+        self._refresh_load(rows)
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+        self.load_groups_data()
+        self.load_classrooms_data()
+        self.load_subjects_data()
+        self.load_holidays_data()
+        self.refresh.mark('teachers', 'grid', 'reports', 'backup')
+
+    def _on_backup_written(self, snapshot_path):
+        if snapshot_path is not None:
+            self.last_backup_time = datetime.now()
+            self.update_backup_indicator()
+
+    def _on_backup_failed(self, message):
+        # Журнал оборвался — следующий create_backup начнет новый снимок
+        self._journaled_schedule = None
+        QMessageBox.critical(self, "Ошибка", f"Ошибка создания бэкапа: {message}")
 
     def assign_subjects_to_groups(self):
-        if not self.subjects or not self.groups:
-            return
-        for group in self.groups:
-            group_subjects = [s for s in self.subjects if s.get('group_type') in [group['type'], 'общий']]
-            if not group_subjects:
-                continue
-            free_slots_count = len(self.schedule[
-                (self.schedule['group_id'] == group['id']) &
-                (self.schedule['status'] == 'свободно')
-            ])
-            if free_slots_count == 0:
-                continue
-            group_subjects.sort(key=lambda x: x.get('hours_per_week', 0), reverse=True)
-            for subject in group_subjects:
-                hours_per_week = subject.get('hours_per_week', 0)
-                if hours_per_week <= 0:
-                    continue
-                free_slots = self.schedule[
-                    (self.schedule['group_id'] == group['id']) &
-                    (self.schedule['status'] == 'свободно')
-                ].index
-                if len(free_slots) < hours_per_week:
-                    continue
-                selected_slots = random.sample(list(free_slots), hours_per_week)
-                for slot in selected_slots:
-                    self.schedule.loc[slot, 'subject_id'] = subject['id']
-                    self.schedule.loc[slot, 'subject_name'] = subject['name']
-                    self.schedule.loc[slot, 'status'] = 'запланировано'
+        if not self.subjects or not self.groups or self.schedule.empty:
+            return
+        engine.assign_subjects_to_groups(self.schedule, self._engine_data())
+        self.load_ledger = engine.LoadLedger()
 
     def create_schedule_structure(self):
         if not self.groups:
             QMessageBox.warning(self, "Ошибка", "Нет групп для распределения расписания")
             return
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'][:self.settings['days_per_week']]
-        times = [slot.strip() for slot in self.settings['bell_schedule'].split(',')]
-        weeks = list(range(1, self.settings['weeks'] + 1))
-        schedule_data = []
-        lesson_id = 1
-        group_cycle = itertools.cycle(self.groups)
-        for week in weeks:
-            for day in days:
-                for time in times:
-                    group = next(group_cycle)
-                    schedule_data.append({
-                        'id': lesson_id,
-                        'week': week,
-                        'day': day,
-                        'time': time,
-                        'group_id': group['id'],
-                        'group_name': group['name'],
-                        'subject_id': None,
-                        'subject_name': '',
-                        'teacher_id': None,
-                        'teacher_name': '',
-                        'classroom_id': None,
-                        'classroom_name': '',
-                        'status': 'свободно'
-                    })
-                    lesson_id += 1
-        self.schedule = pd.DataFrame(schedule_data)
+        self.schedule = engine.create_schedule_structure(self._engine_data())
 
     def assign_teachers_and_classrooms(self):
         if self.schedule.empty:
             return
-        planned_lessons = self.schedule[self.schedule['status'] == 'запланировано'].index
-        for idx in planned_lessons:
-            subject_name = self.schedule.loc[idx, 'subject_name']
-            group_id = self.schedule.loc[idx, 'group_id']
-            day = self.schedule.loc[idx, 'day']
-            time = self.schedule.loc[idx, 'time']
-            week = self.schedule.loc[idx, 'week']
-            available_teachers = []
-            for teacher in self.teachers:
-                if subject_name not in teacher.get('subject_hours', {}):
-                    continue
-                forbidden_days = teacher.get('forbidden_days', '')
-                if day in forbidden_days:
-                    continue
-                teacher_lessons_today = len(self.schedule[
-                    (self.schedule['teacher_id'] == teacher['id']) &
-                    (self.schedule['day'] == day) &
-                    (self.schedule['status'] == 'подтверждено')
-                ])
-                if teacher_lessons_today >= teacher.get('max_lessons_per_day', 10):
-                    continue
-                available_teachers.append(teacher)
-            if available_teachers:
-                teacher = random.choice(available_teachers)
-                self.schedule.loc[idx, 'teacher_id'] = teacher['id']
-                self.schedule.loc[idx, 'teacher_name'] = teacher['name']
-                self.schedule.loc[idx, 'status'] = 'подтверждено'
-                available_classrooms = []
-                group_size = self.get_group_size(group_id)
-                for classroom in self.classrooms:
-                    if classroom.get('capacity', 0) < group_size:
-                        continue
-                    classroom_lessons = len(self.schedule[
-                        (self.schedule['classroom_id'] == classroom['id']) &
-                        (self.schedule['day'] == day) &
-                        (self.schedule['time'] == time) &
-                        (self.schedule['week'] == week) &
-                        (self.schedule['status'] == 'подтверждено')
-                    ])
-                    if classroom_lessons > 0:
-                        continue
-                    available_classrooms.append(classroom)
-                if available_classrooms:
-                    classroom = random.choice(available_classrooms)
-                    self.schedule.loc[idx, 'classroom_id'] = classroom['id']
-                    self.schedule.loc[idx, 'classroom_name'] = classroom['name']
-                else:
-                    print(f"Предупреждение: Для занятия {subject_name} в {day} {time} (неделя {week}) не найдено подходящей аудитории.")
-            else:
-                print(f"Предупреждение: Для предмета {subject_name} не найдено подходящего преподавателя.")
+        engine.assign_teachers_and_classrooms(self.schedule, self._engine_data())
+        self.load_ledger = engine.LoadLedger()
 
     def get_group_size(self, group_id):
-        group = next((g for g in self.groups if g['id'] == group_id), None)
+        group = self.groups.by_id(group_id)
         return group.get('students', 0) if group else 0
 
     def filter_schedule(self):
@@ -1433,71 +1765,35 @@ class ScheduleApp(QMainWindow):
         selected_group = self.group_filter_var.currentText() if self.group_filter_var.currentText() != "" else None
         selected_teacher = self.teacher_filter_var.currentText() if self.teacher_filter_var.currentText() != "" else None
         selected_classroom = self.classroom_filter_var.currentText() if self.classroom_filter_var.currentText() != "" else None
-        filtered_schedule = self.schedule.copy()
-        filtered_schedule = filtered_schedule[filtered_schedule['week'] == current_week]
-        if selected_group:
-            filtered_schedule = filtered_schedule[filtered_schedule['group_name'] == selected_group]
-        if selected_teacher:
-            filtered_schedule = filtered_schedule[filtered_schedule['teacher_name'] == selected_teacher]
-        if selected_classroom:
-            filtered_schedule = filtered_schedule[filtered_schedule['classroom_name'] == selected_classroom]
-        self.schedule_model.clear()
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'][:self.settings['days_per_week']]
-        headers = ['Время'] + days
-        self.schedule_model.setHorizontalHeaderLabels(headers)
-        times = sorted(filtered_schedule['time'].unique(), key=lambda x: x.split('-')[0])
-        for time_slot in times:
-            time_item = QStandardItem(time_slot)
-            self.schedule_model.appendRow([time_item])
-        for col, day in enumerate(days, 1):
-            for row, time_slot in enumerate(times):
-                lesson = filtered_schedule[
-                    (filtered_schedule['time'] == time_slot) &
-                    (filtered_schedule['day'] == day)
-                ]
-                if not lesson.empty:
-                    lesson_info = lesson.iloc[0]
-                    lesson_text = f"{lesson_info['subject_name']}\n{lesson_info['teacher_name']}\n{lesson_info['classroom_name']}"
-                    item = QStandardItem(lesson_text)
-                    item.setTextAlignment(Qt.AlignCenter)
-                    if lesson_info['status'] == 'подтверждено':
-                        item.setBackground(QColor('#d4edda'))
-                    elif lesson_info['status'] == 'запланировано':
-                        item.setBackground(QColor('#fff3cd'))
-                    else:
-                        item.setBackground(QColor('#999999'))
-                    self.schedule_model.setItem(row, col, item)
-                else:
-                    self.schedule_model.setItem(row, col, QStandardItem())
-        self.schedule_proxy_model.setSourceModel(self.schedule_model)
-        self.schedule_view.setModel(self.schedule_proxy_model)
-        self.schedule_proxy_model.sort(0, Qt.AscendingOrder)
-        self.schedule_view.resizeColumnsToContents()
-        self.schedule_view.resizeRowsToContents()
-
-    def calculate_teacher_load(self, teacher_id):
-        teacher = next((t for t in self.teachers if t['id'] == teacher_id), None)
-        if not teacher:
-            return {'plan': 0, 'fact': 0, 'remaining': 0, 'fact_by_subject': {}}
-        subject_hours = teacher.get('subject_hours', {})
-        plan_total = sum(subject_hours.values()) if subject_hours else 0
-        fact_total = 0
-        fact_by_subject = {}
-        if not self.schedule.empty:
-            fact_schedule = self.schedule[
-                (self.schedule['teacher_id'] == teacher_id) &
-                (self.schedule['status'] == 'подтверждено')
-            ]
-            fact_total = len(fact_schedule)
-            if fact_total > 0:
-                fact_by_subject = fact_schedule['subject_name'].value_counts().to_dict()
-        remaining = max(0, plan_total - fact_total)
-        return {
-            'plan': plan_total,
-            'fact': fact_total,
-            'remaining': remaining,
-            'fact_by_subject': fact_by_subject
-        }
+        days = engine.DAYS[:self.settings['days_per_week']]
+        # Меняется только раскладка модели; таблица не копируется и не перестраивается
+        if self.schedule_model.show(self.schedule, current_week, days,
+                                    selected_group, selected_teacher, selected_classroom):
+            self.schedule_view.resizeColumnsToContents()
+            self.schedule_view.resizeRowsToContents()
+
+    def _cell_lesson_index(self, week, day, time_slot):
+        """Метка подтвержденного занятия в выбранной ячейке сетки или None.
+
+        В слоте у каждой группы своя строка, поэтому в ячейке может быть
+        несколько занятий: строки сужаются фильтрами сетки, а если их остается
+        больше одной, группа выбирается в диалоге.
+        """
+        mask = ((self.schedule['week'] == week) & (self.schedule['day'] == day) &
+                (self.schedule['time'] == time_slot) & (self.schedule['status'] == 'подтверждено'))
+        for column, combo in (('group_name', self.group_filter_var), ('teacher_name', self.teacher_filter_var),
+                              ('classroom_name', self.classroom_filter_var)):
+            if combo.currentText():
+                mask &= self.schedule[column] == combo.currentText()
+        lessons = self.schedule[mask]
+        if lessons.empty:
+            QMessageBox.information(self, "Информация", "Выбранное занятие не найдено в расписании")
+            return None
+        if len(lessons) == 1:
+            return lessons.index[0]
+        labels = [f"{lesson.group_name} — {lesson.subject_name} ({lesson.teacher_name})" for lesson in lessons.itertuples()]
+        label, ok = QInputDialog.getItem(self, "Выбор занятия", "В ячейке занятия нескольких групп:", labels, 0, False)
+        return lessons.index[labels.index(label)] if ok else None
 
     def add_lesson(self):
         selected_indexes = self.schedule_view.selectionModel().selectedIndexes()
@@ -1528,18 +1824,6 @@ class ScheduleApp(QMainWindow):
         if not self.groups or not self.subjects or not self.teachers or not self.classrooms:
             QMessageBox.warning(self, "Предупреждение", "Для добавления занятия необходимо, чтобы были созданы хотя бы одна группа, один предмет, один преподаватель и одна аудитория.")
             return
-        target_row = self.schedule[
-            (self.schedule['week'] == selected_week) &
-            (self.schedule['day'] == selected_day) &
-            (self.schedule['time'] == time_slot)
-        ]
-        if target_row.empty:
-            QMessageBox.critical(self, "Ошибка", "Не удалось найти подходящий слот в расписании для добавления")
-            return
-        idx = target_row.index[0]
-        if self.schedule.loc[idx, 'status'] != 'свободно':
-            if QMessageBox.question(self, "Подтверждение", "В выбранное время уже есть занятие. Заменить его?") != QMessageBox.Yes:
-                return
         dialog = QDialog(self)
         dialog.setWindowTitle("Добавить занятие")
         dialog.setModal(True)
@@ -1547,6 +1831,8 @@ class ScheduleApp(QMainWindow):
         form_layout = QFormLayout(dialog)
         group_var = QComboBox()
         group_var.addItems([g['name'] for g in self.groups])
+        if self.group_filter_var.currentText():
+            group_var.setCurrentText(self.group_filter_var.currentText())
         form_layout.addRow("Группа:", group_var)
         subject_var = QComboBox()
         subject_var.addItems([s['name'] for s in self.subjects])
@@ -1558,31 +1844,42 @@ class ScheduleApp(QMainWindow):
         classroom_var.addItems([c['name'] for c in self.classrooms])
         form_layout.addRow("Аудитория:", classroom_var)
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(lambda: self._save_direct_lesson(idx, group_var.currentText(), subject_var.currentText(), teacher_var.currentText(), classroom_var.currentText(), dialog))
+        button_box.accepted.connect(lambda: self._save_direct_lesson(selected_week, selected_day, time_slot, group_var.currentText(), subject_var.currentText(), teacher_var.currentText(), classroom_var.currentText(), dialog))
         button_box.rejected.connect(dialog.reject)
         form_layout.addRow(button_box)
         dialog.exec_()
 
-    def _save_direct_lesson(self, idx, group_name, subject_name, teacher_name, classroom_name, dialog):
-        selected_group = next((g for g in self.groups if g['name'] == group_name), None)
-        selected_subject = next((s for s in self.subjects if s['name'] == subject_name), None)
-        selected_teacher = next((t for t in self.teachers if t['name'] == teacher_name), None)
-        selected_classroom = next((c for c in self.classrooms if c['name'] == classroom_name), None)
+    def _save_direct_lesson(self, week, day, time_slot, group_name, subject_name, teacher_name, classroom_name, dialog):
+        selected_group = self.groups.by_name(group_name)
+        selected_subject = self.subjects.by_name(subject_name)
+        selected_teacher = self.teachers.by_name(teacher_name)
+        selected_classroom = self.classrooms.by_name(classroom_name)
         if not all([selected_group, selected_subject, selected_teacher, selected_classroom]):
             QMessageBox.critical(self, "Ошибка", "Не удалось найти выбранные элементы в базе данных")
             return
-        self.schedule.loc[idx, 'group_id'] = selected_group['id']
-        self.schedule.loc[idx, 'group_name'] = selected_group['name']
-        self.schedule.loc[idx, 'subject_id'] = selected_subject['id']
-        self.schedule.loc[idx, 'subject_name'] = selected_subject['name']
-        self.schedule.loc[idx, 'teacher_id'] = selected_teacher['id']
-        self.schedule.loc[idx, 'teacher_name'] = selected_teacher['name']
-        self.schedule.loc[idx, 'classroom_id'] = selected_classroom['id']
-        self.schedule.loc[idx, 'classroom_name'] = selected_classroom['name']
-        self.schedule.loc[idx, 'status'] = 'подтверждено'
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
+        # У каждой группы в слоте своя строка: пишем в строку выбранной группы
+        target_row = self.schedule[
+            (self.schedule['week'] == week) &
+            (self.schedule['day'] == day) &
+            (self.schedule['time'] == time_slot) &
+            (self.schedule['group_id'] == selected_group['id'])
+        ]
+        if target_row.empty:
+            QMessageBox.critical(self, "Ошибка", "Не удалось найти подходящий слот в расписании для добавления")
+            return
+        idx = target_row.index[0]
+        if self.schedule.loc[idx, 'status'] != 'свободно':
+            if QMessageBox.question(self, "Подтверждение", "В выбранное время у этой группы уже есть занятие. Заменить его?") != QMessageBox.Yes:
+                return
+        self._set_lesson(idx,
+                         subject_id=selected_subject['id'],
+                         subject_name=selected_subject['name'],
+                         teacher_id=selected_teacher['id'],
+                         teacher_name=selected_teacher['name'],
+                         classroom_id=selected_classroom['id'],
+                         classroom_name=selected_classroom['name'],
+                         status='подтверждено')
+        self.refresh.mark('grid', 'reports', 'backup')
         QMessageBox.information(self, "Успех", "Занятие успешно добавлено!")
         dialog.accept()
 
@@ -1612,17 +1909,10 @@ class ScheduleApp(QMainWindow):
             selected_week = int(week_text.split()[1]) if "Неделя" in week_text else 1
         except (ValueError, IndexError):
             selected_week = 1
-        target_lesson = self.schedule[
-            (self.schedule['week'] == selected_week) &
-            (self.schedule['day'] == selected_day) &
-            (self.schedule['time'] == time_slot) &
-            (self.schedule['status'] == 'подтверждено')
-        ]
-        if target_lesson.empty:
-            QMessageBox.information(self, "Информация", "Выбранное занятие не найдено в расписании")
+        lesson_idx = self._cell_lesson_index(selected_week, selected_day, time_slot)
+        if lesson_idx is None:
             return
-        lesson_info = target_lesson.iloc[0]
-        lesson_idx = target_lesson.index[0]
+        lesson_info = self.schedule.loc[lesson_idx]
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактировать занятие")
         dialog.setModal(True)
@@ -1670,10 +1960,10 @@ class ScheduleApp(QMainWindow):
             new_subject_name = subject_var.currentText()
             new_teacher_name = teacher_var.currentText()
             new_classroom_name = classroom_var.currentText()
-            new_group = next((g for g in self.groups if g['name'] == new_group_name), None)
-            new_subject = next((s for s in self.subjects if s['name'] == new_subject_name), None)
-            new_teacher = next((t for t in self.teachers if t['name'] == new_teacher_name), None)
-            new_classroom = next((c for c in self.classrooms if c['name'] == new_classroom_name), None)
+            new_group = self.groups.by_name(new_group_name)
+            new_subject = self.subjects.by_name(new_subject_name)
+            new_teacher = self.teachers.by_name(new_teacher_name)
+            new_classroom = self.classrooms.by_name(new_classroom_name)
             if not all([new_group, new_subject, new_teacher, new_classroom]):
                 QMessageBox.critical(self, "Ошибка", "Не удалось найти выбранные элементы в базе данных")
                 return
@@ -1699,24 +1989,22 @@ class ScheduleApp(QMainWindow):
             else:
                 QMessageBox.critical(self, "Ошибка", "Не удалось найти подходящий слот в расписании для обновления")
                 return
-            self.schedule.loc[update_idx, 'week'] = new_week
-            self.schedule.loc[update_idx, 'day'] = new_day
-            self.schedule.loc[update_idx, 'time'] = new_time
-            self.schedule.loc[update_idx, 'group_id'] = new_group['id']
-            self.schedule.loc[update_idx, 'group_name'] = new_group['name']
-            self.schedule.loc[update_idx, 'subject_id'] = new_subject['id']
-            self.schedule.loc[update_idx, 'subject_name'] = new_subject['name']
-            self.schedule.loc[update_idx, 'teacher_id'] = new_teacher['id']
-            self.schedule.loc[update_idx, 'teacher_name'] = new_teacher['name']
-            self.schedule.loc[update_idx, 'classroom_id'] = new_classroom['id']
-            self.schedule.loc[update_idx, 'classroom_name'] = new_classroom['name']
-            self.schedule.loc[update_idx, 'status'] = 'подтверждено'
+            self._set_lesson(update_idx,
+                             week=new_week,
+                             day=new_day,
+                             time=new_time,
+                             group_id=new_group['id'],
+                             group_name=new_group['name'],
+                             subject_id=new_subject['id'],
+                             subject_name=new_subject['name'],
+                             teacher_id=new_teacher['id'],
+                             teacher_name=new_teacher['name'],
+                             classroom_id=new_classroom['id'],
+                             classroom_name=new_classroom['name'],
+                             status='подтверждено')
             if update_idx != lesson_idx:
-                self.schedule.loc[lesson_idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-                self.schedule.loc[lesson_idx, 'status'] = 'свободно'
-            self.filter_schedule()
-            self.update_reports()
-            self.create_backup()
+                self._clear_lesson(lesson_idx)
+            self.refresh.mark('grid', 'reports', 'backup')
             QMessageBox.information(self, "Успех", "Занятие успешно отредактировано!")
 
     def delete_lesson(self):
@@ -1749,16 +2037,10 @@ class ScheduleApp(QMainWindow):
             selected_week = int(week_text.split()[1]) if "Неделя" in week_text else 1
         except (ValueError, IndexError):
             selected_week = 1
-        target_lesson = self.schedule[
-            (self.schedule['week'] == selected_week) &
-            (self.schedule['day'] == selected_day) &
-            (self.schedule['time'] == time_slot) &
-            (self.schedule['status'] == 'подтверждено')
-        ]
-        if target_lesson.empty:
-            QMessageBox.information(self, "Информация", "Выбранное занятие не найдено в расписании")
+        lesson_idx = self._cell_lesson_index(selected_week, selected_day, time_slot)
+        if lesson_idx is None:
             return
-        lesson_info = target_lesson.iloc[0]
+        lesson_info = self.schedule.loc[lesson_idx]
         confirm_text = (
             f"Вы уверены, что хотите удалить это занятие?\n"
             f"Предмет: {lesson_info['subject_name']}\n"
@@ -1771,12 +2053,8 @@ class ScheduleApp(QMainWindow):
         )
         if QMessageBox.question(self, "Подтверждение удаления", confirm_text) != QMessageBox.Yes:
             return
-        idx = target_lesson.index[0]
-        self.schedule.loc[idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-        self.schedule.loc[idx, 'status'] = 'свободно'
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
+        self._clear_lesson(lesson_idx)
+        self.refresh.mark('grid', 'reports', 'backup')
         QMessageBox.information(self, "Успех", "Занятие успешно удалено!")
 
     def substitute_lesson(self):
@@ -1809,17 +2087,10 @@ class ScheduleApp(QMainWindow):
             selected_week = int(week_text.split()[1]) if "Неделя" in week_text else 1
         except (ValueError, IndexError):
             selected_week = 1
-        target_lesson = self.schedule[
-            (self.schedule['week'] == selected_week) &
-            (self.schedule['day'] == selected_day) &
-            (self.schedule['time'] == time_slot) &
-            (self.schedule['status'] == 'подтверждено')
-        ]
-        if target_lesson.empty:
-            QMessageBox.information(self, "Информация", "Выбранное занятие не найдено в расписании")
+        lesson_idx = self._cell_lesson_index(selected_week, selected_day, time_slot)
+        if lesson_idx is None:
             return
-        lesson_info = target_lesson.iloc[0]
-        lesson_idx = target_lesson.index[0]
+        lesson_info = self.schedule.loc[lesson_idx]
         dialog = QDialog(self)
         dialog.setWindowTitle("Замена занятия")
         dialog.setModal(True)
@@ -1839,7 +2110,7 @@ class ScheduleApp(QMainWindow):
         subject_label = QLabel("Новый предмет:")
         layout.addWidget(subject_label)
         subject_combo = QComboBox()
-        current_group = next((g for g in self.groups if g['name'] == lesson_info['group_name']), None)
+        current_group = self.groups.by_name(lesson_info['group_name'])
         if current_group:
             available_subjects = [s for s in self.subjects if s.get('group_type') in [current_group['type'], 'общий']]
         else:
@@ -1854,7 +2125,7 @@ class ScheduleApp(QMainWindow):
         teacher_combo = QComboBox()
         def update_teacher_combo():
             selected_subject_name = subject_combo.currentText()
-            selected_subject = next((s for s in self.subjects if s['name'] == selected_subject_name), None)
+            selected_subject = self.subjects.by_name(selected_subject_name)
             if selected_subject:
                 new_available_teachers = [
                     t for t in self.teachers
@@ -1889,18 +2160,21 @@ class ScheduleApp(QMainWindow):
             if not reason_text:
                 QMessageBox.warning(self, "Предупреждение", "Пожалуйста, укажите причину замены.")
                 return
-            new_subject = next((s for s in self.subjects if s['name'] == new_subject_name), None)
+            new_subject = self.subjects.by_name(new_subject_name)
             if not new_subject:
                 QMessageBox.warning(self, "Ошибка", f"Не удалось найти предмет '{new_subject_name}'")
                 return
-            new_teacher = next((t for t in self.teachers if t['name'] == new_teacher_name and new_subject_name in t.get('subject_hours', {})), None)
+            new_teacher = self.teachers.by_name(new_teacher_name)
+            if new_teacher and new_subject_name not in new_teacher.get('subject_hours', {}):
+                new_teacher = None
             if not new_teacher:
                 QMessageBox.warning(self, "Ошибка", f"Не удалось найти преподавателя '{new_teacher_name}', который ведет предмет '{new_subject_name}'")
                 return
-            self.schedule.loc[lesson_idx, 'subject_id'] = new_subject['id']
-            self.schedule.loc[lesson_idx, 'subject_name'] = new_subject['name']
-            self.schedule.loc[lesson_idx, 'teacher_id'] = new_teacher['id']
-            self.schedule.loc[lesson_idx, 'teacher_name'] = new_teacher['name']
+            self._set_lesson(lesson_idx,
+                             subject_id=new_subject['id'],
+                             subject_name=new_subject['name'],
+                             teacher_id=new_teacher['id'],
+                             teacher_name=new_teacher['name'])
             self.substitutions.append({
                 'date': datetime.now().isoformat(),
                 'week': selected_week,
@@ -1913,9 +2187,7 @@ class ScheduleApp(QMainWindow):
                 'new_teacher': new_teacher_name,
                 'reason': reason_text
             })
-            self.filter_schedule()
-            self.update_reports()
-            self.create_backup()
+            self.refresh.mark('grid', 'reports', 'backup')
             QMessageBox.information(self, "Успех", f"Занятие успешно заменено!\nНовый преподаватель: {new_teacher_name}")
 
     def show_calendar(self):
@@ -1935,24 +2207,10 @@ class ScheduleApp(QMainWindow):
         if self.schedule.empty:
             QMessageBox.information(self, "Информация", "Сначала сгенерируйте расписание")
             return
-        teacher_conflicts = pd.DataFrame()
-        classroom_conflicts = pd.DataFrame()
-        group_conflicts = pd.DataFrame()
-        if 'teacher_id' in self.schedule.columns:
-            teacher_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['teacher_id', 'day', 'time', 'week'], keep=False))
-            ]
-        if 'classroom_id' in self.schedule.columns:
-            classroom_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['classroom_id', 'day', 'time', 'week'], keep=False))
-            ]
-        if 'group_id' in self.schedule.columns:
-            group_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['group_id', 'day', 'time', 'week'], keep=False))
-            ]
+        conflicts = engine.find_conflicts(self.schedule)
+        teacher_conflicts = conflicts['teacher_id']
+        classroom_conflicts = conflicts['classroom_id']
+        group_conflicts = conflicts['group_id']
         conflict_text = f"Конфликты преподавателей: {len(teacher_conflicts)}\n"
         conflict_text += f"Конфликты аудиторий: {len(classroom_conflicts)}\n"
         conflict_text += f"Конфликты групп: {len(group_conflicts)}\n"
@@ -1975,78 +2233,60 @@ class ScheduleApp(QMainWindow):
         if self.schedule.empty:
             QMessageBox.information(self, "Информация", "Сначала сгенерируйте расписание")
             return
+        if self.engine_worker is not None and self.engine_worker.isRunning():
+            QMessageBox.information(self, "Информация", "Дождитесь завершения текущей операции")
+            return
+        time_limit, ok = QInputDialog.getInt(self, "Оптимизация", "Время оптимизации (сек):",
+                                             self.settings.get('optimize_time_limit', 10), 1, 3600)
+        if not ok:
+            return
+        self.settings['optimize_time_limit'] = time_limit
+        self._optimize_source = self.schedule
+        worker = OptimizationWorker(self.schedule.copy(), copy.deepcopy(self._engine_data()), time_limit, self)
+        worker.progress.connect(self._on_optimization_progress)
+        worker.result_ready.connect(self._on_schedule_optimized)
+        worker.failed.connect(self._on_optimization_failed)
+        worker.cancelled.connect(self._on_optimization_cancelled)
+        worker.finished.connect(worker.deleteLater)
+        self.engine_worker = worker
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
         self.progress.show()
+        self.cancel_generation_btn.setEnabled(True)
+        self.cancel_generation_btn.show()
         self.statusBar.showMessage("Оптимизация расписания...")
-        conflicts = pd.DataFrame()
-        if 'teacher_id' in self.schedule.columns:
-            conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['teacher_id', 'day', 'time', 'week'], keep=False))
-            ]
-        optimized_count = 0
-        for idx in conflicts.index[:10]:
-            group_id = self.schedule.loc[idx, 'group_id']
-            week = self.schedule.loc[idx, 'week']
-            free_slots = self.schedule[
-                (self.schedule['group_id'] == group_id) &
-                (self.schedule['week'] == week) &
-                (self.schedule['status'] == 'свободно')
-            ].index
-            if len(free_slots) > 0:
-                new_slot = random.choice(free_slots)
-                self.schedule.loc[new_slot, 'subject_id'] = self.schedule.loc[idx, 'subject_id']
-                self.schedule.loc[new_slot, 'subject_name'] = self.schedule.loc[idx, 'subject_name']
-                self.schedule.loc[new_slot, 'teacher_id'] = self.schedule.loc[idx, 'teacher_id']
-                self.schedule.loc[new_slot, 'teacher_name'] = self.schedule.loc[idx, 'teacher_name']
-                self.schedule.loc[new_slot, 'classroom_id'] = self.schedule.loc[idx, 'classroom_id']
-                self.schedule.loc[new_slot, 'classroom_name'] = self.schedule.loc[idx, 'classroom_name']
-                self.schedule.loc[new_slot, 'status'] = 'подтверждено'
-                self.schedule.loc[idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-                self.schedule.loc[idx, 'status'] = 'свободно'
-                optimized_count += 1
-        self.progress.hide()
+        worker.start()
+
+    def _on_optimization_progress(self, cost, percent):
+        self.progress.setValue(percent)
+        self.statusBar.showMessage(f"Оптимизация расписания... штраф: {cost}")
+
+    def _on_schedule_optimized(self, result):
+        self._finish_generation()
+        if self.schedule is not self._optimize_source:
+            # Пока шла оптимизация, расписание заменили (например, загрузили из архива)
+            self.statusBar.showMessage("Результат оптимизации устарел и не применен")
+            return
+        self.schedule = result.schedule
+        self.refresh.mark('grid', 'reports', 'backup')
         self.statusBar.showMessage("Оптимизация завершена")
-        QMessageBox.information(self, "Оптимизация", f"Оптимизировано {optimized_count} занятий")
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
+        QMessageBox.information(self, "Оптимизация",
+                                f"Штраф: {result.initial_cost} → {result.cost}\n"
+                                f"Проверено ходов: {result.moves}, принято: {result.accepted}")
+
+    def _on_optimization_failed(self, message):
+        self._finish_generation()
+        self.statusBar.showMessage("Ошибка оптимизации")
+        QMessageBox.critical(self, "Ошибка", f"Ошибка оптимизации: {message}")
+
+    def _on_optimization_cancelled(self):
+        self._finish_generation()
+        self.statusBar.showMessage("Оптимизация отменена, расписание не изменено")
 
     def update_reports(self):
         if self.schedule.empty:
             return
-        self.teacher_report_tree.setRowCount(0)
-        self.group_report_tree.setRowCount(0)
-        self.summary_text.clear()
-        if 'teacher_name' in self.schedule.columns and not self.schedule[self.schedule['status'] == 'подтверждено'].empty:
-            teacher_load = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name').size()
-            for teacher, hours in teacher_load.items():
-                teacher_data = self.schedule[
-                    (self.schedule['teacher_name'] == teacher) &
-                    (self.schedule['status'] == 'подтверждено')
-                ]
-                groups = ', '.join(teacher_data['group_name'].unique())
-                subjects = ', '.join(teacher_data['subject_name'].unique())
-                row = self.teacher_report_tree.rowCount()
-                self.teacher_report_tree.insertRow(row)
-                self.teacher_report_tree.setItem(row, 0, QTableWidgetItem(teacher))
-                self.teacher_report_tree.setItem(row, 1, QTableWidgetItem(str(hours)))
-                self.teacher_report_tree.setItem(row, 2, QTableWidgetItem(groups))
-                self.teacher_report_tree.setItem(row, 3, QTableWidgetItem(subjects))
-        if 'group_name' in self.schedule.columns and not self.schedule[self.schedule['status'] == 'подтверждено'].empty:
-            group_load = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name').size()
-            for group, hours in group_load.items():
-                group_data = self.schedule[
-                    (self.schedule['group_name'] == group) &
-                    (self.schedule['status'] == 'подтверждено')
-                ]
-                subjects = ', '.join(group_data['subject_name'].unique())
-                teachers = ', '.join(group_data['teacher_name'].unique())
-                row = self.group_report_tree.rowCount()
-                self.group_report_tree.insertRow(row)
-                self.group_report_tree.setItem(row, 0, QTableWidgetItem(group))
-                self.group_report_tree.setItem(row, 1, QTableWidgetItem(str(hours)))
-                self.group_report_tree.setItem(row, 2, QTableWidgetItem(subjects))
-                self.group_report_tree.setItem(row, 3, QTableWidgetItem(teachers))
+        cube = self.report_cache.get(self.schedule)
         summary_text = f"📊 Сводный отчет по расписанию\n"
         summary_text += f"Учреждение: {self.settings.get('school_name', 'Не указано')}\n"
         summary_text += f"Директор: {self.settings.get('director', 'Не указано')}\n"
@@ -2060,13 +2300,19 @@ class ScheduleApp(QMainWindow):
         summary_text += f"🏫 Аудиторий: {len(self.classrooms)}\n"
         summary_text += f"📚 Предметов: {len(self.subjects)}\n"
         summary_text += f"🎉 Праздничных дней: {len(self.holidays)}\n"
-        if not self.schedule.empty:
-            confirmed_lessons = len(self.schedule[self.schedule['status'] == 'подтверждено'])
-            planned_lessons = len(self.schedule[self.schedule['status'] == 'запланировано'])
-            free_slots = len(self.schedule[self.schedule['status'] == 'свободно'])
-            summary_text += f"✅ Подтвержденных занятий: {confirmed_lessons}\n"
-            summary_text += f"📝 Запланированных занятий: {planned_lessons}\n"
-            summary_text += f"🕒 Свободных слотов: {free_slots}\n"
+        statuses = cube['statuses']
+        summary_text += f"✅ Подтвержденных занятий: {statuses.get('подтверждено', 0)}\n"
+        summary_text += f"📝 Запланированных занятий: {statuses.get('запланировано', 0)}\n"
+        summary_text += f"🕒 Свободных слотов: {statuses.get('свободно', 0)}\n"
+        # Ни расписание, ни сводка не менялись — таблицы уже показывают то же самое
+        if self._shown_reports is not None and self._shown_reports[0] is cube and self._shown_reports[1] == summary_text:
+            return
+        self._shown_reports = (cube, summary_text)
+        for tree, rows in ((self.teacher_report_tree, cube['teachers']), (self.group_report_tree, cube['groups'])):
+            tree.setRowCount(len(rows))
+            for row, values in enumerate(rows):
+                for col, value in enumerate(values):
+                    tree.setItem(row, col, QTableWidgetItem(str(value)))
         self.summary_text.setText(summary_text)
 
     def show_reports(self):
@@ -2170,7 +2416,7 @@ class ScheduleApp(QMainWindow):
                         hours = len(teacher_schedule)
 
                         # Формируем строку с предметами и часами (используем переносы строк)
-                        subject_hours = teacher_schedule['subject_name'].value_counts().to_dict()
+                        subject_hours = teacher_schedule['subject_name'].value_counts().loc[lambda counts: counts > 0].to_dict()
                         fact_subjects_str = ""
                         for subj, count in subject_hours.items():
                             fact_subjects_str += f"{subj}: {count} ч\n"  # Используем \n для Excel
@@ -2222,7 +2468,7 @@ class ScheduleApp(QMainWindow):
                     hours = len(group_schedule)
 
                     # Формируем строку с предметами и часами
-                    subject_hours = group_schedule['subject_name'].value_counts().to_dict()
+                    subject_hours = group_schedule['subject_name'].value_counts().loc[lambda counts: counts > 0].to_dict()
                     fact_subjects_str = ""
                     for subj, count in subject_hours.items():
                         fact_subjects_str += f"{subj}: {count} ч\n"  # Используем \n для Excel
@@ -2266,7 +2512,7 @@ class ScheduleApp(QMainWindow):
             # Сохраняем файл
             wb.save(filename)
             QMessageBox.information(self, "Экспорт", f"Расписание успешно экспортировано в {filename}")
-            self.create_backup()
+            self.refresh.mark('backup')
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка экспорта: {str(e)}")
@@ -2730,7 +2976,7 @@ class ScheduleApp(QMainWindow):
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write(html_content)
             QMessageBox.information(self, "Экспорт", f"Веб-сайт с расписанием успешно создан!\nФайл: {filename}\nТеперь вы можете открыть этот файл в браузере или загрузить его на ваш сайт.")
-            self.create_backup()
+            self.refresh.mark('backup')
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка экспорта в HTML: {str(e)}")
 
@@ -2767,7 +3013,7 @@ class ScheduleApp(QMainWindow):
                 'type': holiday_type
             })
             self.load_holidays_data()
-            self.create_backup()
+            self.refresh.mark('backup')
             dialog.accept()
         except ValueError:
             QMessageBox.critical(self, "Ошибка", "Неверный формат даты. Используйте ГГГГ-ММ-ДД")
@@ -2783,7 +3029,7 @@ class ScheduleApp(QMainWindow):
             holiday_name = self.holidays_tree.item(row, 1).text()
             self.holidays = [h for h in self.holidays if not (h['date'] == holiday_date and h['name'] == holiday_name)]
             self.load_holidays_data()
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def save_current_schedule(self):
         if self.schedule.empty:
@@ -2792,26 +3038,14 @@ class ScheduleApp(QMainWindow):
         school_name = self.settings.get('school_name', 'Расписание').replace(" ", "_")
         academic_year = self.settings.get('academic_year', 'Год_не_указан').replace("/", "_")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{school_name}_{academic_year}_{timestamp}.json"
+        suffix = engine.ARCHIVE_FORMATS.get(self.settings.get('archive_format', 'json'), '.json')
+        filename = f"{school_name}_{academic_year}_{timestamp}{suffix}"
         filepath = os.path.join(self.archive_dir, filename)
         try:
-            schedule_dict = self.schedule.to_dict(orient='records') if not self.schedule.empty else []
-            archive_data = {
-                'settings': self.settings,
-                'groups': self.groups,
-                'teachers': self.teachers,
-                'classrooms': self.classrooms,
-                'subjects': self.subjects,
-                'schedule': schedule_dict,
-                'holidays': self.holidays,
-                'substitutions': self.substitutions,
-                'saved_at': datetime.now().isoformat()
-            }
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(archive_data, f, ensure_ascii=False, indent=2)
+            engine.save_archive(filepath, self._state_data(), self.schedule)
+            self.archive_catalog.add(filename, engine.summarize(self._state_data(), self.schedule))
             QMessageBox.information(self, "Успех", f"Расписание успешно сохранено в архив! Файл: {filename}")
-            self.load_archive_list()
-            self.create_backup()
+            self.refresh.mark('archive', 'backup')
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения расписания в архив: {str(e)}")
 
@@ -2825,29 +3059,22 @@ class ScheduleApp(QMainWindow):
         filepath = os.path.join(self.archive_dir, filename)
         if QMessageBox.question(self, "Подтверждение", f"Вы уверены, что хотите загрузить расписание из файла {filename}?\nТекущие данные будут заменены.") == QMessageBox.Yes:
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data, schedule = engine.read_archive(filepath)
                 self.settings = data.get('settings', self.settings)
-                self.groups = data.get('groups', [])
-                self.teachers = data.get('teachers', [])
-                self.classrooms = data.get('classrooms', [])
-                self.subjects = data.get('subjects', [])
+                self.groups = engine.EntityRegistry(data.get('groups', []))
+                self.teachers = engine.EntityRegistry(data.get('teachers', []))
+                self.classrooms = engine.EntityRegistry(data.get('classrooms', []))
+                self.subjects = engine.EntityRegistry(data.get('subjects', []))
                 self.holidays = data.get('holidays', [])
                 self.substitutions = data.get('substitutions', [])
-                schedule_data = data.get('schedule', [])
-                if schedule_data:
-                    self.schedule = pd.DataFrame(schedule_data)
-                else:
-                    self.schedule = pd.DataFrame()
+                self.schedule = schedule
                 self.load_groups_data()
-                self.load_teachers_data()
                 self.load_classrooms_data()
                 self.load_subjects_data()
                 self.load_holidays_data()
-                self.filter_schedule()
-                self.update_reports()
+                self.refresh.mark('teachers', 'grid', 'reports')
                 QMessageBox.information(self, "Успех", f"Расписание успешно загружено из {filename}")
-                self.create_backup()
+                self.refresh.mark('backup')
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки расписания: {str(e)}")
 
@@ -2862,7 +3089,8 @@ class ScheduleApp(QMainWindow):
         if QMessageBox.question(self, "Подтверждение", f"Вы уверены, что хотите удалить файл {filename}?") == QMessageBox.Yes:
             try:
                 os.remove(filepath)
-                self.load_archive_list()
+                self.archive_catalog.remove(filename)
+                self.refresh.mark('archive')
                 QMessageBox.information(self, "Успех", f"Расписание {filename} успешно удалено из архива")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка удаления: {str(e)}")
@@ -2886,10 +3114,8 @@ class ScheduleApp(QMainWindow):
             return
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            schedule_data = data.get('schedule', [])
+            data, archive_schedule = engine.read_archive(filepath)
+            schedule_data = engine.schedule_to_records(archive_schedule)
             if not schedule_data:
                 QMessageBox.warning(self, "Предупреждение", "В выбранном файле нет данных расписания")
                 return
@@ -3349,7 +3575,16 @@ class ScheduleApp(QMainWindow):
         weeks_var.setValue(self.settings.get('weeks', 2))
         schedule_layout.addRow("Дней в неделю:", days_per_week_var)
         schedule_layout.addRow("Занятий в день:", lessons_per_day_var)
+        generation_mode_var = QComboBox()
+        generation_mode_var.addItem("Решатель ограничений", 'solver')
+        generation_mode_var.addItem("Случайная раскладка", 'random')
+        generation_mode_var.setCurrentIndex(max(0, generation_mode_var.findData(self.settings.get('generation_mode', 'solver'))))
         schedule_layout.addRow("Недель:", weeks_var)
+        generation_restarts_var = QSpinBox()
+        generation_restarts_var.setRange(1, 256)
+        generation_restarts_var.setValue(self.settings.get('generation_restarts', 1))
+        schedule_layout.addRow("Режим генерации:", generation_mode_var)
+        schedule_layout.addRow("Запусков (лучший из N):", generation_restarts_var)
         scroll_layout.addWidget(schedule_frame)
         bell_frame = QGroupBox("Расписание звонков")
         bell_layout = QFormLayout(bell_frame)
@@ -3373,7 +3608,28 @@ class ScheduleApp(QMainWindow):
         backup_layout.addRow("Авто-бэкап:", auto_backup_var)
         backup_layout.addRow("Интервал бэкапа (мин):", backup_interval_var)
         backup_layout.addRow("Макс. бэкапов:", max_backups_var)
+        dedup_var = QCheckBox()
+        dedup_var.setChecked(self.settings.get('backup_format', 'zip') == 'dedup')
+        backup_layout.addRow("Бэкапы с дедупликацией:", dedup_var)
+        compression_var = QSpinBox()
+        compression_var.setRange(0, 9)
+        compression_var.setValue(self.settings.get('backup_compression', engine.DEFAULT_COMPRESSION))
+        compression_var.setToolTip("0 — без сжатия, 1 — быстрее, 9 — меньше размер")
+        backup_layout.addRow("Уровень сжатия бэкапа:", compression_var)
+        backup_layout.addRow(QLabel("Хранятся только изменившиеся части, до "
+                                    f"{self.settings.get('max_restore_points', engine.DEFAULT_RESTORE_POINTS)} точек восстановления",
+                                    font=QFont('Segoe UI', 9, QFont.StyleItalic)))
         scroll_layout.addWidget(backup_frame)
+        storage_frame = QGroupBox("Хранение данных")
+        storage_layout = QFormLayout(storage_frame)
+        sqlite_var = QCheckBox()
+        sqlite_var.setChecked(self.settings.get('storage_backend', 'json') == 'sqlite')
+        storage_layout.addRow("База SQLite:", sqlite_var)
+        storage_layout.addRow(QLabel(f"Правки занятий сохраняются сразу в {self.db_path}", font=QFont('Segoe UI', 9, QFont.StyleItalic)))
+        columnar_archive_var = QCheckBox()
+        columnar_archive_var.setChecked(self.settings.get('archive_format', 'json') == 'columnar')
+        storage_layout.addRow("Архив в столбцовом формате:", columnar_archive_var)
+        scroll_layout.addWidget(storage_frame)
         scroll_area.setWidget(scroll_content)
         main_layout = QVBoxLayout(dialog)
         main_layout.addWidget(scroll_area)
@@ -3381,7 +3637,11 @@ class ScheduleApp(QMainWindow):
         button_box.accepted.connect(lambda: self._save_settings(
             school_name_var.text(), director_var.text(), academic_year_var.text(), start_date_var.text(),
             days_per_week_var.value(), lessons_per_day_var.value(), weeks_var.value(),
+            generation_mode_var.currentData(), generation_restarts_var.value(),
             auto_backup_var.isChecked(), backup_interval_var.value(), max_backups_var.value(),
+            'dedup' if dedup_var.isChecked() else 'zip', compression_var.value(),
+            'sqlite' if sqlite_var.isChecked() else 'json',
+            'columnar' if columnar_archive_var.isChecked() else 'json',
             bell_schedule_var.text(), dialog))
         button_box.rejected.connect(dialog.reject)
         main_layout.addWidget(button_box)
@@ -3394,9 +3654,9 @@ class ScheduleApp(QMainWindow):
         dialog.exec_()
 
     def _save_settings(self, school_name, director, academic_year, start_date,
-                      days_per_week, lessons_per_day, weeks,
-                      auto_backup, backup_interval, max_backups,
-                      bell_schedule, dialog):
+                      days_per_week, lessons_per_day, weeks, generation_mode, generation_restarts,
+                      auto_backup, backup_interval, max_backups, backup_format, backup_compression, storage_backend,
+                      archive_format, bell_schedule, dialog):
         self.settings['school_name'] = school_name
         self.settings['director'] = director
         self.settings['academic_year'] = academic_year
@@ -3404,10 +3664,19 @@ class ScheduleApp(QMainWindow):
         self.settings['days_per_week'] = days_per_week
         self.settings['lessons_per_day'] = lessons_per_day
         self.settings['weeks'] = weeks
+        self.settings['generation_mode'] = generation_mode
+        self.settings['generation_restarts'] = generation_restarts
         self.settings['auto_backup'] = auto_backup
         self.settings['backup_interval'] = backup_interval
         self.settings['max_backups'] = max_backups
+        self.settings['backup_format'] = backup_format
+        self.settings['backup_compression'] = backup_compression
+        self.settings['archive_format'] = archive_format
         self.settings['bell_schedule'] = bell_schedule
+        try:
+            self._set_storage_backend(storage_backend)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка открытия базы {self.db_path}: {e}")
         self.restart_auto_backup()
         self.update_backup_indicator()
         dialog.accept()
@@ -3434,7 +3703,7 @@ class ScheduleApp(QMainWindow):
         refresh_btn = QPushButton("🔄 Обновить")
         refresh_btn.clicked.connect(self.load_backup_list)
         create_btn = QPushButton("💾 Создать бэкап")
-        create_btn.clicked.connect(self.create_backup)
+        create_btn.clicked.connect(lambda: self.create_backup(snapshot=True))
         restore_btn = QPushButton("📂 Восстановить")
         restore_btn.clicked.connect(self.restore_backup)
         delete_btn = QPushButton("🗑️ Удалить")
@@ -3468,7 +3737,7 @@ class ScheduleApp(QMainWindow):
     def load_backup_list(self):
         self.backup_tree.setRowCount(0)
         try:
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.endswith('.zip')]
+            backup_files = [f for f in os.listdir(self.backup_dir) if engine.is_snapshot(f)]
             backup_files.sort(reverse=True)
             for filename in backup_files:
                 filepath = os.path.join(self.backup_dir, filename)
@@ -3499,10 +3768,12 @@ class ScheduleApp(QMainWindow):
         filepath = os.path.join(self.backup_dir, filename)
         if QMessageBox.question(self, "Подтверждение", f"Вы уверены, что хотите восстановить данные из {filename}?\nТекущие данные будут потеряны.") == QMessageBox.Yes:
             try:
-                with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                    zip_ref.extractall('.')
+                # Снимок и все правки из его журнала, включая еще не записанные
+                self.backup_writer.flush()
+                data, schedule = engine.restore_backup(filepath)
+                self._apply_state(data, schedule)
                 QMessageBox.information(self, "Успех", f"Данные успешно восстановлены из {filename}")
-                self.load_data()
+                self.refresh.mark('backup')
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка восстановления: {e}")
 
@@ -3516,49 +3787,38 @@ class ScheduleApp(QMainWindow):
         filepath = os.path.join(self.backup_dir, filename)
         if QMessageBox.question(self, "Подтверждение", f"Вы уверены, что хотите удалить {filename}?") == QMessageBox.Yes:
             try:
-                os.remove(filepath)
+                self.backup_writer.flush()
+                engine.delete_backup(filepath)
                 self.load_backup_list()
                 QMessageBox.information(self, "Успех", f"Бэкап {filename} успешно удален")
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка удаления: {e}")
 
-    def create_backup(self):
+    def create_backup(self, snapshot=False):
+        """Фиксирует изменения: в журнал или, если snapshot либо журнал не подходит, полным снимком.
+
+        Здесь снимаются только копии данных; запись на диск, удаление старых
+        бэкапов и обновление индикатора идут через фоновый backup_writer.
+        """
+        self.history.commit(self.schedule, self._state_data())
         try:
+            self._sync_store()
+            if not snapshot and self._journal_state():
+                return
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"backup_{timestamp}.zip"
-            backup_filepath = os.path.join(self.backup_dir, backup_filename)
-            temp_data_file = "temp_data.json"
-            data = {
-                'settings': self.settings,
-                'groups': self.groups,
-                'teachers': self.teachers,
-                'classrooms': self.classrooms,
-                'subjects': self.subjects,
-                'schedule': self.schedule.to_dict() if not self.schedule.empty else {},
-                'substitutions': self.substitutions,
-                'holidays': self.holidays
-            }
-            with open(temp_data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            with zipfile.ZipFile(backup_filepath, 'w') as zipf:
-                zipf.write(temp_data_file)
-            os.remove(temp_data_file)
-            self.cleanup_old_backups()
-            self.last_backup_time = datetime.now()
-            self.update_backup_indicator()
+            if self.settings.get('backup_format', 'zip') == 'dedup':
+                # Манифест хранилища с дедупликацией: на диск попадают только новые части
+                backup_filepath = os.path.join(self.backup_dir, f"backup_{timestamp}{engine.MANIFEST_SUFFIX}")
+                keep = self.settings.get('max_restore_points', engine.DEFAULT_RESTORE_POINTS)
+            else:
+                backup_filepath = os.path.join(self.backup_dir, f"backup_{timestamp}.zip")
+                keep = self.settings.get('max_backups', 10)
+            self.backup_writer.snapshot(backup_filepath, copy.deepcopy(self._state_data()), self.schedule.copy(), keep,
+                                        self.settings.get('backup_compression', engine.DEFAULT_COMPRESSION))
+            self._journaled_schedule = self.schedule
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка создания бэкапа: {str(e)}")
 
-    def cleanup_old_backups(self):
-        try:
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.endswith('.zip')]
-            backup_files.sort(key=lambda x: os.path.getctime(os.path.join(self.backup_dir, x)))
-            while len(backup_files) > self.settings.get('max_backups', 10):
-                oldest_file = backup_files.pop(0)
-                os.remove(os.path.join(self.backup_dir, oldest_file))
-        except Exception as e:
-            pass
-
     def start_auto_backup(self):
         if self.settings.get('auto_backup', True):
             interval = self.settings.get('backup_interval', 30) * 60 * 1000
@@ -3567,7 +3827,7 @@ class ScheduleApp(QMainWindow):
             self.backup_timer.start(interval)
 
     def auto_backup(self):
-        self.create_backup()
+        self.create_backup(snapshot=True)
 
     def restart_auto_backup(self):
         if self.backup_timer:
@@ -3619,17 +3879,10 @@ class ScheduleApp(QMainWindow):
             selected_week = int(week_text.split()[1]) if "Неделя" in week_text else 1
         except (ValueError, IndexError):
             selected_week = 1
-        target_lesson = self.schedule[
-            (self.schedule['week'] == selected_week) &
-            (self.schedule['day'] == selected_day) &
-            (self.schedule['time'] == time_slot) &
-            (self.schedule['status'] == 'подтверждено')
-        ]
-        if target_lesson.empty:
-            QMessageBox.information(self, "Информация", "Выбранное занятие не найдено в расписании")
+        lesson_idx = self._cell_lesson_index(selected_week, selected_day, time_slot)
+        if lesson_idx is None:
             return
-        lesson_info = target_lesson.iloc[0]
-        lesson_idx = target_lesson.index[0]
+        lesson_info = self.schedule.loc[lesson_idx]
         dialog = QDialog(self)
         dialog.setWindowTitle("Перенос занятия")
         dialog.setModal(True)
@@ -3709,18 +3962,19 @@ class ScheduleApp(QMainWindow):
             else:
                 QMessageBox.critical(self, "Ошибка", "Не удалось найти подходящий слот в расписании для переноса")
                 return
-            self.schedule.loc[update_idx, 'week'] = new_week
-            self.schedule.loc[update_idx, 'day'] = new_day
-            self.schedule.loc[update_idx, 'time'] = new_time
-            self.schedule.loc[update_idx, 'subject_id'] = lesson_info['subject_id']
-            self.schedule.loc[update_idx, 'subject_name'] = lesson_info['subject_name']
-            self.schedule.loc[update_idx, 'teacher_id'] = lesson_info['teacher_id']
-            self.schedule.loc[update_idx, 'teacher_name'] = lesson_info['teacher_name']
-            self.schedule.loc[update_idx, 'classroom_id'] = lesson_info['classroom_id']
-            self.schedule.loc[update_idx, 'classroom_name'] = lesson_info['classroom_name']
-            self.schedule.loc[update_idx, 'status'] = 'подтверждено'
-            self.schedule.loc[lesson_idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-            self.schedule.loc[lesson_idx, 'status'] = 'свободно'
+            self._set_lesson(update_idx,
+                             week=new_week,
+                             day=new_day,
+                             time=new_time,
+                             subject_id=lesson_info['subject_id'],
+                             subject_name=lesson_info['subject_name'],
+                             teacher_id=lesson_info['teacher_id'],
+                             teacher_name=lesson_info['teacher_name'],
+                             classroom_id=lesson_info['classroom_id'],
+                             classroom_name=lesson_info['classroom_name'],
+                             status='подтверждено')
+            if update_idx != lesson_idx:
+                self._clear_lesson(lesson_idx)
             self.substitutions.append({
                 'date': datetime.now().isoformat(),
                 'week': selected_week,
@@ -3735,9 +3989,7 @@ class ScheduleApp(QMainWindow):
                 'action': 'перенос',
                 'reason': reason_text
             })
-            self.filter_schedule()
-            self.update_reports()
-            self.create_backup()
+            self.refresh.mark('grid', 'reports', 'backup')
             QMessageBox.information(self, "Успех", f"Занятие успешно перенесено!\nНовое время: {new_day} {new_time} (Неделя {new_week})\nПричина: {reason_text}")
 
     def check_and_update_experience(self):
@@ -3747,8 +3999,7 @@ class ScheduleApp(QMainWindow):
             for teacher in self.teachers:
                 teacher['experience'] = teacher.get('experience', 0) + (current_year - last_update_year)
             self.settings['last_academic_year_update'] = current_year
-            self.load_teachers_data()
-            self.create_backup()
+            self.refresh.mark('teachers', 'backup')
 
     def find_free_slot(self):
         dialog = QDialog(self)
@@ -3798,6 +4049,53 @@ class ScheduleApp(QMainWindow):
         layout.addWidget(search_btn)
         dialog.exec_()
 
+    def regenerate_partial(self):
+        if self.schedule.empty:
+            QMessageBox.information(self, "Информация", "Сначала сгенерируйте расписание")
+            return
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Перегенерировать часть расписания")
+        dialog.setModal(True)
+        dialog.resize(400, 250)
+        layout = QFormLayout(dialog)
+        group_var = QComboBox()
+        group_var.addItem("Все", None)
+        for g in self.groups:
+            group_var.addItem(g['name'], g['id'])
+        week_var = QComboBox()
+        week_var.addItem("Все", None)
+        for week in sorted(self.schedule['week'].unique()):
+            week_var.addItem(f"Неделя {week}", int(week))
+        teacher_var = QComboBox()
+        teacher_var.addItem("Все", None)
+        for t in self.teachers:
+            teacher_var.addItem(t['name'], t['id'])
+        layout.addRow("Группа:", group_var)
+        layout.addRow("Неделя:", week_var)
+        layout.addRow("Преподаватель:", teacher_var)
+        layout.addRow(QLabel("Остальные занятия не изменятся. Если ничего не выбрано,\n"
+                             "в расписание будут добавлены только новые группы."))
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addRow(button_box)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        try:
+            self.schedule = engine.regenerate(self.schedule, self._engine_data(),
+                                              group_id=group_var.currentData(),
+                                              week=week_var.currentData(),
+                                              teacher_id=teacher_var.currentData())
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка перегенерации: {str(e)}")
+            return
+        self.refresh.mark('grid', 'reports', 'backup')
+        unplaced = self.schedule.attrs.get('unplaced', 0)
+        if unplaced:
+            QMessageBox.information(self, "Успех", f"Готово. Не удалось разместить часов: {unplaced}")
+        else:
+            QMessageBox.information(self, "Успех", "Выбранная часть расписания перегенерирована")
+
     def show_about(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("О программе")
@@ -3891,7 +4189,7 @@ class ScheduleApp(QMainWindow):
                 with open(filename, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=2)
                 QMessageBox.information(self, "Сохранение", "Данные успешно сохранены!")
-                self.create_backup()
+                self.refresh.mark('backup')
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Ошибка сохранения: {str(e)}")
 
@@ -3903,33 +4201,21 @@ class ScheduleApp(QMainWindow):
             with open(filename, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             self.settings = data.get('settings', self.settings)
-            self.groups = data.get('groups', [])
-            self.teachers = data.get('teachers', [])
-            self.classrooms = data.get('classrooms', [])
-            self.subjects = data.get('subjects', [])
+            self.groups = engine.EntityRegistry(data.get('groups', []))
+            self.teachers = engine.EntityRegistry(data.get('teachers', []))
+            self.classrooms = engine.EntityRegistry(data.get('classrooms', []))
+            self.subjects = engine.EntityRegistry(data.get('subjects', []))
             self.holidays = data.get('holidays', [])
             self.substitutions = data.get('substitutions', [])
-            schedule_data = data.get('schedule', [])
-            if isinstance(schedule_data, list):
-                expected_columns = ['week', 'day', 'time', 'group_id', 'group_name', 'subject_id', 'subject_name',
-                                    'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name', 'status']
-                self.schedule = pd.DataFrame(columns=expected_columns)
-                for item in schedule_data:
-                    row = {}
-                    for col in expected_columns:
-                        row[col] = item.get(col, None)
-                    self.schedule = self.schedule._append(row, ignore_index=True)
-            else:
-                self.schedule = pd.DataFrame()
+            # Список записей (архив) или столбцы DataFrame.to_dict() (бэкап)
+            self.schedule = engine.schedule_from_json(data.get('schedule', []), self.settings)
             self.load_groups_data()
-            self.load_teachers_data()
             self.load_classrooms_data()
             self.load_subjects_data()
             self.load_holidays_data()
-            self.filter_schedule()
-            self.update_reports()
+            self.refresh.mark('teachers', 'grid', 'reports')
             QMessageBox.information(self, "Успех", f"Данные успешно загружены из {filename}")
-            self.create_backup()
+            self.refresh.mark('backup')
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка загрузки данных: {str(e)}")
 
@@ -1,16 +1,19 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import pandas as pd
 import numpy as np
-import random
 from datetime import datetime, timedelta
 import threading
+import copy
 import json
 import os
 import calendar
 import shutil
-import zipfile
 from pathlib import Path
+import schedule_engine as engine
+
+# Строк сетки расписания, обновляемых за один проход цикла Tk; остальные — через root.after
+SCHEDULE_GRID_CHUNK = 50
 
 class BellScheduleEditor:
     """Класс для редактирования расписания звонков"""
@@ -255,12 +258,18 @@ class ScheduleApp:
             'auto_backup': True,
             'backup_interval': 30,  # минуты
             'max_backups': 10,
-            'last_academic_year_update': datetime.now().year  # Год последнего обновления стажа
+            'last_academic_year_update': datetime.now().year,  # Год последнего обновления стажа
+            'generation_mode': 'solver',  # 'solver' — решатель ограничений, 'random' — случайная раскладка
+            'generation_restarts': 1,  # >1 — несколько запусков в пуле процессов, сохраняется лучший
+            'storage_backend': 'json',  # 'sqlite' — данные в schedule.db, правки занятий сохраняются точечно
+            'backup_format': 'zip',  # 'dedup' — манифесты и общие части вместо полных zip
+            'backup_compression': 6,  # уровень deflate для бэкапов: 0 — без сжатия, 9 — максимальное
+            'archive_format': 'json'  # 'columnar' — архив *.npcol со столбцами numpy, открывается без разбора JSON
         }
-        self.groups = []
-        self.teachers = []
-        self.classrooms = []
-        self.subjects = []
+        self.groups = engine.EntityRegistry()
+        self.teachers = engine.EntityRegistry()
+        self.classrooms = engine.EntityRegistry()
+        self.subjects = engine.EntityRegistry()
         self.schedule = pd.DataFrame()
         self.substitutions = []  # Журнал замен
         self.holidays = []  # Праздничные дни
@@ -276,8 +285,33 @@ class ScheduleApp:
         self.backup_dir = "backups"
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir)
+        # Необязательное хранилище SQLite
+        self.db_path = "schedule.db"
+        self.store = None
+        self._stored_schedule = None
+        # Снимки и журнал правок пишутся в фоновом потоке; его колбэки
+        # передаются в поток Tk через root.after
+        self.backup_writer = engine.BackupWriter(
+            on_written=lambda path: self.root.after(0, self._on_backup_written, path),
+            on_error=lambda message: self.root.after(0, self._on_backup_failed, message))
+        self._journaled_schedule = None
+        # Отмена и повтор правок; шаг закрывается в create_backup
+        self.history = engine.EditHistory()
+        # Сетка недели: раскладка расписания и значения показанных строк Treeview
+        self._schedule_grid = None
+        self._grid_values = {}
+        self._grid_update = 0
+        # Данные отчетов пересчитываются только после изменения расписания
+        self.report_cache = engine.ReportCache()
+        self._shown_reports = None
+        # Обработчики правок только отмечают устаревшие представления (self.refresh.mark)
+        self.refresh = engine.RefreshScheduler(self.root.after_idle)
         self.create_widgets()
-        self.load_data()
+        self._register_views()
+        self.root.bind('<Control-z>', lambda event: self.undo())
+        self.root.bind('<Control-y>', lambda event: self.redo())
+        if not self._open_store():
+            self.load_data()
         self.start_auto_backup()
         self.check_and_update_experience()  # Проверка и обновление стажа при запуске
 
@@ -392,6 +426,7 @@ class ScheduleApp:
         # Основная область с вкладками
         notebook = ttk.Notebook(main_frame)
         notebook.pack(fill=tk.BOTH, expand=True)
+        self.notebook = notebook
         # Вкладка Группы
         self.groups_frame = ttk.Frame(notebook)
         notebook.add(self.groups_frame, text="👥 Группы")
@@ -441,89 +476,64 @@ class ScheduleApp:
         school_name = self.settings.get('school_name', 'Расписание').replace(" ", "_")
         academic_year = self.settings.get('academic_year', 'Год_не_указан').replace("/", "_")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{school_name}_{academic_year}_{timestamp}.json"
+        suffix = engine.ARCHIVE_FORMATS.get(self.settings.get('archive_format', 'json'), '.json')
+        filename = f"{school_name}_{academic_year}_{timestamp}{suffix}"
         filepath = os.path.join(self.archive_dir, filename)
 
         try:
-            # Подготавливаем данные для сохранения
-            # Преобразуем DataFrame в словарь для сериализации
-            schedule_dict = self.schedule.to_dict(orient='records') if not self.schedule.empty else []
-
-            archive_data = {
-                'settings': self.settings,
-                'groups': self.groups,
-                'teachers': self.teachers,
-                'classrooms': self.classrooms,
-                'subjects': self.subjects,
-                'schedule': schedule_dict,
-                'holidays': self.holidays,
-                'substitutions': self.substitutions,
-                'saved_at': datetime.now().isoformat()
-            }
-
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(archive_data, f, ensure_ascii=False, indent=2)
+            # Формат определяется расширением: JSON-записи или столбцовый *.npcol
+            engine.save_archive(filepath, self._state_data(), self.schedule)
+            self.archive_catalog.add(filename, engine.summarize(self._state_data(), self.schedule))
 
             messagebox.showinfo("Успех", f"Расписание успешно сохранено в архив!\nФайл: {filename}")
-            self.load_archive_list() # Обновляем список
-            self.create_backup() # Создаем бэкап после сохранения в архив
+            self.refresh.mark('archive', 'backup')
 
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка сохранения расписания в архив: {str(e)}")
 
     def load_archive_list(self):
-        """Загрузить список архивных расписаний"""
+        """Загрузить список архивных расписаний (сводки — из каталога архива)"""
         # Очистка таблицы
         for item in self.archive_tree.get_children():
             self.archive_tree.delete(item)
 
         try:
-            # Получаем список файлов
-            archive_files = [f for f in os.listdir(self.archive_dir) if f.endswith('.json')]
-            archive_files.sort(key=lambda x: os.path.getmtime(os.path.join(self.archive_dir, x)), reverse=True) # Сортировка по дате (новые первые)
-
-            for filename in archive_files:
-                filepath = os.path.join(self.archive_dir, filename)
-                stat = os.stat(filepath)
-                creation_time = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-
-                # Читаем файл, чтобы получить статистику
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    groups_count = len(data.get('groups', []))
-                    teachers_count = len(data.get('teachers', []))
-                    classrooms_count = len(data.get('classrooms', []))
-                    subjects_count = len(data.get('subjects', []))
-                    # Считаем только подтвержденные занятия
-                    schedule = data.get('schedule', [])
-                    lessons_count = len([s for s in schedule if s.get('status') == 'подтверждено'])
-
-                    self.archive_tree.insert('', tk.END, values=(
-                        filename,
-                        creation_time,
-                        groups_count,
-                        teachers_count,
-                        classrooms_count,
-                        subjects_count,
-                        lessons_count
-                    ))
-                except Exception as e:
+            pending = False
+            # Файлы от новых к старым; сводка None — файл еще не разобран
+            for filename, mtime, summary in self.archive_catalog.entries():
+                creation_time = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+                if summary is None:
+                    pending = True
+                    counts = ("…",) * 5
+                elif 'error' in summary:
                     # Если файл поврежден, показываем только имя и дату
-                    self.archive_tree.insert('', tk.END, values=(
-                        filename,
-                        creation_time,
-                        "Ошибка",
-                        "Ошибка",
-                        "Ошибка",
-                        "Ошибка",
-                        "Ошибка"
-                    ))
+                    counts = ("Ошибка",) * 5
+                else:
+                    # Считаем только подтвержденные занятия
+                    counts = (summary['groups'], summary['teachers'], summary['classrooms'], summary['subjects'],
+                              engine.lessons_count(summary, ['подтверждено']))
+                self.archive_tree.insert('', tk.END, values=(filename, creation_time) + counts)
+
+            # Новые файлы разбираются в фоне, после чего список перестраивается
+            if pending and not self._catalog_refreshing:
+                self._catalog_refreshing = True
+                threading.Thread(target=self._refresh_archive_catalog, daemon=True).start()
 
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка загрузки списка архива: {e}")
 
+    def _refresh_archive_catalog(self):
+        try:
+            parsed = self.archive_catalog.refresh()
+        except Exception:
+            parsed = 0
+        self.root.after(0, self._on_archive_catalog_ready, parsed)
+
+    def _on_archive_catalog_ready(self, parsed):
+        self._catalog_refreshing = False
+        if parsed:
+            self.refresh.mark('archive')
+
     def load_archived_schedule(self):
         """Загрузить выбранное расписание из архива"""
         selected = self.archive_tree.selection()
@@ -537,36 +547,29 @@ class ScheduleApp:
 
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите загрузить расписание из файла {filename}?\nТекущие данные будут заменены."):
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data, schedule = engine.read_archive(filepath)
 
                 # Загружаем данные
                 self.settings = data.get('settings', self.settings)
-                self.groups = data.get('groups', [])
-                self.teachers = data.get('teachers', [])
-                self.classrooms = data.get('classrooms', [])
-                self.subjects = data.get('subjects', [])
+                self.groups = engine.EntityRegistry(data.get('groups', []))
+                self.teachers = engine.EntityRegistry(data.get('teachers', []))
+                self.classrooms = engine.EntityRegistry(data.get('classrooms', []))
+                self.subjects = engine.EntityRegistry(data.get('subjects', []))
                 self.holidays = data.get('holidays', [])
                 self.substitutions = data.get('substitutions', [])
 
                 # Загружаем расписание
-                schedule_data = data.get('schedule', [])
-                if schedule_data:
-                    self.schedule = pd.DataFrame(schedule_data)
-                else:
-                    self.schedule = pd.DataFrame()
+                self.schedule = schedule
 
                 # Обновляем интерфейс
                 self.load_groups_data()
-                self.load_teachers_data()
                 self.load_classrooms_data()
                 self.load_subjects_data()
                 self.load_holidays_data()
-                self.filter_schedule()
-                self.update_reports()
+                self.refresh.mark('teachers', 'grid', 'reports')
 
                 messagebox.showinfo("Успех", f"Расписание успешно загружено из {filename}")
-                self.create_backup() # Создаем бэкап после загрузки
+                self.refresh.mark('backup')
 
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка загрузки расписания: {str(e)}")
@@ -585,7 +588,8 @@ class ScheduleApp:
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить файл {filename}?"):
             try:
                 os.remove(filepath)
-                self.load_archive_list() # Обновляем список
+                self.archive_catalog.remove(filename)
+                self.refresh.mark('archive')
                 messagebox.showinfo("Успех", f"Расписание {filename} успешно удалено из архива")
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка удаления: {str(e)}")
@@ -612,11 +616,12 @@ class ScheduleApp:
             return
 
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Создаем DataFrame из архивного расписания
-            schedule_data = data.get('schedule', [])
+            # Создаем DataFrame из архивного расписания: в выгрузку идут подтвержденные занятия,
+            # поэтому из столбцового архива читаются только их строки; все — если подтвержденных нет
+            data, schedule = engine.read_archive(filepath, statuses=['подтверждено'])
+            if schedule.empty:
+                data, schedule = engine.read_archive(filepath)
+            schedule_data = engine.schedule_to_records(schedule)
             if not schedule_data:
                 messagebox.showwarning("Предупреждение", "В выбранном файле нет данных расписания")
                 return
@@ -640,20 +645,20 @@ class ScheduleApp:
 
                 # Отчеты (если есть подтвержденные занятия)
                 if not archive_schedule.empty and not archive_schedule[archive_schedule['status'] == 'подтверждено'].empty:
-                    teacher_report = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('teacher_name').agg({
+                    teacher_report = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('teacher_name', observed=True).agg({
                         'group_name': lambda x: ', '.join(x.unique()),
                         'subject_name': lambda x: ', '.join(x.unique())
                     }).reset_index()
                     teacher_report.columns = ['Преподаватель', 'Группы', 'Предметы']
-                    teacher_report['Часы'] = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('teacher_name').size().values
+                    teacher_report['Часы'] = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('teacher_name', observed=True).size().values
                     teacher_report.to_excel(writer, sheet_name='Нагрузка преподавателей', index=False)
 
-                    group_report = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('group_name').agg({
+                    group_report = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('group_name', observed=True).agg({
                         'teacher_name': lambda x: ', '.join(x.unique()),
                         'subject_name': lambda x: ', '.join(x.unique())
                     }).reset_index()
                     group_report.columns = ['Группа', 'Преподаватели', 'Предметы']
-                    group_report['Часы'] = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('group_name').size().values
+                    group_report['Часы'] = archive_schedule[archive_schedule['status'] == 'подтверждено'].groupby('group_name', observed=True).size().values
                     group_report.to_excel(writer, sheet_name='Нагрузка групп', index=False)
 
             messagebox.showinfo("Экспорт", f"Расписание успешно экспортировано в {save_path}")
@@ -795,7 +800,8 @@ class ScheduleApp:
             ("🔄 Заменить занятие", self.substitute_lesson),
             ("📅 Календарь", self.show_calendar),
             ("🌐 Экспорт в HTML", self.export_to_html),
-            ("⏱️ Найти свободное время", self.find_free_slot)  # Новая кнопка
+            ("⏱️ Найти свободное время", self.find_free_slot),  # Новая кнопка
+            ("♻️ Перегенерировать часть", self.regenerate_partial)
         ]
 
         for text, command in buttons:
@@ -888,6 +894,49 @@ class ScheduleApp:
     
         ttk.Button(dialog, text="Найти", command=search_slot).pack(pady=20)
 
+    def regenerate_partial(self):
+        """Перегенерация одной группы, недели или преподавателя без изменения остального расписания"""
+        if self.schedule.empty:
+            messagebox.showinfo("Информация", "Сначала сгенерируйте расписание")
+            return
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Перегенерировать часть расписания")
+        dialog.geometry("400x260")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        groups = {g['name']: g['id'] for g in self.groups}
+        weeks = {f"Неделя {w}": int(w) for w in sorted(self.schedule['week'].unique())}
+        teachers = {t['name']: t['id'] for t in self.teachers}
+        choices = []
+        for row, (label, values) in enumerate((("Группа:", groups), ("Неделя:", weeks), ("Преподаватель:", teachers))):
+            ttk.Label(dialog, text=label).grid(row=row, column=0, sticky=tk.W, padx=10, pady=5)
+            var = tk.StringVar(value="Все")
+            ttk.Combobox(dialog, textvariable=var, values=["Все"] + list(values), state="readonly", width=28).grid(
+                row=row, column=1, padx=10, pady=5, sticky=tk.W)
+            choices.append((var, values))
+        ttk.Label(dialog, text="Остальные занятия не изменятся. Если ничего не выбрано,\n"
+                               "в расписание будут добавлены только новые группы.").grid(
+            row=3, column=0, columnspan=2, padx=10, pady=5, sticky=tk.W)
+
+        def run():
+            group_id, week, teacher_id = (values.get(var.get()) for var, values in choices)
+            try:
+                self.schedule = engine.regenerate(self.schedule, self._engine_data(),
+                                                  group_id=group_id, week=week, teacher_id=teacher_id)
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка перегенерации: {str(e)}")
+                return
+            dialog.destroy()
+            self.refresh.mark('grid', 'reports', 'backup')
+            unplaced = self.schedule.attrs.get('unplaced', 0)
+            if unplaced:
+                messagebox.showinfo("Успех", f"Готово. Не удалось разместить часов: {unplaced}")
+            else:
+                messagebox.showinfo("Успех", "Выбранная часть расписания перегенерирована")
+
+        ttk.Button(dialog, text="Перегенерировать", command=run).grid(row=4, column=1, pady=15, padx=10, sticky=tk.E)
+
     def create_reports_tab(self):
         # Фреймы для отчетов
         reports_notebook = ttk.Notebook(self.reports_frame)
@@ -975,7 +1024,7 @@ class ScheduleApp:
                     })
                     self.load_holidays_data()
                     dialog.destroy()
-                    self.create_backup()
+                    self.refresh.mark('backup')
                 except ValueError:
                     messagebox.showerror("Ошибка", "Неверный формат даты. Используйте ГГГГ-ММ-ДД")
             else:
@@ -993,7 +1042,7 @@ class ScheduleApp:
                 # Находим и удаляем праздник по дате и названию (предполагаем, что они уникальны вместе)
                 self.holidays = [h for h in self.holidays if not (h['date'] == holiday_date and h['name'] == holiday_name)]
                 self.load_holidays_data()
-                self.create_backup()
+                self.refresh.mark('backup')
         else:
             messagebox.showinfo("Информация", "Выберите праздник для удаления")
 
@@ -1022,6 +1071,9 @@ class ScheduleApp:
         self.archive_dir = "schedule_archive"
         if not os.path.exists(self.archive_dir):
             os.makedirs(self.archive_dir)
+        # Сводки архивов (catalog.json), чтобы список не разбирал каждый файл
+        self.archive_catalog = engine.ArchiveCatalog(self.archive_dir)
+        self._catalog_refreshing = False
 
         # Фрейм для кнопок
         btn_frame = ttk.Frame(self.archive_frame)
@@ -1187,7 +1239,7 @@ class ScheduleApp:
                 })
                 self.load_groups_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите название группы")
         ttk.Button(dialog, text="Сохранить", command=save_group).grid(row=5, column=0, columnspan=2, pady=20)
@@ -1199,7 +1251,7 @@ class ScheduleApp:
             return
         item = self.groups_tree.item(selected[0])
         group_id = item['values'][0]
-        group = next((g for g in self.groups if g['id'] == group_id), None)
+        group = self.groups.by_id(group_id)
         if not group:
             return
         # Создание диалогового окна для редактирования группы
@@ -1236,13 +1288,14 @@ class ScheduleApp:
         def save_group():
             if name_entry.get():
                 group['name'] = name_entry.get()
+                self.groups.touch()
                 group['type'] = type_var.get()
                 group['students'] = int(students_var.get())
                 group['course'] = course_var.get()
                 group['specialty'] = specialty_var.get()
                 self.load_groups_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите название группы")
         ttk.Button(dialog, text="Сохранить", command=save_group).grid(row=5, column=0, columnspan=2, pady=20)
@@ -1253,9 +1306,9 @@ class ScheduleApp:
             if messagebox.askyesno("Подтверждение", "Удалить выбранную группу?"):
                 item = self.groups_tree.item(selected[0])
                 group_id = item['values'][0]
-                self.groups = [g for g in self.groups if g['id'] != group_id]
+                self.groups[:] = [g for g in self.groups if g['id'] != group_id]
                 self.load_groups_data()
-                self.create_backup()
+                self.refresh.mark('backup')
         else:
             messagebox.showinfo("Информация", "Выберите группу для удаления")
 
@@ -1336,9 +1389,9 @@ class ScheduleApp:
                     'max_lessons_per_day': int(max_lessons_per_day_var.get())
                     # --- КОНЕЦ НОВЫХ ПОЛЕЙ ---
                 })
-                self.load_teachers_data()
+                self.refresh.mark('teachers')
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите ФИО преподавателя")
 
@@ -1351,7 +1404,7 @@ class ScheduleApp:
             return
         item = self.teachers_tree.item(selected[0])
         teacher_id = item['values'][0]
-        teacher = next((t for t in self.teachers if t['id'] == teacher_id), None)
+        teacher = self.teachers.by_id(teacher_id)
         if not teacher:
             return
         # Создание диалогового окна для редактирования преподавателя
@@ -1418,6 +1471,7 @@ class ScheduleApp:
         def save_teacher():
             if name_entry.get():
                 teacher['name'] = name_entry.get()
+                self.teachers.touch()
                 teacher['subjects'] = subjects_entry.get()
                 teacher['max_hours'] = int(max_hours_var.get())
                 teacher['qualification'] = qualification_var.get()
@@ -1428,9 +1482,9 @@ class ScheduleApp:
                 teacher['preferred_days'] = preferred_days_var.get()
                 teacher['max_lessons_per_day'] = int(max_lessons_per_day_var.get())
                 # --- КОНЕЦ НОВЫХ ПОЛЕЙ ---
-                self.load_teachers_data()
+                self.refresh.mark('teachers')
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите ФИО преподавателя")
 
@@ -1442,9 +1496,8 @@ class ScheduleApp:
             if messagebox.askyesno("Подтверждение", "Удалить выбранного преподавателя?"):
                 item = self.teachers_tree.item(selected[0])
                 teacher_id = item['values'][0]
-                self.teachers = [t for t in self.teachers if t['id'] != teacher_id]
-                self.load_teachers_data()
-                self.create_backup()
+                self.teachers[:] = [t for t in self.teachers if t['id'] != teacher_id]
+                self.refresh.mark('teachers', 'backup')
         else:
             messagebox.showinfo("Информация", "Выберите преподавателя для удаления")
 
@@ -1456,8 +1509,7 @@ class ScheduleApp:
             for teacher in self.teachers:
                 teacher['experience'] = teacher.get('experience', 0) + 1
                 updated_count += 1
-            self.load_teachers_data()
-            self.create_backup()
+            self.refresh.mark('teachers', 'backup')
             messagebox.showinfo("Успех", f"Стаж обновлен у {updated_count} преподавателей")
 
     def add_classroom(self):
@@ -1506,7 +1558,7 @@ class ScheduleApp:
                 })
                 self.load_classrooms_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите номер аудитории")
         ttk.Button(dialog, text="Сохранить", command=save_classroom).grid(row=5, column=0, columnspan=2, pady=20)
@@ -1518,7 +1570,7 @@ class ScheduleApp:
             return
         item = self.classrooms_tree.item(selected[0])
         classroom_id = item['values'][0]
-        classroom = next((c for c in self.classrooms if c['id'] == classroom_id), None)
+        classroom = self.classrooms.by_id(classroom_id)
         if not classroom:
             return
         # Создание диалогового окна для редактирования аудитории
@@ -1557,13 +1609,14 @@ class ScheduleApp:
         def save_classroom():
             if name_entry.get():
                 classroom['name'] = name_entry.get()
+                self.classrooms.touch()
                 classroom['capacity'] = int(capacity_var.get())
                 classroom['type'] = type_var.get()
                 classroom['equipment'] = equipment_var.get()
                 classroom['location'] = location_var.get()
                 self.load_classrooms_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите номер аудитории")
         ttk.Button(dialog, text="Сохранить", command=save_classroom).grid(row=5, column=0, columnspan=2, pady=20)
@@ -1574,9 +1627,9 @@ class ScheduleApp:
             if messagebox.askyesno("Подтверждение", "Удалить выбранную аудиторию?"):
                 item = self.classrooms_tree.item(selected[0])
                 classroom_id = item['values'][0]
-                self.classrooms = [c for c in self.classrooms if c['id'] != classroom_id]
+                self.classrooms[:] = [c for c in self.classrooms if c['id'] != classroom_id]
                 self.load_classrooms_data()
-                self.create_backup()
+                self.refresh.mark('backup')
         else:
             messagebox.showinfo("Информация", "Выберите аудиторию для удаления")
 
@@ -1632,7 +1685,7 @@ class ScheduleApp:
                 })
                 self.load_subjects_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите название предмета")
         ttk.Button(dialog, text="Сохранить", command=save_subject).grid(row=6, column=0, columnspan=2, pady=20)
@@ -1644,7 +1697,7 @@ class ScheduleApp:
             return
         item = self.subjects_tree.item(selected[0])
         subject_id = item['values'][0]
-        subject = next((s for s in self.subjects if s['id'] == subject_id), None)
+        subject = self.subjects.by_id(subject_id)
         if not subject:
             return
         # Создание диалогового окна для редактирования предмета
@@ -1688,6 +1741,7 @@ class ScheduleApp:
         def save_subject():
             if name_entry.get():
                 subject['name'] = name_entry.get()
+                self.subjects.touch()
                 subject['group_type'] = group_type_var.get()
                 subject['hours_per_week'] = int(hours_var.get())
                 subject['assessment'] = assessment_var.get()
@@ -1695,7 +1749,7 @@ class ScheduleApp:
                 subject['description'] = description_var.get()
                 self.load_subjects_data()
                 dialog.destroy()
-                self.create_backup()
+                self.refresh.mark('backup')
             else:
                 messagebox.showwarning("Предупреждение", "Введите название предмета")
         ttk.Button(dialog, text="Сохранить", command=save_subject).grid(row=6, column=0, columnspan=2, pady=20)
@@ -1706,9 +1760,9 @@ class ScheduleApp:
             if messagebox.askyesno("Подтверждение", "Удалить выбранный предмет?"):
                 item = self.subjects_tree.item(selected[0])
                 subject_id = item['values'][0]
-                self.subjects = [s for s in self.subjects if s['id'] != subject_id]
+                self.subjects[:] = [s for s in self.subjects if s['id'] != subject_id]
                 self.load_subjects_data()
-                self.create_backup()
+                self.refresh.mark('backup')
         else:
             messagebox.showinfo("Информация", "Выберите предмет для удаления")
 
@@ -1744,69 +1798,181 @@ class ScheduleApp:
             self.settings['lessons_per_day'] = int(self.lessons_var.get())
             self.settings['weeks'] = int(self.weeks_var.get())
             
-            # Получаем список праздничных дат
-            holiday_dates = []
-            for h in self.holidays:
-                try:
-                    holiday_dates.append(datetime.strptime(h['date'], '%Y-%m-%d').date())
-                except ValueError:
-                    # Пропускаем некорректные даты
-                    continue
-
-            # Создание структуры расписания, исключая праздники
-            days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'][:self.settings['days_per_week']]
-            # Генерируем список всех дат в периоде расписания
-            start_date = datetime.strptime(self.settings['start_date'], '%Y-%m-%d').date()
-            all_dates = []
-            for week in range(self.settings['weeks']):
-                for day_index, day_name in enumerate(days):
-                    current_date = start_date + timedelta(weeks=week, days=day_index)
-                    # Проверяем, не является ли дата праздником
-                    if current_date not in holiday_dates:
-                        all_dates.append((week+1, day_name, current_date))
-
-            # Создаем расписание только для рабочих дней
-            schedule_data = []
-            lesson_id = 1
-            
-            # Получаем настройки времени звонков, если они есть
-            bell_schedule_str = self.settings.get('bell_schedule', '8:00-8:45,8:55-9:40,9:50-10:35,10:45-11:30,11:40-12:25,12:35-13:20')
-            times = [slot.strip() for slot in bell_schedule_str.split(',')]  # Убираем лишние пробелы
-            
-            for week_num, day_name, _ in all_dates:
-                for time_slot in times:
-                    for group in self.groups:
-                        schedule_data.append({
-                            'id': lesson_id,
-                            'week': week_num,
-                            'day': day_name,
-                            'time': time_slot,
-                            'group_id': group['id'],
-                            'group_name': group['name'],
-                            'subject_id': None,
-                            'subject_name': '',
-                            'teacher_id': None,
-                            'teacher_name': '',
-                            'classroom_id': None,
-                            'classroom_name': '',
-                            'status': 'свободно'
-                        })
-                        lesson_id += 1
-
-            self.schedule = pd.DataFrame(schedule_data)
-            
-            # Назначение предметов группам
-            self.assign_subjects_to_groups()
-            # Назначение преподавателей и аудиторий
-            self.assign_teachers_and_classrooms()
-            
+            # Создание структуры расписания (без праздников) и назначение занятий
+            mode = self.settings.get('generation_mode', 'solver')
+            restarts = self.settings.get('generation_restarts', 1)
+            self.generation_seed = None
+            if restarts > 1:
+                result = engine.best_of_n(self._engine_data(), restarts, mode=mode)
+                self.schedule = result.schedule
+                self.generation_seed = result.seed
+            else:
+                self.schedule = engine.generate_schedule(self._engine_data(), mode=mode)
+
             # Обновление интерфейса в основном потоке
             self.root.after(0, self.on_schedule_generated)
         
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Ошибка", f"Ошибка генерации расписания: {str(e)}"))
+            msg = str(e)
+            self.root.after(0, lambda msg=msg: messagebox.showerror("Ошибка", f"Ошибка генерации расписания: {msg}"))
             self.root.after(0, self.progress.stop)
 
+    def _engine_data(self):
+        """Данные приложения в формате движка расписания"""
+        return {
+            'settings': self.settings,
+            'groups': self.groups,
+            'teachers': self.teachers,
+            'classrooms': self.classrooms,
+            'subjects': self.subjects,
+            'holidays': self.holidays
+        }
+
+    def _register_views(self):
+        """Представления для self.refresh; номера вкладок — порядок notebook.add в create_widgets"""
+        self.refresh.current_tab = lambda: self.notebook.index(self.notebook.select())
+        # Список преподавателей нужен и фильтру на вкладке «Расписание»
+        self.refresh.register('teachers', self.load_teachers_data, tabs=(1, 4))
+        self.refresh.register('grid', self.filter_schedule, tabs=(4,))
+        self.refresh.register('reports', self.update_reports, tabs=(5,))
+        self.refresh.register('archive', self.load_archive_list, tabs=(7,))
+        # Бэкап закрывает шаг отмены, поэтому идет последним и не зависит от вкладки
+        self.refresh.register('backup', self.create_backup)
+        self.notebook.bind('<<NotebookTabChanged>>', self.refresh.tab_changed)
+
+    def _set_lesson(self, rows, **fields):
+        """Единая точка записи занятий в self.schedule (см. engine.set_lesson)"""
+        self.history.before_lessons(self.schedule, rows)
+        engine.set_lesson(self.schedule, rows, **fields)
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+
+    def _clear_lesson(self, rows):
+        self.history.before_lessons(self.schedule, rows)
+        engine.clear_lesson(self.schedule, rows)
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+
+    def _state_data(self):
+        return dict(self._engine_data(), substitutions=self.substitutions)
+
+    def _open_store(self):
+        """Загрузка данных из SQLite, если в прошлый раз было выбрано это хранилище"""
+        if not os.path.exists(self.db_path):
+            return False
+        try:
+            store = engine.SQLiteStore(self.db_path)
+            if not store.has_state() or store.load_settings().get('storage_backend') != 'sqlite':
+                store.close()
+                return False
+            data, schedule = store.load_state()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Ошибка чтения базы {self.db_path}: {str(e)}")
+            return False
+        self.store = store
+        self._apply_state(data, schedule)
+        self._stored_schedule = schedule
+        return True
+
+    def _apply_state(self, data, schedule):
+        """Заменяет данные приложения (из базы или бэкапа) и обновляет вкладки"""
+        self.settings.update(data['settings'])
+        self.groups = engine.EntityRegistry(data['groups'])
+        self.teachers = engine.EntityRegistry(data['teachers'])
+        self.classrooms = engine.EntityRegistry(data['classrooms'])
+        self.subjects = engine.EntityRegistry(data['subjects'])
+        self.holidays = data['holidays']
+        self.substitutions = data['substitutions']
+        self.schedule = schedule
+        self.load_groups_data()
+        self.load_classrooms_data()
+        self.load_subjects_data()
+        self.load_holidays_data()
+        self.refresh.mark('teachers', 'grid', 'reports')
+
+    def _set_storage_backend(self, backend):
+        """Включение/выключение SQLite; при выключении база остается с отметкой 'json'"""
+        self.settings['storage_backend'] = backend
+        if backend == 'sqlite' and self.store is None:
+            self.store = engine.SQLiteStore(self.db_path)
+            self._stored_schedule = None
+            self._sync_store()
+        elif backend != 'sqlite' and self.store is not None:
+            self.store.save_state(self._state_data())
+            self.store.close()
+            self.store = None
+
+    def _sync_store(self):
+        """Сохранение изменившихся разделов состояния в SQLite; расписание целиком — только если его заменили"""
+        if self.store is None:
+            return
+        replaced = self.schedule is not self._stored_schedule
+        try:
+            self.store.save_state(self._state_data(), self.schedule if replaced else None)
+        except Exception as e:
+            # База — дополнительное хранилище: ее ошибка не должна срывать бэкап и сохранение
+            self.status_var.set(f"Ошибка записи в базу: {str(e)}")
+            return
+        self._stored_schedule = self.schedule
+
+    def _store_lessons(self, rows):
+        """Точечное сохранение измененных занятий"""
+        if self.store is None or self.schedule is not self._stored_schedule:
+            return
+        try:
+            self.store.update_lessons(self.schedule, rows)
+        except Exception as e:
+            # Следующая синхронизация перепишет расписание целиком
+            self._stored_schedule = None
+            self.status_var.set(f"Ошибка записи в базу: {str(e)}")
+
+    # --- Журнал изменений ---
+    def _journal_lessons(self, rows):
+        if self.schedule is self._journaled_schedule:
+            self.backup_writer.lessons(engine.lesson_records(self.schedule, rows))
+
+    def _journal_state(self):
+        """Ставит изменения в очередь журнала; False — нужен полный снимок"""
+        if self.schedule is not self._journaled_schedule:
+            return False
+        if self.backup_writer.records >= self.settings.get('journal_snapshot_every', engine.DEFAULT_SNAPSHOT_EVERY):
+            return False
+        self.backup_writer.state(copy.deepcopy(self._state_data()))
+        return True
+
+    def undo(self):
+        """Отменить последнее действие (Ctrl+Z)"""
+        self._apply_history(self.history.undo, "Нечего отменять")
+
+    def redo(self):
+        """Повторить отмененное действие (Ctrl+Y)"""
+        self._apply_history(self.history.redo, "Нечего повторять")
+
+    def _apply_history(self, step, empty_message):
+        # Незакрытые правки становятся отдельным шагом, чтобы отмена их не потеряла
+        self.history.commit(self.schedule, self._state_data())
+        rows = step(self.schedule, self._state_data())
+        if rows is None:
+            self.status_var.set(empty_message)
+            return
+        self._store_lessons(rows)
+        self._journal_lessons(rows)
+        self.load_groups_data()
+        self.load_classrooms_data()
+        self.load_subjects_data()
+        self.load_holidays_data()
+        self.refresh.mark('teachers', 'grid', 'reports', 'backup')
+
+    def _on_backup_written(self, snapshot_path):
+        if snapshot_path is not None:
+            self.last_backup_time = datetime.now()
+            self.update_backup_indicator()
+
+    def _on_backup_failed(self, message):
+        # Журнал оборвался — следующий create_backup начнет новый снимок
+        self._journaled_schedule = None
+        messagebox.showerror("Ошибка", f"Ошибка создания бэкапа: {message}")
+
     def assign_subjects_to_groups(self):
         """Назначение предметов группам"""
         # --- Добавлена проверка на наличие предметов ---
@@ -1817,119 +1983,85 @@ class ScheduleApp:
             print("Нет групп для назначения предметов.")
             return
         # -----------------------------------------------
-        for group in self.groups:
-            group_subjects = [s for s in self.subjects if s.get('group_type') in [group['type'], 'общий']]
-            for subject in group_subjects:
-                hours_per_week = subject.get('hours_per_week', 0)
-                if hours_per_week <= 0:
-                    continue
-                # Находим свободные слоты для этой группы
-                free_slots = self.schedule[
-                    (self.schedule['group_id'] == group['id']) & 
-                    (self.schedule['status'] == 'свободно')
-                ].index
-                # Выбираем случайные слоты для предмета
-                if len(free_slots) >= hours_per_week:
-                    selected_slots = random.sample(list(free_slots), hours_per_week)
-                    for slot in selected_slots:
-                        self.schedule.loc[slot, 'subject_id'] = subject['id']
-                        self.schedule.loc[slot, 'subject_name'] = subject['name']
-                        self.schedule.loc[slot, 'status'] = 'запланировано' 
-                else:
-                    print(f"Недостаточно свободных слотов для предмета {subject['name']} у группы {group['name']}")
+        engine.assign_subjects_to_groups(self.schedule, self._engine_data())
 
     def assign_teachers_and_classrooms(self):
         """Назначение преподавателей и аудиторий"""
-        # Для каждого запланированного занятия назначаем преподавателя и аудиторию
-        for idx, lesson in self.schedule.iterrows():
-            if lesson['status'] == 'запланировано':
-                # Находим преподавателя по предмету
-                subject = next((s for s in self.subjects if s['id'] == lesson['subject_id']), None)
-                if subject:
-                    available_teachers = [t for t in self.teachers if subject['name'] in t['subjects']]
-                    if available_teachers:
-                        # Проверяем нагрузку преподавателя
-                        teacher = random.choice(available_teachers)
-                        self.schedule.loc[idx, 'teacher_id'] = teacher['id']
-                        self.schedule.loc[idx, 'teacher_name'] = teacher['name']
-                        # Назначаем аудиторию
-                        if self.classrooms:
-                            classroom = random.choice(self.classrooms)
-                            self.schedule.loc[idx, 'classroom_id'] = classroom['id']
-                            self.schedule.loc[idx, 'classroom_name'] = classroom['name']
-                        self.schedule.loc[idx, 'status'] = 'подтверждено'
+        engine.assign_teachers_and_classrooms(self.schedule, self._engine_data())
 
     def on_schedule_generated(self):
         """Обработка завершения генерации расписания"""
         self.progress.stop()
-        self.status_var.set("Расписание сгенерировано")
-        messagebox.showinfo("Успех", "Расписание успешно сгенерировано!")
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
+        if getattr(self, 'generation_seed', None) is not None:
+            self.status_var.set(f"Расписание сгенерировано (лучший запуск: зерно {self.generation_seed})")
+        else:
+            self.status_var.set("Расписание сгенерировано")
+        unplaced = self.schedule.attrs.get('unplaced', 0)
+        if unplaced:
+            messagebox.showinfo("Успех", f"Расписание сгенерировано. Не удалось разместить часов: {unplaced}")
+        else:
+            messagebox.showinfo("Успех", "Расписание успешно сгенерировано!")
+        self.refresh.mark('grid', 'reports', 'backup')
 
     def filter_schedule(self, event=None):
         """Фильтрация расписания"""
-        self.schedule_tree.delete(*self.schedule_tree.get_children())
-        
         # Получение выбранных значений
         week_text = self.week_var.get()
         week_num = int(week_text.split()[1]) if week_text and "Неделя" in week_text else 1
         group_name = self.group_filter_var.get()
         teacher_name = self.teacher_filter_var.get()
         classroom_name = self.classroom_filter_var.get()
-
-        # Фильтрация данных
-        filtered_schedule = self.schedule.copy()
-        if not filtered_schedule.empty and 'week' in filtered_schedule.columns:
-            if week_num:
-                filtered_schedule = filtered_schedule[filtered_schedule['week'] == week_num]
-            if group_name:
-                filtered_schedule = filtered_schedule[filtered_schedule['group_name'] == group_name]
-            if teacher_name:
-                filtered_schedule = filtered_schedule[filtered_schedule['teacher_name'] == teacher_name]
-            if classroom_name:
-                filtered_schedule = filtered_schedule[filtered_schedule['classroom_name'] == classroom_name]
-
-            # Создание корректной таблицы расписания
-            if not filtered_schedule.empty:
-                days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'][:self.settings['days_per_week']]
-                times = sorted(filtered_schedule['time'].unique())
-
-                for time_slot in times:
-                    row_data = [time_slot]
-                    # Для каждого дня недели ищем занятие в этом временном слоте
-                    for day in days:
-                        lesson = filtered_schedule[
-                            (filtered_schedule['time'] == time_slot) & 
-                            (filtered_schedule['day'] == day) & 
-                            (filtered_schedule['status'] == 'подтверждено')
-                        ]
-                        
-                        if not lesson.empty:
-                            # Берем первое занятие из возможных (в реальности для группы в слоте должно быть одно)
-                            lesson_info = lesson.iloc[0]
-                            lesson_display = f"{lesson_info['group_name']}\n{lesson_info['subject_name']}\n{lesson_info['teacher_name']}\n{lesson_info['classroom_name']}"
-                        else:
-                            lesson_display = ""
-
-                        row_data.append(lesson_display)
-                    
-                    self.schedule_tree.insert('', tk.END, values=row_data)
-            else:
-                # Если нет данных, показываем пустую таблицу
-                self.show_empty_schedule()
-        else:
+        days = engine.DAYS[:self.settings['days_per_week']]
+
+        # Раскладка по (неделя, пара, день) строится один раз на расписание, фильтр — срез по ней
+        if self._schedule_grid is None or self._schedule_grid.schedule is not self.schedule:
+            self._schedule_grid = engine.ScheduleGrid(self.schedule)
+        # Пары — все, где есть строки под фильтр; в ячейках — только подтвержденные занятия
+        times, positions = self._schedule_grid.cells(week_num, len(days), group_name or None, teacher_name or None,
+                                                     classroom_name or None, status='подтверждено')
+        if not times:
             # Если нет данных, показываем пустую таблицу
             self.show_empty_schedule()
-            
+            return
+        lessons = self._schedule_grid.lessons(positions, ('group_name', 'subject_name', 'teacher_name', 'classroom_name'))
+        rows = [tuple([time_slot] + ["\n".join(lessons[(row, day)]) if (row, day) in lessons else ""
+                                     for day in range(len(days))])
+                for row, time_slot in enumerate(times)]
+        self._show_schedule_rows(rows)
+
     def show_empty_schedule(self):
         """Показать пустое расписание"""
         times = [f"{8+i}:00-{8+i}:45" for i in range(self.settings['lessons_per_day'])]
-        days = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'][:self.settings['days_per_week']]
-        for time_slot in times:
-            row_data = [time_slot] + [''] * len(days)
-            self.schedule_tree.insert('', tk.END, values=row_data)
+        days = engine.DAYS[:self.settings['days_per_week']]
+        self._show_schedule_rows([tuple([time_slot] + [''] * len(days)) for time_slot in times])
+
+    def _show_schedule_rows(self, rows):
+        """Показать строки rows в сетке: меняются только отличающиеся строки Treeview, порциями по SCHEDULE_GRID_CHUNK"""
+        # Новый вызов отменяет недоделанные порции прежнего
+        self._grid_update += 1
+        items = self.schedule_tree.get_children()
+        if len(items) > len(rows):
+            for item in items[len(rows):]:
+                self._grid_values.pop(item, None)
+            self.schedule_tree.delete(*items[len(rows):])
+        self._update_schedule_rows(self._grid_update, rows, 0)
+
+    def _update_schedule_rows(self, update, rows, start):
+        if update != self._grid_update:
+            return
+        items = self.schedule_tree.get_children()
+        end = min(start + SCHEDULE_GRID_CHUNK, len(rows))
+        for i in range(start, end):
+            if i >= len(items):
+                item = self.schedule_tree.insert('', tk.END, values=rows[i])
+            elif self._grid_values.get(items[i]) != rows[i]:
+                item = items[i]
+                self.schedule_tree.item(item, values=rows[i])
+            else:
+                continue
+            self._grid_values[item] = rows[i]
+        if end < len(rows):
+            self.root.after(1, self._update_schedule_rows, update, rows, end)
 
     # --- НАЧАЛО РЕАЛИЗАЦИИ РУЧНОГО РЕЖИМА ---
 
@@ -1999,10 +2131,10 @@ class ScheduleApp:
                 return
 
             # Получение ID по именам
-            selected_group = next((g for g in self.groups if g['name'] == group_var.get()), None)
-            selected_subject = next((s for s in self.subjects if s['name'] == subject_var.get()), None)
-            selected_teacher = next((t for t in self.teachers if t['name'] == teacher_var.get()), None)
-            selected_classroom = next((c for c in self.classrooms if c['name'] == classroom_var.get()), None)
+            selected_group = self.groups.by_name(group_var.get())
+            selected_subject = self.subjects.by_name(subject_var.get())
+            selected_teacher = self.teachers.by_name(teacher_var.get())
+            selected_classroom = self.classrooms.by_name(classroom_var.get())
 
             if not all([selected_group, selected_subject, selected_teacher, selected_classroom]):
                 messagebox.showerror("Ошибка", "Не удалось найти выбранные элементы в базе данных")
@@ -2038,17 +2170,16 @@ class ScheduleApp:
 
             if not target_row.empty:
                 idx = target_row.index[0]
-                self.schedule.loc[idx, 'subject_id'] = selected_subject['id']
-                self.schedule.loc[idx, 'subject_name'] = selected_subject['name']
-                self.schedule.loc[idx, 'teacher_id'] = selected_teacher['id']
-                self.schedule.loc[idx, 'teacher_name'] = selected_teacher['name']
-                self.schedule.loc[idx, 'classroom_id'] = selected_classroom['id']
-                self.schedule.loc[idx, 'classroom_name'] = selected_classroom['name']
-                self.schedule.loc[idx, 'status'] = 'подтверждено'
-
-                self.filter_schedule()
-                self.update_reports()
-                self.create_backup()
+                self._set_lesson(idx,
+                                 subject_id=selected_subject['id'],
+                                 subject_name=selected_subject['name'],
+                                 teacher_id=selected_teacher['id'],
+                                 teacher_name=selected_teacher['name'],
+                                 classroom_id=selected_classroom['id'],
+                                 classroom_name=selected_classroom['name'],
+                                 status='подтверждено')
+
+                self.refresh.mark('grid', 'reports', 'backup')
                 messagebox.showinfo("Успех", "Занятие успешно добавлено!")
                 dialog.destroy()
             else:
@@ -2077,6 +2208,8 @@ class ScheduleApp:
         for i, day in enumerate(days):
             if values[i + 1].strip():  # Пропускаем столбец времени (индекс 0)
                 current_day = day
+                # Первая строка ячейки — группа: в слоте занятия всех групп
+                cell_group = values[i + 1].split('\n')[0]
                 break
 
         if not current_day:
@@ -2088,6 +2221,7 @@ class ScheduleApp:
             (self.schedule['week'] == current_week) &
             (self.schedule['day'] == current_day) &
             (self.schedule['time'] == time_slot) &
+            (self.schedule['group_name'] == cell_group) &
             (self.schedule['status'] == 'подтверждено')
         ]
 
@@ -2157,10 +2291,10 @@ class ScheduleApp:
                 return
 
             # Получение ID по именам
-            selected_group = next((g for g in self.groups if g['name'] == group_var.get()), None)
-            selected_subject = next((s for s in self.subjects if s['name'] == subject_var.get()), None)
-            selected_teacher = next((t for t in self.teachers if t['name'] == teacher_var.get()), None)
-            selected_classroom = next((c for c in self.classrooms if c['name'] == classroom_var.get()), None)
+            selected_group = self.groups.by_name(group_var.get())
+            selected_subject = self.subjects.by_name(subject_var.get())
+            selected_teacher = self.teachers.by_name(teacher_var.get())
+            selected_classroom = self.classrooms.by_name(classroom_var.get())
 
             if not all([selected_group, selected_subject, selected_teacher, selected_classroom]):
                 messagebox.showerror("Ошибка", "Не удалось найти выбранные элементы в базе данных")
@@ -2185,21 +2319,20 @@ class ScheduleApp:
                         return
 
             # Обновляем данные в DataFrame
-            self.schedule.loc[idx, 'week'] = int(week_var.get())
-            self.schedule.loc[idx, 'day'] = day_var.get()
-            self.schedule.loc[idx, 'time'] = time_var.get()
-            self.schedule.loc[idx, 'group_id'] = selected_group['id']
-            self.schedule.loc[idx, 'group_name'] = selected_group['name']
-            self.schedule.loc[idx, 'subject_id'] = selected_subject['id']
-            self.schedule.loc[idx, 'subject_name'] = selected_subject['name']
-            self.schedule.loc[idx, 'teacher_id'] = selected_teacher['id']
-            self.schedule.loc[idx, 'teacher_name'] = selected_teacher['name']
-            self.schedule.loc[idx, 'classroom_id'] = selected_classroom['id']
-            self.schedule.loc[idx, 'classroom_name'] = selected_classroom['name']
-
-            self.filter_schedule()
-            self.update_reports()
-            self.create_backup()
+            self._set_lesson(idx,
+                             week=int(week_var.get()),
+                             day=day_var.get(),
+                             time=time_var.get(),
+                             group_id=selected_group['id'],
+                             group_name=selected_group['name'],
+                             subject_id=selected_subject['id'],
+                             subject_name=selected_subject['name'],
+                             teacher_id=selected_teacher['id'],
+                             teacher_name=selected_teacher['name'],
+                             classroom_id=selected_classroom['id'],
+                             classroom_name=selected_classroom['name'])
+
+            self.refresh.mark('grid', 'reports', 'backup')
             messagebox.showinfo("Успех", "Занятие успешно обновлено!")
             dialog.destroy()
 
@@ -2226,6 +2359,8 @@ class ScheduleApp:
         for i, day in enumerate(days):
             if values[i + 1].strip():
                 current_day = day
+                # Первая строка ячейки — группа: в слоте занятия всех групп
+                cell_group = values[i + 1].split('\n')[0]
                 break
 
         if not current_day:
@@ -2237,6 +2372,7 @@ class ScheduleApp:
             (self.schedule['week'] == current_week) &
             (self.schedule['day'] == current_day) &
             (self.schedule['time'] == time_slot) &
+            (self.schedule['group_name'] == cell_group) &
             (self.schedule['status'] == 'подтверждено')
         ]
 
@@ -2247,12 +2383,9 @@ class ScheduleApp:
         if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить выбранное занятие?"):
             idx = lesson_row.index[0]
             # Очищаем данные и возвращаем статус в 'свободно'
-            self.schedule.loc[idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-            self.schedule.loc[idx, 'status'] = 'свободно'
+            self._clear_lesson(idx)
 
-            self.filter_schedule()
-            self.update_reports()
-            self.create_backup()
+            self.refresh.mark('grid', 'reports', 'backup')
             messagebox.showinfo("Успех", "Занятие успешно удалено!")
 
     # --- КОНЕЦ РЕАЛИЗАЦИИ РУЧНОГО РЕЖИМА ---
@@ -2275,6 +2408,8 @@ class ScheduleApp:
         for i, day in enumerate(days):
             if values[i + 1].strip():
                 current_day = day
+                # Первая строка ячейки — группа: в слоте занятия всех групп
+                cell_group = values[i + 1].split('\n')[0]
                 break
         if not current_day:
             messagebox.showerror("Ошибка", "Не удалось определить день для выбранного занятия")
@@ -2284,6 +2419,7 @@ class ScheduleApp:
             (self.schedule['week'] == current_week) &
             (self.schedule['day'] == current_day) &
             (self.schedule['time'] == time_slot) &
+            (self.schedule['group_name'] == cell_group) &
             (self.schedule['status'] == 'подтверждено')
         ]
         if lesson_row.empty:
@@ -2338,7 +2474,7 @@ class ScheduleApp:
                 messagebox.showwarning("Предупреждение", "Выберите заменяющего преподавателя")
                 return
             # Получаем объект нового преподавателя
-            new_teacher = next((t for t in self.teachers if t['name'] == replacement_teacher_var.get()), None)
+            new_teacher = self.teachers.by_name(replacement_teacher_var.get())
             if not new_teacher:
                 messagebox.showerror("Ошибка", "Не удалось найти выбранного преподавателя")
                 return
@@ -2347,10 +2483,9 @@ class ScheduleApp:
             if reason == "Другое":
                 reason = details_entry.get() or "Не указано"
             # Обновляем расписание
-            original_teacher_id = self.schedule.loc[idx, 'teacher_id']
+            original_teacher_id = engine.python_value(self.schedule.loc[idx, 'teacher_id'])
             original_teacher_name = self.schedule.loc[idx, 'teacher_name']
-            self.schedule.loc[idx, 'teacher_id'] = new_teacher['id']
-            self.schedule.loc[idx, 'teacher_name'] = new_teacher['name']
+            self._set_lesson(idx, teacher_id=new_teacher['id'], teacher_name=new_teacher['name'])
             # Записываем замену в журнал
             substitution_record = {
                 'date': datetime.now().strftime('%Y-%m-%d'),
@@ -2368,8 +2503,7 @@ class ScheduleApp:
             }
             self.substitutions.append(substitution_record)
             # Обновляем интерфейс
-            self.filter_schedule()
-            self.create_backup()
+            self.refresh.mark('grid', 'backup')
             messagebox.showinfo("Успех", f"Занятие успешно заменено!\nНовый преподаватель: {new_teacher['name']}")
             dialog.destroy()
         ttk.Button(dialog, text="Подтвердить замену", command=save_substitution).grid(row=11, column=0, columnspan=2, pady=20)
@@ -2452,30 +2586,11 @@ class ScheduleApp:
         if self.schedule.empty:
             messagebox.showinfo("Информация", "Сначала сгенерируйте расписание")
             return
-        # Проверка конфликтов преподавателей
-        if 'teacher_id' in self.schedule.columns:
-            teacher_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['teacher_id', 'day', 'time', 'week'], keep=False))
-            ]
-        else:
-            teacher_conflicts = pd.DataFrame()
-        # Проверка конфликтов аудиторий
-        if 'classroom_id' in self.schedule.columns:
-            classroom_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['classroom_id', 'day', 'time', 'week'], keep=False))
-            ]
-        else:
-            classroom_conflicts = pd.DataFrame()
-        # Проверка конфликтов групп
-        if 'group_id' in self.schedule.columns:
-            group_conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['group_id', 'day', 'time', 'week'], keep=False))
-            ]
-        else:
-            group_conflicts = pd.DataFrame()
+        # Конфликты преподавателей, аудиторий и групп
+        conflicts = engine.find_conflicts(self.schedule)
+        teacher_conflicts = conflicts['teacher_id']
+        classroom_conflicts = conflicts['classroom_id']
+        group_conflicts = conflicts['group_id']
         # Отображение результатов
         conflict_text = f"Конфликты преподавателей: {len(teacher_conflicts)}\n"
         conflict_text += f"Конфликты аудиторий: {len(classroom_conflicts)}\n"
@@ -2501,85 +2616,56 @@ class ScheduleApp:
                            f"Групп: {len(group_conflicts)}")
 
     def optimize_schedule(self):
-        """Оптимизация расписания"""
+        """Оптимизация расписания локальным поиском в отдельном потоке"""
         if self.schedule.empty:
             messagebox.showinfo("Информация", "Сначала сгенерируйте расписание")
             return
+        time_limit = simpledialog.askinteger("Оптимизация", "Время оптимизации (сек):", parent=self.root,
+                                             initialvalue=self.settings.get('optimize_time_limit', 10),
+                                             minvalue=1, maxvalue=3600)
+        if not time_limit:
+            return
+        self.settings['optimize_time_limit'] = time_limit
         self.progress.start()
         self.status_var.set("Оптимизация расписания...")
-        # Простая оптимизация - переназначение конфликтных занятий
-        if 'teacher_id' in self.schedule.columns:
-            conflicts = self.schedule[
-                (self.schedule['status'] == 'подтверждено') &
-                (self.schedule.duplicated(['teacher_id', 'day', 'time', 'week'], keep=False))
-            ]
-        else:
-            conflicts = pd.DataFrame()
-        optimized_count = 0
-        for idx in conflicts.index[:10]:  # Ограничиваем количество оптимизаций
-            # Ищем свободный слот для этой группы в той же неделе
-            group_id = self.schedule.loc[idx, 'group_id']
-            week = self.schedule.loc[idx, 'week']
-            free_slots = self.schedule[
-                (self.schedule['group_id'] == group_id) & 
-                (self.schedule['week'] == week) & 
-                (self.schedule['status'] == 'свободно')
-            ].index
-            if len(free_slots) > 0:
-                new_slot = random.choice(free_slots)
-                # Копируем данные в новый слот
-                self.schedule.loc[new_slot, 'subject_id'] = self.schedule.loc[idx, 'subject_id']
-                self.schedule.loc[new_slot, 'subject_name'] = self.schedule.loc[idx, 'subject_name']
-                self.schedule.loc[new_slot, 'teacher_id'] = self.schedule.loc[idx, 'teacher_id']
-                self.schedule.loc[new_slot, 'teacher_name'] = self.schedule.loc[idx, 'teacher_name']
-                self.schedule.loc[new_slot, 'classroom_id'] = self.schedule.loc[idx, 'classroom_id']
-                self.schedule.loc[new_slot, 'classroom_name'] = self.schedule.loc[idx, 'classroom_name']
-                self.schedule.loc[new_slot, 'status'] = 'подтверждено'
-                # Освобождаем старый слот
-                self.schedule.loc[idx, ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 
-                                      'classroom_id', 'classroom_name']] = [None, '', None, '', None, '']
-                self.schedule.loc[idx, 'status'] = 'свободно'
-                optimized_count += 1
+        source = self.schedule
+        snapshot = source.copy()
+        data = copy.deepcopy(self._engine_data())
+
+        def worker():
+            try:
+                result = engine.optimize_schedule(snapshot, data, time_limit=time_limit)
+            except Exception as e:
+                # e удаляется по выходе из except, поэтому текст берется сразу
+                msg = str(e)
+                self.root.after(0, lambda msg=msg: self._on_optimization_failed(msg))
+                return
+            self.root.after(0, lambda: self._on_schedule_optimized(source, result))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_schedule_optimized(self, source, result):
+        """Применение результата оптимизации в основном потоке"""
         self.progress.stop()
+        if self.schedule is not source:
+            self.status_var.set("Результат оптимизации устарел и не применен")
+            return
+        self.schedule = result.schedule
         self.status_var.set("Оптимизация завершена")
-        messagebox.showinfo("Оптимизация", f"Оптимизировано {optimized_count} занятий")
-        self.filter_schedule()
-        self.update_reports()
-        self.create_backup()
+        messagebox.showinfo("Оптимизация", f"Штраф: {result.initial_cost} → {result.cost}\n"
+                                           f"Проверено ходов: {result.moves}, принято: {result.accepted}")
+        self.refresh.mark('grid', 'reports', 'backup')
+
+    def _on_optimization_failed(self, message):
+        self.progress.stop()
+        self.status_var.set("Ошибка оптимизации")
+        messagebox.showerror("Ошибка", f"Ошибка оптимизации: {message}")
 
     def update_reports(self):
         """Обновление отчетов"""
         if self.schedule.empty:
             return
-        # Очистка таблиц
-        self.teacher_report_tree.delete(*self.teacher_report_tree.get_children())
-        self.group_report_tree.delete(*self.group_report_tree.get_children())
-        self.summary_text.delete(1.0, tk.END)
-        # Нагрузка преподавателей
-        if 'teacher_name' in self.schedule.columns and not self.schedule[self.schedule['status'] == 'подтверждено'].empty:
-            teacher_load = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name').size()
-            for teacher, hours in teacher_load.items():
-                # Получаем группы и предметы преподавателя
-                teacher_data = self.schedule[
-                    (self.schedule['teacher_name'] == teacher) & 
-                    (self.schedule['status'] == 'подтверждено')
-                ]
-                groups = ', '.join(teacher_data['group_name'].unique())
-                subjects = ', '.join(teacher_data['subject_name'].unique())
-                self.teacher_report_tree.insert('', tk.END, values=(teacher, hours, groups, subjects))
-        # Нагрузка групп
-        if 'group_name' in self.schedule.columns and not self.schedule[self.schedule['status'] == 'подтверждено'].empty:
-            group_load = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name').size()
-            for group, hours in group_load.items():
-                # Получаем предметы и преподавателей группы
-                group_data = self.schedule[
-                    (self.schedule['group_name'] == group) & 
-                    (self.schedule['status'] == 'подтверждено')
-                ]
-                subjects = ', '.join(group_data['subject_name'].unique())
-                teachers = ', '.join(group_data['teacher_name'].unique())
-                self.group_report_tree.insert('', tk.END, values=(group, hours, subjects, teachers))
-        # Сводный отчет
+        cube = self.report_cache.get(self.schedule)
         summary_text = f"📊 Сводный отчет по расписанию\n"
         summary_text += f"Учреждение: {self.settings.get('school_name', 'Не указано')}\n"
         summary_text += f"Директор: {self.settings.get('director', 'Не указано')}\n"
@@ -2593,13 +2679,23 @@ class ScheduleApp:
         summary_text += f"🏫 Аудиторий: {len(self.classrooms)}\n"
         summary_text += f"📚 Предметов: {len(self.subjects)}\n"
         summary_text += f"🎉 Праздничных дней: {len(self.holidays)}\n"
-        if not self.schedule.empty:
-            confirmed_lessons = len(self.schedule[self.schedule['status'] == 'подтверждено'])
-            planned_lessons = len(self.schedule[self.schedule['status'] == 'запланировано'])
-            free_slots = len(self.schedule[self.schedule['status'] == 'свободно'])
-            summary_text += f"✅ Подтвержденных занятий: {confirmed_lessons}\n"
-            summary_text += f"📝 Запланированных занятий: {planned_lessons}\n"
-            summary_text += f"🕒 Свободных слотов: {free_slots}\n"
+        statuses = cube['statuses']
+        summary_text += f"✅ Подтвержденных занятий: {statuses.get('подтверждено', 0)}\n"
+        summary_text += f"📝 Запланированных занятий: {statuses.get('запланировано', 0)}\n"
+        summary_text += f"🕒 Свободных слотов: {statuses.get('свободно', 0)}\n"
+        # Ни расписание, ни сводка не менялись — таблицы уже показывают то же самое
+        if self._shown_reports is not None and self._shown_reports[0] is cube and self._shown_reports[1] == summary_text:
+            return
+        self._shown_reports = (cube, summary_text)
+        # Нагрузка преподавателей и групп
+        self.teacher_report_tree.delete(*self.teacher_report_tree.get_children())
+        self.group_report_tree.delete(*self.group_report_tree.get_children())
+        for values in cube['teachers']:
+            self.teacher_report_tree.insert('', tk.END, values=values)
+        for values in cube['groups']:
+            self.group_report_tree.insert('', tk.END, values=values)
+        # Сводный отчет
+        self.summary_text.delete(1.0, tk.END)
         self.summary_text.insert(1.0, summary_text)
 
     def export_to_excel(self):
@@ -2638,22 +2734,22 @@ class ScheduleApp:
                     pd.DataFrame(self.holidays).to_excel(writer, sheet_name='Праздники', index=False)
                     # Отчеты
                     if not self.schedule.empty and not self.schedule[self.schedule['status'] == 'подтверждено'].empty:
-                        teacher_report = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name').agg({
+                        teacher_report = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name', observed=True).agg({
                             'group_name': lambda x: ', '.join(x.unique()),
                             'subject_name': lambda x: ', '.join(x.unique())
                         }).reset_index()
                         teacher_report.columns = ['Преподаватель', 'Группы', 'Предметы']
-                        teacher_report['Часы'] = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name').size().values
+                        teacher_report['Часы'] = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('teacher_name', observed=True).size().values
                         teacher_report.to_excel(writer, sheet_name='Нагрузка преподавателей', index=False)
-                        group_report = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name').agg({
+                        group_report = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name', observed=True).agg({
                             'teacher_name': lambda x: ', '.join(x.unique()),
                             'subject_name': lambda x: ', '.join(x.unique())
                         }).reset_index()
                         group_report.columns = ['Группа', 'Преподаватели', 'Предметы']
-                        group_report['Часы'] = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name').size().values
+                        group_report['Часы'] = self.schedule[self.schedule['status'] == 'подтверждено'].groupby('group_name', observed=True).size().values
                         group_report.to_excel(writer, sheet_name='Нагрузка групп', index=False)
                 messagebox.showinfo("Экспорт", f"Расписание успешно экспортировано в {filename}")
-                self.create_backup()
+                self.refresh.mark('backup')
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка экспорта: {str(e)}")
 
@@ -2869,7 +2965,7 @@ class ScheduleApp:
                 f.write(html_content)
 
             messagebox.showinfo("Экспорт", f"Расписание успешно экспортировано в HTML-файл:\n{filename}")
-            self.create_backup() # Создаем бэкап после экспорта
+            self.refresh.mark('backup')
 
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка экспорта в HTML: {str(e)}")
@@ -2895,7 +2991,7 @@ class ScheduleApp:
                 with open(filename, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=2)
                 messagebox.showinfo("Сохранение", "Данные успешно сохранены!")
-                self.create_backup() # Создаем бэкап после сохранения
+                self.refresh.mark('backup')
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка сохранения: {str(e)}")
 
@@ -2910,20 +3006,23 @@ class ScheduleApp:
                 with open(filename, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                 self.settings = data.get('settings', self.settings)
-                self.groups = data.get('groups', [])
-                self.teachers = data.get('teachers', [])
-                self.classrooms = data.get('classrooms', [])
-                self.subjects = data.get('subjects', [])
+                self.groups = engine.EntityRegistry(data.get('groups', []))
+                self.teachers = engine.EntityRegistry(data.get('teachers', []))
+                self.classrooms = engine.EntityRegistry(data.get('classrooms', []))
+                self.subjects = engine.EntityRegistry(data.get('subjects', []))
                 self.substitutions = data.get('substitutions', [])
                 self.holidays = data.get('holidays', [])
+                # Список записей (архив) или столбцы DataFrame.to_dict() (бэкап)
+                if 'schedule' in data:
+                    self.schedule = engine.schedule_from_json(data['schedule'], self.settings)
                 # Обновление интерфейса
                 self.load_groups_data()
-                self.load_teachers_data()
                 self.load_classrooms_data()
                 self.load_subjects_data()
                 self.load_holidays_data()
+                self.refresh.mark('teachers', 'grid', 'reports')
                 messagebox.showinfo("Загрузка", "Данные успешно загружены")
-                self.create_backup()
+                self.refresh.mark('backup')
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка загрузки: {str(e)}")
 
@@ -2987,6 +3086,18 @@ class ScheduleApp:
         weeks_var = tk.StringVar(value=str(self.settings.get('weeks', 2)))
         weeks_spin = ttk.Spinbox(schedule_frame, from_=1, to=52, textvariable=weeks_var, width=10)
         weeks_spin.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(schedule_frame, text="Режим генерации:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        generation_modes = {'solver': "Решатель ограничений", 'random': "Случайная раскладка"}
+        generation_mode_var = tk.StringVar(value=generation_modes.get(self.settings.get('generation_mode', 'solver')))
+        generation_mode_combo = ttk.Combobox(schedule_frame, textvariable=generation_mode_var,
+                                             values=list(generation_modes.values()), state='readonly', width=22)
+        generation_mode_combo.grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(schedule_frame, text="Запусков (лучший из N):").grid(row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        generation_restarts_var = tk.StringVar(value=str(self.settings.get('generation_restarts', 1)))
+        generation_restarts_spin = ttk.Spinbox(schedule_frame, from_=1, to=256, textvariable=generation_restarts_var, width=10)
+        generation_restarts_spin.grid(row=4, column=1, padx=5, pady=2, sticky=tk.W)
         
         # === РАСПИСАНИЕ ЗВОНКОВ ===
         bell_frame = ttk.LabelFrame(main_frame, text="Расписание звонков", padding="10")
@@ -3037,6 +3148,23 @@ class ScheduleApp:
         max_backups_var = tk.StringVar(value=str(self.settings.get('max_backups', 10)))
         max_backups_spin = ttk.Spinbox(backup_frame, from_=1, to=100, textvariable=max_backups_var, width=10)
         max_backups_spin.grid(row=2, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(backup_frame, text="Хранить в SQLite:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        sqlite_var = tk.BooleanVar(value=self.settings.get('storage_backend', 'json') == 'sqlite')
+        ttk.Checkbutton(backup_frame, variable=sqlite_var).grid(row=3, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(backup_frame, text="Архив в столбцовом формате:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=2)
+        columnar_archive_var = tk.BooleanVar(value=self.settings.get('archive_format', 'json') == 'columnar')
+        ttk.Checkbutton(backup_frame, variable=columnar_archive_var).grid(row=6, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(backup_frame, text="Бэкапы с дедупликацией:").grid(row=4, column=0, sticky=tk.W, padx=5, pady=2)
+        dedup_var = tk.BooleanVar(value=self.settings.get('backup_format', 'zip') == 'dedup')
+        ttk.Checkbutton(backup_frame, variable=dedup_var).grid(row=4, column=1, padx=5, pady=2, sticky=tk.W)
+
+        ttk.Label(backup_frame, text="Уровень сжатия (0-9):").grid(row=5, column=0, sticky=tk.W, padx=5, pady=2)
+        compression_var = tk.StringVar(value=str(self.settings.get('backup_compression', engine.DEFAULT_COMPRESSION)))
+        ttk.Spinbox(backup_frame, from_=0, to=9, textvariable=compression_var, width=10).grid(
+            row=5, column=1, padx=5, pady=2, sticky=tk.W)
         
         def save_settings():
             self.settings['school_name'] = school_name_var.get()
@@ -3046,9 +3174,19 @@ class ScheduleApp:
             self.settings['days_per_week'] = int(days_per_week_var.get())
             self.settings['lessons_per_day'] = int(lessons_per_day_var.get())
             self.settings['weeks'] = int(weeks_var.get())
+            self.settings['generation_mode'] = next(
+                (mode for mode, title in generation_modes.items() if title == generation_mode_var.get()), 'solver')
+            self.settings['generation_restarts'] = int(generation_restarts_var.get())
             self.settings['auto_backup'] = auto_backup_var.get()
             self.settings['backup_interval'] = int(backup_interval_var.get())
             self.settings['max_backups'] = int(max_backups_var.get())
+            self.settings['backup_format'] = 'dedup' if dedup_var.get() else 'zip'
+            self.settings['backup_compression'] = min(max(int(compression_var.get()), 0), 9)
+            self.settings['archive_format'] = 'columnar' if columnar_archive_var.get() else 'json'
+            try:
+                self._set_storage_backend('sqlite' if sqlite_var.get() else 'json')
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка открытия базы {self.db_path}: {str(e)}")
             # Обновляем переменные в основном окно
             self.days_var.set(days_per_week_var.get())
             self.lessons_var.set(lessons_per_day_var.get())
@@ -3449,8 +3587,8 @@ class ScheduleApp:
             if reason == "Другое":
                 reason = details_entry.get() or "Не указано"
             # Находим ID преподавателей
-            original_teacher = next((t for t in self.teachers if t['name'] == original_teacher_var.get()), None)
-            replacement_teacher = next((t for t in self.teachers if t['name'] == replacement_teacher_var.get()), None)
+            original_teacher = self.teachers.by_name(original_teacher_var.get())
+            replacement_teacher = self.teachers.by_name(replacement_teacher_var.get())
             if not original_teacher or not replacement_teacher:
                 messagebox.showerror("Ошибка", "Не удалось найти преподавателей")
                 return
@@ -3482,13 +3620,12 @@ class ScheduleApp:
             ]
             if not target_lesson.empty:
                 idx = target_lesson.index[0]
-                self.schedule.loc[idx, 'teacher_id'] = replacement_teacher['id']
-                self.schedule.loc[idx, 'teacher_name'] = replacement_teacher['name']
+                self._set_lesson(idx, teacher_id=replacement_teacher['id'], teacher_name=replacement_teacher['name'])
                 # Обновляем индекс в записи замены
                 self.substitutions[-1]['schedule_index'] = int(idx)
-                self.filter_schedule()
+                self.refresh.mark('grid')
             self.load_substitutions_data()
-            self.create_backup()
+            self.refresh.mark('backup')
             messagebox.showinfo("Успех", "Замена успешно добавлена в журнал!")
             dialog.destroy()
         ttk.Button(dialog, text="Сохранить", command=save_manual_substitution).grid(row=11, column=0, columnspan=2, pady=20)
@@ -3597,13 +3734,12 @@ class ScheduleApp:
             if substitution_to_edit.get('schedule_index', -1) >= 0:
                 idx = substitution_to_edit['schedule_index']
                 # Находим нового преподавателя по имени
-                new_teacher = next((t for t in self.teachers if t['name'] == replacement_teacher_var.get()), None)
+                new_teacher = self.teachers.by_name(replacement_teacher_var.get())
                 if new_teacher:
-                    self.schedule.loc[idx, 'teacher_id'] = new_teacher['id']
-                    self.schedule.loc[idx, 'teacher_name'] = new_teacher['name']
-                    self.filter_schedule()
+                    self._set_lesson(idx, teacher_id=new_teacher['id'], teacher_name=new_teacher['name'])
+                    self.refresh.mark('grid')
             self.load_substitutions_data()
-            self.create_backup()
+            self.refresh.mark('backup')
             messagebox.showinfo("Успех", "Замена успешно обновлена!")
             dialog.destroy()
         ttk.Button(dialog, text="Сохранить", command=update_substitution).grid(row=11, column=0, columnspan=2, pady=20)
@@ -3636,15 +3772,14 @@ class ScheduleApp:
                 original_teacher_id = substitution_to_delete.get('original_teacher_id')
                 original_teacher_name = substitution_to_delete.get('original_teacher')
                 # Находим преподавателя по ID
-                original_teacher = next((t for t in self.teachers if t['id'] == original_teacher_id), None)
+                original_teacher = self.teachers.by_id(original_teacher_id)
                 if original_teacher:
-                    self.schedule.loc[idx, 'teacher_id'] = original_teacher_id
-                    self.schedule.loc[idx, 'teacher_name'] = original_teacher_name
-                    self.filter_schedule()
+                    self._set_lesson(idx, teacher_id=original_teacher_id, teacher_name=original_teacher_name)
+                    self.refresh.mark('grid')
             # Удаляем из списка
             del self.substitutions[delete_index]
             self.load_substitutions_data()
-            self.create_backup()
+            self.refresh.mark('backup')
             messagebox.showinfo("Успех", "Замена успешно удалена!")
 
     def export_substitutions(self):
@@ -3718,7 +3853,7 @@ class ScheduleApp:
         button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
         buttons = [
             ("🔄 Обновить", self.load_backup_list),
-            ("💾 Создать бэкап", self.create_backup),
+            ("💾 Создать бэкап", lambda: self.create_backup(snapshot=True)),
             ("📂 Восстановить", self.restore_backup),
             ("🗑️ Удалить", self.delete_backup)
         ]
@@ -3735,7 +3870,7 @@ class ScheduleApp:
             self.backup_tree.delete(item)
         # Получение списка файлов из директории бэкапов
         try:
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.endswith('.zip')]
+            backup_files = [f for f in os.listdir(self.backup_dir) if engine.is_snapshot(f)]
             backup_files.sort(reverse=True) # Сортировка по дате (новые первые)
             for filename in backup_files:
                 filepath = os.path.join(self.backup_dir, filename)
@@ -3764,12 +3899,12 @@ class ScheduleApp:
         filepath = os.path.join(self.backup_dir, filename)
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите восстановить данные из {filename}?\nТекущие данные будут потеряны."):
             try:
-                # Распаковка архива
-                with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                    zip_ref.extractall('.') # Распаковка в текущую директорию
+                # Снимок и все правки из его журнала, включая еще не записанные
+                self.backup_writer.flush()
+                data, schedule = engine.restore_backup(filepath)
+                self._apply_state(data, schedule)
                 messagebox.showinfo("Успех", f"Данные успешно восстановлены из {filename}")
-                # Перезагрузка данных
-                self.load_data()
+                self.refresh.mark('backup')
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка восстановления: {e}")
 
@@ -3784,58 +3919,39 @@ class ScheduleApp:
         filepath = os.path.join(self.backup_dir, filename)
         if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить {filename}?"):
             try:
-                os.remove(filepath)
+                self.backup_writer.flush()
+                engine.delete_backup(filepath)
                 self.load_backup_list() # Обновление списка
                 messagebox.showinfo("Успех", f"Бэкап {filename} успешно удален")
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Ошибка удаления: {e}")
 
-    def create_backup(self):
-        """Создать бэкап данных"""
+    def create_backup(self, snapshot=False):
+        """Зафиксировать изменения: в журнал или полным снимком (snapshot=True, замена расписания, длинный журнал)"""
+        # Конец действия пользователя — граница шага отмены
+        self.history.commit(self.schedule, self._state_data())
         try:
+            self._sync_store()
+            if not snapshot and self._journal_state():
+                return
             # Создание имени файла бэкапа
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"backup_{timestamp}.zip"
-            backup_filepath = os.path.join(self.backup_dir, backup_filename)
-            # Создание временного файла данных
-            temp_data_file = "temp_data.json"
-            data = {
-                'settings': self.settings,
-                'groups': self.groups,
-                'teachers': self.teachers,
-                'classrooms': self.classrooms,
-                'subjects': self.subjects,
-                'schedule': self.schedule.to_dict() if not self.schedule.empty else {},
-                'substitutions': self.substitutions,
-                'holidays': self.holidays
-            }
-            with open(temp_data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            # Создание архива
-            with zipfile.ZipFile(backup_filepath, 'w') as zipf:
-                zipf.write(temp_data_file)
-            # Удаление временного файла
-            os.remove(temp_data_file)
-            # Удаление старых бэкапов, если их больше максимального количества
-            self.cleanup_old_backups()
-            # Обновление времени последнего бэкапа
-            self.last_backup_time = datetime.now()
-            self.update_backup_indicator()
+            if self.settings.get('backup_format', 'zip') == 'dedup':
+                # Манифест хранилища с дедупликацией: на диск попадают только новые части
+                backup_filepath = os.path.join(self.backup_dir, f"backup_{timestamp}{engine.MANIFEST_SUFFIX}")
+                keep = self.settings.get('max_restore_points', engine.DEFAULT_RESTORE_POINTS)
+            else:
+                backup_filepath = os.path.join(self.backup_dir, f"backup_{timestamp}.zip")
+                keep = self.settings.get('max_backups', 10)
+            # Запись снимка, удаление старых бэкапов и индикатор — в фоновом потоке,
+            # здесь только копии данных
+            self.backup_writer.snapshot(backup_filepath, copy.deepcopy(self._state_data()), self.schedule.copy(), keep,
+                                        self.settings.get('backup_compression', engine.DEFAULT_COMPRESSION))
+            # Дальнейшие правки пишутся в журнал этого снимка
+            self._journaled_schedule = self.schedule
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка создания бэкапа: {str(e)}")
 
-    def cleanup_old_backups(self):
-        """Удалить старые бэкапы, если их больше максимального количества"""
-        try:
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.endswith('.zip')]
-            backup_files.sort(key=lambda x: os.path.getctime(os.path.join(self.backup_dir, x)))
-            # Удаление самых старых файлов, если их больше максимума
-            while len(backup_files) > self.settings.get('max_backups', 10):
-                oldest_file = backup_files.pop(0)
-                os.remove(os.path.join(self.backup_dir, oldest_file))
-        except Exception as e:
-            pass  # Игнорируем ошибки очистки
-
     def start_auto_backup(self):
         """Запустить таймер авто-бэкапа"""
         if self.settings.get('auto_backup', True):
@@ -3844,7 +3960,7 @@ class ScheduleApp:
 
     def auto_backup(self):
         """Автоматический бэкап"""
-        self.create_backup()
+        self.create_backup(snapshot=True)
         # Перезапуск таймера
         self.start_auto_backup()
 
@@ -3879,9 +3995,9 @@ class ScheduleApp:
             # Обновляем год последнего обновления
             self.settings['last_academic_year_update'] = current_year
             # Обновляем интерфейс
-            self.load_teachers_data()
+            self.refresh.mark('teachers')
             # Создаем бэкап после обновления
-            self.create_backup()
+            self.refresh.mark('backup')
 
     def show_about(self):
         """Показать обновленную информацию о программе"""
@@ -3992,3 +4108,8 @@ if __name__ == "__main__":
     root = tk.Tk()
     app = ScheduleApp(root)
     root.mainloop()
+    # Бэкап последнего действия, если окно закрыли до его отложенного запуска
+    if app.refresh.is_dirty('backup'):
+        app.create_backup()
+    # Дописать бэкап, если поток записи еще не успел
+    app.backup_writer.close()
@@ -0,0 +1,40 @@
+"""Движок составления расписания, не зависящий от графического интерфейса."""
+from .constants import (
+    DAYS, DEFAULT_BELL_SCHEDULE, EMPTY_LESSON, LESSON_COLUMNS, LESSON_FIELDS,
+    STATUS_CONFIRMED, STATUS_FREE, STATUS_PLANNED,
+)
+from .conflicts import count_conflicts, find_conflicts, score_schedule
+from .generator import (
+    GENERATION_MODES, GenerationCancelled, assign_subjects_to_groups,
+    assign_teachers_and_classrooms, create_schedule_structure, generate_schedule,
+)
+from .model import (
+    get_days, get_times, get_weeks, load_state, schedule_to_records,
+    teacher_fact_hours, teacher_subjects, working_days,
+)
+from .occupancy import OccupancyIndex
+from .storage import (
+    clear_lesson, compact_schedule, memory_usage, python_value, schedule_from_json, schedule_to_columns,
+    schedule_to_lists, schedule_version, set_lesson, write_column,
+)
+from .solver import ScheduleSolver, solve_schedule
+from .sqlite_store import SQLiteStore
+from .incremental import add_missing_groups, regenerate
+from .backup_store import DEFAULT_COMPRESSION, DEFAULT_RESTORE_POINTS, MANIFEST_SUFFIX, BackupStore, is_manifest
+from .journal import (
+    DEFAULT_SNAPSHOT_EVERY, ChangeJournal, delete_backup, is_snapshot, journal_path, lesson_records, prune_backups,
+    restore_backup, write_snapshot,
+)
+from .backup_writer import BackupWriter
+from .history import DEFAULT_HISTORY_LIMIT, EditHistory
+from .grid import ScheduleGrid, time_key
+from .ledger import LoadLedger
+from .reports import ReportCache, report_cube
+from .refresh import RefreshScheduler
+from .registry import EntityRegistry
+from .archive import (
+    ARCHIVE_FORMATS, ARCHIVE_SUFFIX, ArchiveCatalog, ColumnarArchive, archive_summary, is_archive, lessons_count,
+    read_archive, save_archive, summarize, write_columnar_archive,
+)
+from .optimizer import DEFAULT_WEIGHTS, LocalSearch, OptimizeResult, optimize_schedule
+from .restarts import RestartResult, best_of_n
@@ -0,0 +1,318 @@
+"""Архив расписаний: JSON или столбцовый двоичный формат.
+
+Столбцовый файл *.npcol — заголовок JSON (настройки, сущности, описание
+столбцов) и за ним столбцы расписания сырыми массивами numpy, выровненными
+по 64 байта. Категориальные столбцы хранятся кодами, идентификаторы —
+int32 с INT32_MIN вместо пропуска. Строки упорядочены по неделям, и в
+заголовке записан диапазон строк каждой недели.
+
+Файл открывается через np.memmap: чтение заголовка и подсчет занятий для
+списка архива не трогают остальные столбцы, а lessons(weeks=..., group_ids=...)
+собирает DataFrame только из нужных строк. Многолетний архив открывается
+сразу, в память попадает только просматриваемое.
+
+ArchiveCatalog хранит сводки всех архивов (числа сущностей и занятий по
+статусам) в catalog.json, и вкладка «Архив» строится без чтения файлов.
+"""
+import json
+import os
+import struct
+import threading
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .constants import LESSON_COLUMNS
+from .model import STATE_KEYS, schedule_to_records
+from .storage import python_value, schedule_from_json
+
+ARCHIVE_SUFFIX = '.npcol'
+ARCHIVE_FORMATS = {'json': '.json', 'columnar': ARCHIVE_SUFFIX}
+MAGIC = b'SCHEDCOL1\n'
+ALIGN = 64
+NA_INT = np.iinfo(np.int32).min
+CATALOG_NAME = 'catalog.json'
+
+
+def is_archive(filename):
+    return str(filename).endswith(('.json', ARCHIVE_SUFFIX)) and filename != CATALOG_NAME
+
+
+def _encode_column(series):
+    """(массив numpy, описание для заголовка)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = [python_value(c) for c in series.cat.categories]
+        dtype = np.int16 if len(categories) < np.iinfo(np.int16).max else np.int32
+        meta = {'kind': 'category', 'categories': categories, 'ordered': bool(series.cat.ordered)}
+        return series.cat.codes.to_numpy().astype(dtype), meta
+    if series.dtype == 'Int32':
+        return series.to_numpy(dtype='int32', na_value=NA_INT), {'kind': 'nullable'}
+    values = series.to_numpy()
+    if values.dtype == object:
+        raise ValueError(f"Столбец {series.name} не приведен к компактному типу")
+    return values, {'kind': 'plain'}
+
+
+def write_columnar_archive(path, state, schedule, saved_at=None):
+    """Записывает состояние и расписание (в компактном виде) в файл *.npcol"""
+    header = {
+        'version': 1,
+        'saved_at': saved_at or datetime.now().isoformat(),
+        'state': {key: state.get(key, {} if key == 'settings' else []) for key in STATE_KEYS},
+        'rows': 0,
+        'weeks': {},
+        'columns': {},
+    }
+    blocks = []
+    if schedule is not None and not schedule.empty:
+        order = np.argsort(schedule['week'].to_numpy(), kind='stable')
+        frame = schedule.iloc[order]
+        header['rows'] = len(frame)
+        weeks, starts = np.unique(frame['week'].to_numpy(), return_index=True)
+        stops = list(starts[1:]) + [len(frame)]
+        header['weeks'] = {str(int(w)): [int(a), int(b)] for w, a, b in zip(weeks, starts, stops)}
+        offset = 0
+        for column in [c for c in LESSON_COLUMNS if c in frame.columns]:
+            values, meta = _encode_column(frame[column])
+            values = np.ascontiguousarray(values)
+            meta.update({'dtype': values.dtype.str, 'offset': offset})
+            header['columns'][column] = meta
+            blocks.append((offset, values))
+            offset += -(-values.nbytes // ALIGN) * ALIGN
+    raw_header = json.dumps(header, ensure_ascii=False, default=python_value).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(raw_header)) // ALIGN) * ALIGN
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(raw_header)))
+        f.write(raw_header)
+        for offset, values in blocks:
+            f.seek(data_start + offset)
+            f.write(values.tobytes())
+        f.truncate()
+    os.replace(tmp_path, path)
+
+
+class ColumnarArchive:
+    """Архив *.npcol: заголовок читается сразу, столбцы — отображением в память по требованию"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path}: не столбцовый архив расписания")
+            (length,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(length).decode('utf-8'))
+        self.data_start = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+        self.rows = self.header['rows']
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Отображения закрываются, когда на них не остается ссылок
+        self._columns.clear()
+
+    def state(self):
+        """Настройки и списки сущностей (как data в load_state)"""
+        return json.loads(json.dumps(self.header['state']))
+
+    def weeks(self):
+        return sorted(int(week) for week in self.header['weeks'])
+
+    def column(self, name):
+        """Столбец целиком как np.memmap (без копирования в память)"""
+        if name not in self._columns:
+            meta = self.header['columns'][name]
+            self._columns[name] = np.memmap(self.path, dtype=np.dtype(meta['dtype']), mode='r',
+                                            offset=self.data_start + meta['offset'], shape=(self.rows,))
+        return self._columns[name]
+
+    def _positions(self, weeks=None, group_ids=None, statuses=None):
+        if weeks is None:
+            positions = np.arange(self.rows)
+        else:
+            ranges = [self.header['weeks'][str(int(w))] for w in weeks if str(int(w)) in self.header['weeks']]
+            positions = np.concatenate([np.arange(a, b) for a, b in ranges]) if ranges else np.arange(0)
+        if group_ids is not None and len(positions):
+            groups = np.asarray(self.column('group_id')[positions])
+            positions = positions[np.isin(groups, [int(g) for g in group_ids])]
+        if statuses is not None and len(positions):
+            categories = self.header['columns']['status']['categories']
+            codes = [categories.index(status) for status in statuses if status in categories]
+            positions = positions[np.isin(np.asarray(self.column('status')[positions]), codes)]
+        return positions
+
+    def _decode(self, name, positions):
+        meta = self.header['columns'][name]
+        values = np.asarray(self.column(name)[positions])
+        if meta['kind'] == 'category':
+            return pd.Categorical.from_codes(values.astype(np.int32), categories=meta['categories'],
+                                             ordered=meta['ordered'])
+        if meta['kind'] == 'nullable':
+            return pd.arrays.IntegerArray(values.astype(np.int32), values == NA_INT)
+        return values
+
+    def lessons(self, weeks=None, group_ids=None, statuses=None):
+        """Компактное расписание только для недель weeks, групп group_ids и статусов statuses (None — все)"""
+        if not self.rows:
+            return pd.DataFrame()
+        positions = self._positions(weeks, group_ids, statuses)
+        return pd.DataFrame({name: self._decode(name, positions) for name in self.header['columns']})
+
+    def status_counts(self):
+        """{статус: число занятий} — по кодам столбца status, без сборки DataFrame"""
+        if not self.rows or 'status' not in self.header['columns']:
+            return {}
+        categories = self.header['columns']['status']['categories']
+        counts = np.bincount(np.asarray(self.column('status'), dtype=np.int64) + 1, minlength=len(categories) + 1)
+        return {str(category): int(count) for category, count in zip(categories, counts[1:]) if count}
+
+
+def save_archive(path, state, schedule, saved_at=None):
+    """Архив в формате по расширению path: *.npcol — столбцовый, иначе JSON-записи"""
+    saved_at = saved_at or datetime.now().isoformat()
+    if str(path).endswith(ARCHIVE_SUFFIX):
+        write_columnar_archive(path, state, schedule, saved_at)
+        return
+    data = dict({key: state.get(key, {} if key == 'settings' else []) for key in STATE_KEYS},
+                schedule=schedule_to_records(schedule), saved_at=saved_at)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=python_value)
+
+
+def read_archive(path, statuses=None):
+    """(data, расписание) из архива любого формата; data['saved_at'] — время сохранения.
+
+    statuses — только занятия с этими статусами: из столбцового архива
+    читаются лишь их строки, JSON-архив фильтруется после разбора.
+    """
+    if str(path).endswith(ARCHIVE_SUFFIX):
+        with ColumnarArchive(path) as archive:
+            data = archive.state()
+            data['saved_at'] = archive.header.get('saved_at')
+            return data, archive.lessons(statuses=statuses)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    schedule = schedule_from_json(data.pop('schedule', []), data.get('settings'))
+    if statuses is not None and not schedule.empty:
+        schedule = schedule[schedule['status'].isin(statuses)]
+    return data, schedule
+
+
+SUMMARY_KEYS = ('groups', 'teachers', 'classrooms', 'subjects')
+
+
+def summarize(state, schedule):
+    """Сводка для списка архива по данным в памяти: числа сущностей и занятий по статусам"""
+    summary = {key: len(state.get(key, [])) for key in SUMMARY_KEYS}
+    statuses = schedule['status'].value_counts() if schedule is not None and not schedule.empty else {}
+    summary['statuses'] = {str(status): int(count) for status, count in dict(statuses).items() if count}
+    return summary
+
+
+def archive_summary(path):
+    """Сводка архива path (см. summarize); у *.npcol читаются только заголовок и столбец статусов"""
+    if str(path).endswith(ARCHIVE_SUFFIX):
+        with ColumnarArchive(path) as archive:
+            summary = {key: len(archive.header['state'].get(key, [])) for key in SUMMARY_KEYS}
+            summary['statuses'] = archive.status_counts()
+        return summary
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    summary = {key: len(data.get(key, [])) for key in SUMMARY_KEYS}
+    summary['statuses'] = dict(Counter(str(s.get('status')) for s in data.get('schedule', [])))
+    return summary
+
+
+def lessons_count(summary, statuses):
+    """Занятий с одним из статусов statuses по сводке архива"""
+    return sum(summary.get('statuses', {}).get(status, 0) for status in statuses)
+
+
+class ArchiveCatalog:
+    """Сводки архивов в archive_dir/catalog.json, чтобы список не разбирал каждый файл.
+
+    Запись действительна, пока у файла те же mtime и размер. Новые и
+    измененные файлы разбираются в refresh() — его вызывают в фоновом
+    потоке; методы защищены блокировкой.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = str(archive_dir)
+        self.path = os.path.join(self.archive_dir, CATALOG_NAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _stat(self, filename):
+        stat = os.stat(os.path.join(self.archive_dir, filename))
+        return stat.st_mtime, stat.st_size
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self._entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def entries(self):
+        """[(имя, mtime, сводка или None, если файл еще не разобран)] от новых к старым"""
+        rows = []
+        for filename in os.listdir(self.archive_dir):
+            if not is_archive(filename):
+                continue
+            mtime, size = self._stat(filename)
+            with self._lock:
+                entry = self._entries.get(filename)
+            fresh = entry is not None and entry['mtime'] == mtime and entry['size'] == size
+            rows.append((filename, mtime, entry['summary'] if fresh else None))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
+
+    def add(self, filename, summary=None):
+        """Запоминает сводку файла (после записи архива — без повторного чтения)"""
+        mtime, size = self._stat(filename)
+        if summary is None:
+            summary = self._read_summary(filename)
+        with self._lock:
+            self._entries[filename] = {'mtime': mtime, 'size': size, 'summary': summary}
+            self._save()
+
+    def remove(self, filename):
+        with self._lock:
+            if self._entries.pop(filename, None) is not None:
+                self._save()
+
+    def _read_summary(self, filename):
+        try:
+            return archive_summary(os.path.join(self.archive_dir, filename))
+        except Exception as e:
+            # Поврежденный файл запоминается, чтобы не разбирать его при каждом открытии
+            return {'error': str(e)}
+
+    def refresh(self):
+        """Разбирает файлы без актуальной сводки, убирает записи удаленных; возвращает число разобранных"""
+        stale = [filename for filename, _, summary in self.entries() if summary is None]
+        updates = {}
+        for filename in stale:
+            summary = self._read_summary(filename)
+            mtime, size = self._stat(filename)
+            updates[filename] = {'mtime': mtime, 'size': size, 'summary': summary}
+        existing = set(f for f in os.listdir(self.archive_dir) if is_archive(f))
+        with self._lock:
+            removed = [filename for filename in self._entries if filename not in existing]
+            for filename in removed:
+                del self._entries[filename]
+            self._entries.update(updates)
+            if updates or removed:
+                self._save()
+        return len(updates)
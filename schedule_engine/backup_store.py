@@ -0,0 +1,137 @@
+"""Бэкапы с дедупликацией: хранилище частей по содержимому.
+
+Состояние режется на части — настройки, каждый список сущностей и
+расписание каждой недели. Часть сжимается и кладется в objects/ под
+именем, равным SHA-256 ее JSON; уже существующие части не пишутся
+повторно. Сам бэкап — маленький манифест backup_<время>.manifest.json со
+ссылками на части, поэтому тысячи точек восстановления занимают место
+нескольких полных копий: от снимка к снимку меняются одна-две недели
+расписания и пара списков.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from .model import STATE_KEYS, schedule_to_records
+from .storage import python_value, schedule_from_json
+
+MANIFEST_SUFFIX = '.manifest.json'
+OBJECTS_DIR = 'objects'
+MANIFEST_VERSION = 1
+DEFAULT_RESTORE_POINTS = 1000
+# Уровень сжатия zlib для снимков и частей: 0 — без сжатия, 9 — максимальное
+DEFAULT_COMPRESSION = 6
+
+
+def is_manifest(path):
+    return str(path).endswith(MANIFEST_SUFFIX)
+
+
+class BackupStore:
+    """Манифесты и части в каталоге бэкапов backup_dir"""
+
+    def __init__(self, backup_dir, compression=DEFAULT_COMPRESSION):
+        self.backup_dir = str(backup_dir)
+        self.compression = compression
+        self.objects_dir = os.path.join(self.backup_dir, OBJECTS_DIR)
+
+    # --- Части ---
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + '.json.gz')
+
+    def _put(self, value):
+        payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=python_value).encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Через временный файл: оборванная запись не оставит битую часть под верным именем
+            tmp_path = path + '.tmp'
+            with gzip.open(tmp_path, 'wb', compresslevel=self.compression) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _get(self, digest):
+        with gzip.open(self._object_path(digest), 'rb') as f:
+            return json.loads(f.read().decode('utf-8'))
+
+    def put_state(self, state, schedule):
+        """Записывает недостающие части; возвращает {часть: хеш} для манифеста"""
+        chunks = {key: self._put(state.get(key, {} if key == 'settings' else [])) for key in STATE_KEYS}
+        weeks = {}
+        if schedule is not None and not schedule.empty:
+            for week, frame in schedule.groupby('week', sort=True):
+                weeks[str(int(week))] = self._put(schedule_to_records(frame))
+        chunks['schedule'] = weeks
+        return chunks
+
+    # --- Манифесты ---
+    def manifests(self):
+        """Пути манифестов от старых к новым (имя содержит время создания)"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted(f for f in os.listdir(self.backup_dir) if is_manifest(f))
+        return [os.path.join(self.backup_dir, name) for name in names]
+
+    @staticmethod
+    def read_manifest(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, path, state, schedule, reuse=None):
+        """Бэкап в манифест path; если состояние совпадает с манифестом reuse — новый не пишется.
+
+        Возвращает путь манифеста, в котором лежит это состояние.
+        """
+        chunks = self.put_state(state, schedule)
+        if reuse is not None and os.path.exists(reuse) and self.read_manifest(reuse).get('chunks') == chunks:
+            return reuse
+        manifest = {'version': MANIFEST_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+                    'chunks': chunks}
+        tmp_path = str(path) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return str(path)
+
+    def load(self, path):
+        """(data, расписание) из манифеста"""
+        chunks = self.read_manifest(path)['chunks']
+        data = {key: self._get(chunks[key]) if key in chunks else ({} if key == 'settings' else [])
+                for key in STATE_KEYS}
+        records = []
+        for digest in chunks.get('schedule', {}).values():
+            records.extend(self._get(digest))
+        # Недели лежат отдельно — исходный порядок строк восстанавливается по id
+        records.sort(key=lambda record: record.get('id') or 0)
+        return data, schedule_from_json(records, data['settings'])
+
+    def collect_garbage(self):
+        """Удаляет части, на которые не ссылается ни один манифест; возвращает их число"""
+        if not os.path.isdir(self.objects_dir):
+            return 0
+        used = set()
+        for path in self.manifests():
+            chunks = self.read_manifest(path)['chunks']
+            used.update(digest for key, digest in chunks.items() if key != 'schedule')
+            used.update(chunks.get('schedule', {}).values())
+        removed = 0
+        for prefix in os.listdir(self.objects_dir):
+            folder = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(folder):
+                if prefix + name.split('.', 1)[0] not in used:
+                    os.remove(os.path.join(folder, name))
+                    removed += 1
+            if not os.listdir(folder):
+                os.rmdir(folder)
+        return removed
+
+    def disk_usage(self):
+        """Байт на диске: манифесты плюс все части"""
+        total = sum(os.path.getsize(path) for path in self.manifests())
+        for root, _, files in os.walk(self.objects_dir):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
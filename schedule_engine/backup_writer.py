@@ -0,0 +1,144 @@
+"""Запись бэкапов в фоновом потоке.
+
+Главный поток только снимает дешевые копии (записи измененных занятий,
+копию списков сущностей, копию компактного расписания для снимка) и
+ставит их в очередь. Поток записи ждет, пока поток правок затихнет на
+delay секунд, и сбрасывает все накопленное одним проходом: серия правок
+подряд превращается в одну строку журнала, а новый снимок отменяет еще
+не записанные изменения, которые в него и так вошли.
+
+on_written(snapshot_path или None) и on_error(текст) вызываются из потока
+записи — в GUI их нужно передавать в главный поток (сигнал Qt, очередь
+для Tk).
+"""
+import os
+import threading
+import time
+
+from .backup_store import DEFAULT_COMPRESSION
+from .journal import ChangeJournal, journal_path, prune_backups, write_snapshot
+
+DEFAULT_DELAY = 0.5
+# Дольше этого запись не откладывается даже при непрерывных правках
+MAX_DELAY = 5.0
+
+
+class BackupWriter:
+    """Фоновый поток, записывающий снимки и журнал изменений"""
+
+    def __init__(self, on_written=None, on_error=None, delay=DEFAULT_DELAY):
+        self.on_written = on_written
+        self.on_error = on_error
+        self.delay = delay
+        self.journal = None
+        self._cond = threading.Condition()
+        self._snapshot = None
+        self._lessons = {}
+        self._state = None
+        self._busy = False
+        self._hurry = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='backup-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def records(self):
+        """Записей в журнале текущего снимка, включая еще не записанные"""
+        with self._cond:
+            pending = (1 if self._lessons else 0) + (1 if self._state is not None else 0)
+            return (len(self.journal) if self.journal is not None else 0) + pending
+
+    # --- Очередь (главный поток) ---
+    def snapshot(self, path, state, schedule, keep=None, compression=DEFAULT_COMPRESSION):
+        """Полный снимок state и schedule (копий, которые больше не меняются)"""
+        with self._cond:
+            self._snapshot = (path, state, schedule, keep, compression)
+            self._lessons = {}
+            self._state = None
+            self._cond.notify()
+
+    def lessons(self, records):
+        """Измененные занятия (engine.lesson_records); повторная правка занятия заменяет прежнюю"""
+        with self._cond:
+            for record in records:
+                self._lessons[record['id']] = record
+            self._cond.notify()
+
+    def state(self, state):
+        """Настройки и списки сущностей (копия); в журнал попадут только отличия"""
+        with self._cond:
+            self._state = state
+            self._cond.notify()
+
+    def flush(self, timeout=None):
+        """Ждет, пока все поставленное в очередь будет записано"""
+        with self._cond:
+            self._hurry = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: not self._pending() and not self._busy, timeout)
+            self._hurry = False
+            return done
+
+    def close(self, timeout=None):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    # --- Поток записи ---
+    def _pending(self):
+        return self._snapshot is not None or bool(self._lessons) or self._state is not None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending() or self._closed)
+                if not self._pending():
+                    return
+                # Пока правки продолжаются, откладываем запись, чтобы собрать их вместе
+                deadline = time.monotonic() + MAX_DELAY
+                while not (self._closed or self._hurry) and time.monotonic() < deadline \
+                        and self._cond.wait(self.delay):
+                    pass
+                snapshot, lessons, state = self._snapshot, list(self._lessons.values()), self._state
+                self._snapshot, self._lessons, self._state = None, {}, None
+                self._busy = True
+            try:
+                self._write(snapshot, lessons, state)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(str(e))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, snapshot, lessons, state):
+        written = None
+        if snapshot is not None:
+            path, snapshot_state, schedule, keep, compression = snapshot
+            # Без снимка журнал не к чему применять: следующий снимок начнет его заново
+            journal, self.journal = self.journal, None
+            stored = write_snapshot(path, snapshot_state, schedule, compression)
+            if stored == str(path):
+                self.journal = ChangeJournal(stored, snapshot_state)
+                written = stored
+            elif journal is not None and journal.path == journal_path(stored):
+                # Состояние не изменилось — продолжаем журнал прежнего снимка
+                self.journal = journal
+            else:
+                self.journal = ChangeJournal(stored, snapshot_state)
+            if keep is not None:
+                prune_backups(os.path.dirname(str(path)), keep)
+        if self.journal is None:
+            return
+        try:
+            self.journal.record_rows(lessons)
+            if state is not None:
+                self.journal.record_state(state)
+        except Exception:
+            # Журнал с пропуском нельзя воспроизводить — ждем нового снимка
+            self.journal = None
+            raise
+        if self.on_written is not None:
+            self.on_written(written)
@@ -0,0 +1,68 @@
+"""Пакетная генерация расписаний из командной строки.
+
+Пример:
+    python -m schedule_engine campus1.json campus2.json -o out/
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+from .constants import STATUS_CONFIRMED, STATUS_PLANNED
+from .generator import GENERATION_MODES, generate_schedule
+from .model import load_state, schedule_to_records
+from .restarts import best_of_n
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='schedule_engine',
+        description='Генерация расписания без графического интерфейса'
+    )
+    parser.add_argument('inputs', nargs='+', help='JSON-файлы с группами, преподавателями, аудиториями, предметами и настройками')
+    parser.add_argument('-o', '--output', default='.', help='Каталог для результатов (по умолчанию текущий)')
+    parser.add_argument('--seed', type=int, default=None, help='Зерно генератора случайных чисел')
+    parser.add_argument('--mode', choices=GENERATION_MODES, default='random',
+                        help='random — случайная раскладка, solver — решатель с распространением ограничений')
+    parser.add_argument('--restarts', type=int, default=1,
+                        help='Число независимых запусков; сохраняется лучший (зерна --seed, --seed+1, ...)')
+    parser.add_argument('--workers', type=int, default=None, help='Число процессов для --restarts (по умолчанию — все ядра)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Не выводить предупреждения генератора')
+    return parser
+
+
+def run_one(path, output_dir, seed=None, mode='random', restarts=1, workers=None):
+    data = load_state(path)
+    if restarts > 1:
+        result = best_of_n(data, restarts, mode=mode, workers=workers, base_seed=seed)
+        schedule, seed = result.schedule, result.seed
+    else:
+        schedule = generate_schedule(data, seed=seed, mode=mode)
+    data['schedule'] = schedule_to_records(schedule)
+    data['saved_at'] = datetime.now().isoformat()
+    name = os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(output_dir, f"{name}_schedule.json")
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    status_counts = schedule['status'].value_counts() if not schedule.empty else {}
+    return out_path, int(status_counts.get(STATUS_CONFIRMED, 0)), int(status_counts.get(STATUS_PLANNED, 0)), seed
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.ERROR if args.quiet else logging.WARNING, format='%(levelname)s: %(message)s')
+    os.makedirs(args.output, exist_ok=True)
+    exit_code = 0
+    for path in args.inputs:
+        try:
+            out_path, confirmed, planned, seed = run_one(path, args.output, args.seed, args.mode,
+                                                         args.restarts, args.workers)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ошибка генерации для {path}: {e}", file=sys.stderr)
+            exit_code = 1
+            continue
+        seed_text = f", зерно {seed}" if seed is not None else ""
+        print(f"{path}: подтверждено {confirmed}, без преподавателя {planned}{seed_text} -> {out_path}")
+    return exit_code
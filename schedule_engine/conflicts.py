@@ -0,0 +1,42 @@
+"""Поиск конфликтов и оценка качества расписания."""
+import pandas as pd
+
+from .constants import STATUS_CONFIRMED, STATUS_PLANNED
+
+CONFLICT_KEYS = ('teacher_id', 'classroom_id', 'group_id')
+
+
+def find_conflicts(schedule):
+    """Подтвержденные занятия, у которых ресурс занят дважды в один слот.
+
+    Возвращает {'teacher_id': DataFrame, 'classroom_id': ..., 'group_id': ...}.
+    Пустые ресурсы (занятие без аудитории) конфликтом не считаются.
+    """
+    result = {key: pd.DataFrame() for key in CONFLICT_KEYS}
+    if schedule.empty:
+        return result
+    confirmed = schedule[schedule['status'] == STATUS_CONFIRMED]
+    for key in CONFLICT_KEYS:
+        if key not in confirmed.columns:
+            continue
+        rows = confirmed[confirmed[key].notna()]
+        result[key] = rows[rows.duplicated([key, 'day', 'time', 'week'], keep=False)]
+    return result
+
+
+def count_conflicts(schedule):
+    return sum(len(rows) for rows in find_conflicts(schedule).values())
+
+
+def score_schedule(schedule):
+    """Оценка для сравнения вариантов (меньше — лучше).
+
+    (конфликты, неназначенные часы, занятия без аудитории): неназначенные —
+    строки 'запланировано' плюс часы, которые решатель не смог разместить.
+    """
+    if schedule.empty:
+        return 0, 0, 0
+    unassigned = int((schedule['status'] == STATUS_PLANNED).sum()) + int(schedule.attrs.get('unplaced', 0))
+    confirmed = schedule['status'] == STATUS_CONFIRMED
+    without_room = int((confirmed & schedule['classroom_id'].isna()).sum())
+    return count_conflicts(schedule), unassigned, without_room
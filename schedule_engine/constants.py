@@ -0,0 +1,22 @@
+"""Общие константы движка расписания."""
+
+DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+DEFAULT_BELL_SCHEDULE = '8:00-8:45,8:55-9:40,9:50-10:35,10:45-11:30,11:40-12:25,12:35-13:20'
+
+STATUS_FREE = 'свободно'
+STATUS_PLANNED = 'запланировано'
+STATUS_CONFIRMED = 'подтверждено'
+
+LESSON_COLUMNS = [
+    'id', 'week', 'day', 'time',
+    'group_id', 'group_name',
+    'subject_id', 'subject_name',
+    'teacher_id', 'teacher_name',
+    'classroom_id', 'classroom_name',
+    'status'
+]
+
+# Поля занятия, которые очищаются при освобождении слота
+LESSON_FIELDS = ['subject_id', 'subject_name', 'teacher_id', 'teacher_name', 'classroom_id', 'classroom_name']
+EMPTY_LESSON = [None, '', None, '', None, '']
@@ -0,0 +1,193 @@
+"""Генерация расписания без графического интерфейса."""
+import logging
+import random
+
+import numpy as np
+import pandas as pd
+
+from .constants import LESSON_COLUMNS, STATUS_CONFIRMED, STATUS_FREE, STATUS_PLANNED
+from .model import get_times, group_subjects, working_days
+from .occupancy import OccupancyIndex
+from .storage import compact_schedule, set_lesson
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    """Генерация прервана по запросу (cancel() вернул True)"""
+
+
+def check_cancel(cancel):
+    if cancel is not None and cancel():
+        raise GenerationCancelled()
+
+
+PROGRESS_STEP = 200
+
+
+def create_schedule_structure(data):
+    """Пустая сетка: по слоту на каждую группу в каждое время рабочих дней.
+
+    Столбцы собираются целиком через numpy и приводятся к компактным типам
+    (см. storage.compact_schedule).
+    """
+    settings = data.get('settings', {})
+    groups = data.get('groups', [])
+    times = get_times(settings)
+    slots = working_days(settings, data.get('holidays'))
+    per_day = len(times) * len(groups)
+    n = len(slots) * per_day
+    if n == 0:
+        return compact_schedule(pd.DataFrame(columns=LESSON_COLUMNS), settings)
+    repeats = len(slots) * len(times)
+    frame = pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'week': np.repeat([week for week, _ in slots], per_day),
+        'day': np.repeat([day for _, day in slots], per_day),
+        'time': np.tile(np.repeat(times, len(groups)), len(slots)),
+        'group_id': np.tile([group['id'] for group in groups], repeats),
+        'group_name': np.tile([group['name'] for group in groups], repeats),
+        'subject_id': None,
+        'subject_name': '',
+        'teacher_id': None,
+        'teacher_name': '',
+        'classroom_id': None,
+        'classroom_name': '',
+        'status': STATUS_FREE,
+    }, columns=LESSON_COLUMNS)
+    return compact_schedule(frame, settings)
+
+
+def assign_subjects_to_groups(schedule, data, rng=random, progress=None, cancel=None):
+    """Раскладывает часы предметов по свободным слотам групп (hours_per_week на каждую неделю).
+
+    progress(done, total) вызывается после каждой группы, cancel() —
+    перед каждой группой (True прерывает генерацию).
+    """
+    if schedule.empty:
+        return schedule
+    subjects = data.get('subjects', [])
+    groups = data.get('groups', [])
+    free_mask = schedule['status'] == STATUS_FREE
+    assigned_rows = []
+    assigned_subjects = []
+    for done, group in enumerate(groups, 1):
+        check_cancel(cancel)
+        if progress is not None:
+            progress(done, len(groups))
+        subjects_for_group = group_subjects(group, subjects)
+        if not subjects_for_group:
+            continue
+        subjects_for_group.sort(key=lambda x: x.get('hours_per_week', 0), reverse=True)
+        group_rows = schedule[(schedule['group_id'] == group['id']) & free_mask]
+        for week, week_rows in group_rows.groupby('week'):
+            free_slots = list(week_rows.index)
+            for subject in subjects_for_group:
+                hours_per_week = int(subject.get('hours_per_week', 0) or 0)
+                if hours_per_week <= 0:
+                    continue
+                if len(free_slots) < hours_per_week:
+                    logger.warning("Недостаточно свободных слотов для предмета %s у группы %s (неделя %s)",
+                                   subject['name'], group['name'], week)
+                    continue
+                selected_slots = rng.sample(free_slots, hours_per_week)
+                for slot in selected_slots:
+                    assigned_rows.append(slot)
+                    assigned_subjects.append(subject)
+                selected = set(selected_slots)
+                free_slots = [slot for slot in free_slots if slot not in selected]
+    if assigned_rows:
+        set_lesson(schedule, assigned_rows,
+                   subject_id=[s['id'] for s in assigned_subjects],
+                   subject_name=[s['name'] for s in assigned_subjects],
+                   status=STATUS_PLANNED)
+    return schedule
+
+
+def assign_teachers_and_classrooms(schedule, data, rng=random, occupancy=None, progress=None, cancel=None):
+    """Назначает преподавателей и аудитории запланированным занятиям.
+
+    Занятость берется из индекса OccupancyIndex (строится по подтвержденным
+    занятиям, если не передан) и обновляется по мере назначения.
+    progress(done, total) и cancel() — по числу обработанных занятий.
+    """
+    if schedule.empty:
+        return schedule
+    if occupancy is None:
+        occupancy = OccupancyIndex.from_schedule(schedule, data)
+    teacher_names = {t['id']: t['name'] for t in data.get('teachers', [])}
+    classroom_names = {c['id']: c['name'] for c in data.get('classrooms', [])}
+    group_sizes = {g['id']: g.get('students', 0) or 0 for g in data.get('groups', [])}
+    planned = schedule[schedule['status'] == STATUS_PLANNED]
+    updates = []
+    for done, (idx, subject_name, group_id, week, day, time) in enumerate(zip(
+            planned.index, planned['subject_name'], planned['group_id'],
+            planned['week'], planned['day'], planned['time']), 1):
+        if done % PROGRESS_STEP == 0:
+            check_cancel(cancel)
+            if progress is not None:
+                progress(done, len(planned))
+        slot = occupancy.slot(week, day, time)
+        if slot is None:
+            continue
+        available_teachers = occupancy.available_teachers(subject_name, slot)
+        if not available_teachers:
+            logger.warning("Для предмета %s не найдено подходящего преподавателя.", subject_name)
+            continue
+        teacher_id = rng.choice(available_teachers)
+        available_classrooms = occupancy.free_classrooms(slot, group_sizes.get(group_id, 0))
+        if available_classrooms:
+            classroom_id = rng.choice(available_classrooms)
+        else:
+            classroom_id = None
+            logger.warning("Для занятия %s в %s %s (неделя %s) не найдено подходящей аудитории.",
+                           subject_name, day, time, week)
+        occupancy.occupy(slot, teacher_id, classroom_id, group_id)
+        updates.append((idx, teacher_id, classroom_id))
+    if updates:
+        rows = [u[0] for u in updates]
+        set_lesson(schedule, rows,
+                   teacher_id=[u[1] for u in updates],
+                   teacher_name=[teacher_names[u[1]] for u in updates],
+                   classroom_id=[u[2] for u in updates],
+                   classroom_name=[classroom_names.get(u[2], '') for u in updates],
+                   status=STATUS_CONFIRMED)
+    return schedule
+
+
+GENERATION_MODES = ('random', 'solver')
+
+
+def generate_schedule(data, seed=None, rng=None, mode='random', progress=None, cancel=None):
+    """Полный цикл генерации: структура, предметы, преподаватели и аудитории.
+
+    mode='random' — случайная раскладка часов с последующим подбором
+    ресурсов; mode='solver' — решатель с распространением ограничений
+    (см. schedule_engine.solver).
+    progress(done, total) сообщает ход работы, cancel() опрашивается по
+    ходу генерации; если он вернул True, выбрасывается GenerationCancelled.
+    Входные данные не изменяются, результат — новый DataFrame.
+    """
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Неизвестный режим генерации: {mode}")
+    if rng is None:
+        rng = random.Random(seed)
+    if mode == 'solver':
+        from .solver import solve_schedule
+        return solve_schedule(data, rng=rng, progress=progress, cancel=cancel)
+    schedule = create_schedule_structure(data)
+    n_groups = len(data.get('groups', []))
+    if progress is None:
+        subjects_progress = teachers_progress = None
+    else:
+        # Общая шкала 0..2*n_groups: сначала предметы по группам, затем преподаватели
+        def subjects_progress(done, total):
+            progress(done, 2 * n_groups)
+
+        def teachers_progress(done, total):
+            progress(n_groups + done * n_groups // max(total, 1), 2 * n_groups)
+    assign_subjects_to_groups(schedule, data, rng, progress=subjects_progress, cancel=cancel)
+    assign_teachers_and_classrooms(schedule, data, rng, progress=teachers_progress, cancel=cancel)
+    if progress is not None:
+        progress(2 * n_groups, 2 * n_groups)
+    return schedule
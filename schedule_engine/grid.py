@@ -0,0 +1,105 @@
+"""Сводная раскладка расписания для сетки недели (пары × дни).
+
+Строки расписания один раз упорядочиваются по (неделя, пара, день) —
+дальше неделя это срез массива, а фильтр по группе, преподавателю или
+аудитории — сравнение кодов категорий на этом срезе. cells() возвращает
+для каждой ячейки позицию первой подходящей строки (как iloc[0] по
+отфильтрованной таблице), а lessons() читает поля только этих строк,
+поэтому смена недели или фильтра не копирует и не перебирает таблицу.
+
+Раскладка опирается на столбцы week/day/time, которые set_lesson не
+меняет; при замене расписания нужен новый ScheduleGrid.
+"""
+import numpy as np
+import pandas as pd
+
+from .constants import DAYS, STATUS_FREE
+
+# Код дня вне DAYS: такие строки в сетку не попадают
+OTHER_DAY = len(DAYS)
+DAY_SLOTS = len(DAYS) + 1
+
+
+def time_key(time_slot):
+    """Ключ сортировки пары по времени начала ('8:00-8:45' раньше '10:45-11:30')"""
+    try:
+        hours, minutes = str(time_slot).split('-')[0].strip().split(':')
+        return 0, int(hours), int(minutes), ''
+    except ValueError:
+        return 1, 0, 0, str(time_slot)
+
+
+def _categorical(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.array
+    return pd.Categorical(values)
+
+
+class ScheduleGrid:
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.times = []
+        self._order = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._weeks = np.empty(0, dtype=np.int64)
+        if schedule is None or schedule.empty or not {'week', 'day', 'time'} <= set(schedule.columns):
+            return
+        times = _categorical(schedule['time'])
+        self.times = sorted((str(t) for t in times.categories), key=time_key)
+        time_rank = {t: i for i, t in enumerate(self.times)}
+        # -1 (пропуск) попадает в последний элемент таблицы перекодировки
+        time_codes = np.array([time_rank[str(t)] for t in times.categories] + [len(self.times)])[times.codes]
+        days = _categorical(schedule['day'])
+        day_codes = np.array([DAYS.index(d) if d in DAYS else OTHER_DAY for d in days.categories] + [OTHER_DAY])[days.codes]
+        weeks = schedule['week'].to_numpy()
+        self._order = np.lexsort((day_codes, time_codes, weeks))
+        self._keys = (time_codes * DAY_SLOTS + day_codes)[self._order]
+        self._weeks = weeks[self._order]
+
+    def _matches(self, column, positions, name):
+        values = self.schedule[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            code = values.cat.categories.get_indexer([name])[0]
+            if code < 0:
+                return np.zeros(len(positions), dtype=bool)
+            return values.array.codes[positions] == code
+        return values.to_numpy()[positions] == name
+
+    def cells(self, week, days_count, group=None, teacher=None, classroom=None, status=None, busy_first=False):
+        """(пары, позиции): пары недели, где есть подходящие строки, по времени начала,
+        и массив пары × день с позицией строки (iloc) или -1 для пустой ячейки.
+
+        status — показывать в ячейках только строки с этим статусом (набор пар от него не зависит);
+        busy_first — в ячейке первой идет занятая строка, свободные — только если занятых нет
+        (в слоте у каждой группы своя строка, и без фильтра по группе первой чаще всего оказывается свободная).
+        """
+        lo, hi = np.searchsorted(self._weeks, week, 'left'), np.searchsorted(self._weeks, week, 'right')
+        positions, keys = self._order[lo:hi], self._keys[lo:hi]
+        for column, name in (('group_name', group), ('teacher_name', teacher), ('classroom_name', classroom)):
+            if name and len(positions):
+                mask = self._matches(column, positions, name)
+                positions, keys = positions[mask], keys[mask]
+        time_codes = keys // DAY_SLOTS
+        rows = np.unique(time_codes[time_codes < len(self.times)])
+        if status and len(positions):
+            mask = self._matches('status', positions, status)
+            positions, keys = positions[mask], keys[mask]
+        if busy_first and len(positions):
+            order = np.lexsort((self._matches('status', positions, STATUS_FREE), keys))
+            positions, keys = positions[order], keys[order]
+        # Порядок внутри ячейки — исходный (lexsort устойчив), первая строка — первое вхождение ключа
+        cell_keys, first = np.unique(keys, return_index=True)
+        time_codes = cell_keys // DAY_SLOTS
+        grid = np.full((len(rows), days_count), -1, dtype=np.int64)
+        day_codes = cell_keys % DAY_SLOTS
+        shown = (day_codes < days_count) & (time_codes < len(self.times))
+        grid[np.searchsorted(rows, time_codes[shown]), day_codes[shown]] = positions[first][shown]
+        return [self.times[r] for r in rows], grid
+
+    def lessons(self, positions, columns=('subject_name', 'teacher_name', 'classroom_name', 'status')):
+        """{(пара, день): (значения columns)} для непустых ячеек массива cells()"""
+        rows, days = np.nonzero(positions >= 0)
+        taken = positions[rows, days]
+        values = [np.asarray(self.schedule[column].array[taken], dtype=object) for column in columns]
+        return {(row, day): tuple('' if pd.isna(v) else str(v) for v in lesson)
+                for row, day, lesson in zip(rows.tolist(), days.tolist(), zip(*values))}
@@ -0,0 +1,134 @@
+"""История правок для отмены и повтора (Ctrl+Z / Ctrl+Y).
+
+Шаг истории — обратимая операция, а не копия DataFrame:
+- занятия: записи измененных строк до и после правки;
+- списки сущностей: кортежи JSON-строк элементов до и после; одинаковые
+  строки хранятся одним объектом (intern), поэтому неизмененные элементы
+  общие для всех шагов и на шаг уходит лишь кортеж ссылок.
+
+Отмена записывает старые значения только в затронутые строки, поэтому
+стоит O(размера правки), и сотни шагов занимают немного памяти.
+
+Порядок работы: before_lessons(schedule, rows) перед записью занятий,
+commit(schedule, state) в конце действия пользователя (приложения делают это
+в create_backup), undo/redo возвращают метки строк, которые нужно
+сохранить.
+"""
+import json
+from collections import deque
+
+import pandas as pd
+
+from .constants import LESSON_FIELDS
+from .model import schedule_to_records
+from .storage import python_value, set_lesson
+
+DEFAULT_HISTORY_LIMIT = 500
+# Настройки не отменяются: Ctrl+Z в расписании не должен менять, например, число недель
+ENTITY_KEYS = ['groups', 'teachers', 'classrooms', 'subjects', 'holidays', 'substitutions']
+WRITE_COLUMNS = LESSON_FIELDS + ['status']
+
+
+class EditHistory:
+    """Стеки отмены и повтора для одного расписания (при замене расписания — reset)"""
+
+    def __init__(self, limit=DEFAULT_HISTORY_LIMIT):
+        self.limit = limit
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+        self.schedule = None
+        self._pending = {}
+        self._state = {}
+        self._strings = {}
+
+    def _intern(self, item):
+        text = json.dumps(item, ensure_ascii=False, sort_keys=True, default=python_value)
+        return self._strings.setdefault(text, text)
+
+    def _snapshot(self, items):
+        return tuple(self._intern(item) for item in items)
+
+    def reset(self, schedule, state):
+        """Новая точка отсчета: история прежнего расписания больше не применима"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.schedule = schedule
+        self._pending = {}
+        self._strings = {}
+        self._state = {key: self._snapshot(state.get(key, [])) for key in ENTITY_KEYS}
+
+    def before_lessons(self, schedule, rows):
+        """Запоминает строки rows до записи (первое значение в пределах шага)"""
+        if schedule is not self.schedule:
+            return
+        for row, record in _row_records(schedule, rows):
+            self._pending.setdefault(row, record)
+
+    def commit(self, schedule, state):
+        """Закрывает шаг: изменения занятий и списков сущностей с прошлого commit"""
+        if schedule is not self.schedule:
+            self.reset(schedule, state)
+            return False
+        lessons = []
+        if self._pending:
+            lessons = [(row, self._pending[row], new) for row, new in _row_records(schedule, list(self._pending))
+                       if _fields(self._pending[row]) != _fields(new)]
+            self._pending = {}
+        entities = {}
+        for key in ENTITY_KEYS:
+            current = self._snapshot(state.get(key, []))
+            if current != self._state[key]:
+                entities[key] = (self._state[key], current)
+                self._state[key] = current
+        if not lessons and not entities:
+            return False
+        self.undo_stack.append({'lessons': lessons, 'entities': entities})
+        self.redo_stack.clear()
+        return True
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self, schedule, state):
+        """Отменяет последний шаг; возвращает метки измененных строк или None, если отменять нечего"""
+        if not self.undo_stack or schedule is not self.schedule:
+            return None
+        step = self.undo_stack.pop()
+        self.redo_stack.append(step)
+        return self._apply(step, schedule, state, undo=True)
+
+    def redo(self, schedule, state):
+        if not self.redo_stack or schedule is not self.schedule:
+            return None
+        step = self.redo_stack.pop()
+        self.undo_stack.append(step)
+        return self._apply(step, schedule, state, undo=False)
+
+    def _apply(self, step, schedule, state, undo):
+        # Правки, не закрытые commit, относятся к текущему шагу и теряют смысл
+        self._pending = {}
+        rows = []
+        for row, before, after in step['lessons']:
+            set_lesson(schedule, row, **_fields(before if undo else after))
+            rows.append(row)
+        for key, (before, after) in step['entities'].items():
+            items = before if undo else after
+            # Срез, а не новый список: на списки ссылаются окно и диалоги
+            state[key][:] = [json.loads(text) for text in items]
+            self._state[key] = items
+        return rows
+
+
+def _fields(record):
+    return {column: record.get(column) for column in WRITE_COLUMNS}
+
+
+def _row_records(schedule, rows):
+    """[(метка строки, запись)] для rows — метки, список меток или булева маска"""
+    subset = schedule.loc[rows]
+    if isinstance(subset, pd.Series):
+        return [(rows, schedule_to_records(subset.to_frame().T)[0])]
+    return list(zip(subset.index, schedule_to_records(subset)))
@@ -0,0 +1,75 @@
+"""Перегенерация части расписания: одной группы, недели или преподавателя.
+
+Занятия вне выбранной области не меняются и считаются занятостью, поэтому
+ручные правки остальных групп сохраняются, а добавление группы посреди
+семестра стоит одного небольшого прогона решателя.
+"""
+import random
+
+import pandas as pd
+
+from .constants import STATUS_CONFIRMED, STATUS_FREE
+from .generator import create_schedule_structure
+from .solver import DEFAULT_BACKTRACK_LIMIT, ScheduleSolver
+from .storage import clear_lesson, compact_schedule
+
+
+def add_missing_groups(schedule, data):
+    """Добавляет пустые строки для групп, которых еще нет в расписании"""
+    present = set(schedule['group_id']) if not schedule.empty else set()
+    missing = [g for g in data.get('groups', []) if g['id'] not in present]
+    if not missing:
+        return schedule, []
+    rows = create_schedule_structure(dict(data, groups=missing))
+    next_id = int(schedule['id'].max()) + 1 if not schedule.empty else 1
+    rows['id'] = range(next_id, next_id + len(rows))
+    schedule = compact_schedule(pd.concat([schedule, rows], ignore_index=True), data.get('settings'))
+    return schedule, [g['id'] for g in missing]
+
+
+def regeneration_scope(schedule, group_id=None, week=None, teacher_id=None):
+    """Маска строк, попадающих в область (условия объединяются по «и»)"""
+    mask = pd.Series(True, index=schedule.index)
+    if group_id is not None:
+        mask &= schedule['group_id'] == group_id
+    if week is not None:
+        mask &= schedule['week'] == week
+    if teacher_id is not None:
+        mask &= schedule['teacher_id'] == teacher_id
+    return mask
+
+
+def regenerate(schedule, data, group_id=None, week=None, teacher_id=None,
+               seed=None, rng=None, backtrack_limit=DEFAULT_BACKTRACK_LIMIT):
+    """Перегенерирует занятия области и возвращает новое расписание.
+
+    Без group_id/week/teacher_id размещаются только группы, которых еще нет
+    в расписании. Для преподавателя заново размещаются ровно снятые с него
+    часы (преподаватель может смениться на другого с тем же предметом), для
+    группы и недели — недобор до hours_per_week.
+    Неразмещенные часы — в schedule.attrs['unplaced'].
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    schedule, new_groups = add_missing_groups(compact_schedule(schedule, data.get('settings')), data)
+    solver = ScheduleSolver(data, rng=rng, backtrack_limit=backtrack_limit)
+    if group_id is None and week is None and teacher_id is None:
+        if new_groups:
+            schedule = solver.solve(schedule, groups=set(new_groups))
+        schedule.attrs['unplaced'] = sum(hours for _, _, hours, _ in solver.unplaced)
+        return schedule
+
+    mask = regeneration_scope(schedule, group_id, week, teacher_id) & (schedule['status'] != STATUS_FREE)
+    demand = None
+    if teacher_id is not None:
+        demand = {}
+        freed = schedule[mask & (schedule['status'] == STATUS_CONFIRMED)]
+        for key in zip(freed['group_id'], freed['subject_id'], freed['week']):
+            demand[key] = demand.get(key, 0) + 1
+    clear_lesson(schedule, mask)
+
+    groups = {group_id} if group_id is not None else None
+    weeks = {week} if week is not None else None
+    schedule = solver.solve(schedule, weeks=weeks, groups=groups, demand=demand)
+    schedule.attrs['unplaced'] = sum(hours for _, _, hours, _ in solver.unplaced)
+    return schedule
@@ -0,0 +1,229 @@
+"""Журнал изменений между полными бэкапами.
+
+Полный бэкап (снимок) пишется редко: после замены расписания целиком, по
+таймеру, по кнопке или когда журнал вырос до snapshot_every записей. Между
+снимками каждая правка дописывает в <снимок>.journal.jsonl одну строку:
+измененные занятия (по id) или изменившийся список сущностей, для
+дописанных в конец элементов (новый преподаватель, замена) — только они.
+Восстановление: снимок + воспроизведение журнала.
+"""
+import json
+import os
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+
+from .backup_store import DEFAULT_COMPRESSION, BackupStore, is_manifest
+from .constants import LESSON_COLUMNS
+from .model import STATE_KEYS, schedule_to_records
+from .storage import compact_schedule, python_value, schedule_from_json, schedule_to_lists, set_lesson
+
+DEFAULT_SNAPSHOT_EVERY = 200
+SNAPSHOT_MEMBER = 'temp_data.json'
+
+
+def journal_path(snapshot_path):
+    """backups/backup_20250901_120000.zip -> backups/backup_20250901_120000.journal.jsonl"""
+    return os.path.splitext(str(snapshot_path))[0] + '.journal.jsonl'
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, default=python_value)
+
+
+def lesson_records(schedule, rows):
+    """Текущее содержимое строк rows (метки индекса schedule) в виде записей журнала"""
+    subset = schedule.loc[rows]
+    if isinstance(subset, pd.Series):
+        subset = subset.to_frame().T
+    return schedule_to_records(subset)
+
+
+class ChangeJournal:
+    """Дописываемый журнал изменений к снимку snapshot_path.
+
+    state — состояние на момент снимка (settings и списки сущностей): с ним
+    сравнивается record_state, чтобы писать только изменившиеся части.
+    """
+
+    def __init__(self, snapshot_path, state):
+        self.path = journal_path(snapshot_path)
+        self.records = 0
+        self._items = {}
+        self._remember(state)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(_dump({'op': 'base', 'snapshot': os.path.basename(str(snapshot_path)),
+                           'created': datetime.now().isoformat()}) + '\n')
+
+    def __len__(self):
+        return self.records
+
+    def _remember(self, state):
+        for key in STATE_KEYS:
+            value = state.get(key, {} if key == 'settings' else [])
+            self._items[key] = _dump(value) if key == 'settings' else [_dump(item) for item in value]
+
+    def _append(self, record):
+        record['at'] = datetime.now().isoformat(timespec='seconds')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(_dump(record) + '\n')
+        self.records += 1
+
+    def record_lessons(self, schedule, rows):
+        """Записывает текущее содержимое строк rows (метки индекса schedule)"""
+        self.record_rows(lesson_records(schedule, rows))
+
+    def record_rows(self, records):
+        """Записывает уже снятые lesson_records занятия одной строкой журнала"""
+        if records:
+            self._append({'op': 'lessons', 'rows': records})
+
+    def record_state(self, state):
+        """Дописывает изменившиеся настройки и списки сущностей; возвращает число записей"""
+        written = 0
+        for key in STATE_KEYS:
+            value = state.get(key, {} if key == 'settings' else [])
+            if key == 'settings':
+                dumped = _dump(value)
+                if dumped != self._items[key]:
+                    self._append({'op': 'set', 'key': key, 'value': value})
+                    self._items[key] = dumped
+                    written += 1
+                continue
+            old = self._items[key]
+            new = [_dump(item) for item in value]
+            if new == old:
+                continue
+            if len(new) > len(old) and new[:len(old)] == old:
+                self._append({'op': 'extend', 'key': key, 'items': value[len(old):]})
+            else:
+                self._append({'op': 'set', 'key': key, 'value': value})
+            self._items[key] = new
+            written += 1
+        return written
+
+
+def replay(path, data, schedule):
+    """Применяет журнал path к состоянию из снимка; возвращает (data, schedule)"""
+    if not os.path.exists(path):
+        return data, schedule
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # Недописанная последняя строка (сбой во время записи) — дальше журнала нет
+            break
+        op = record.get('op')
+        if op == 'set':
+            data[record['key']] = record['value']
+        elif op == 'extend':
+            data.setdefault(record['key'], []).extend(record['items'])
+        elif op == 'lessons':
+            schedule = _apply_lessons(schedule, record['rows'], data.get('settings'))
+    return data, schedule
+
+
+def _apply_lessons(schedule, rows, settings):
+    if not rows:
+        return schedule
+    if schedule.empty:
+        return schedule_from_json(rows, settings)
+    position = pd.Series(schedule.index, index=schedule['id'].to_numpy())
+    new_rows = []
+    for row in rows:
+        if row.get('id') in position.index:
+            fields = {column: row.get(column) for column in LESSON_COLUMNS if column != 'id'}
+            set_lesson(schedule, position[row['id']], **fields)
+        else:
+            new_rows.append(row)
+    if new_rows:
+        schedule = compact_schedule(pd.concat([schedule, schedule_from_json(new_rows, settings)], ignore_index=True),
+                                    settings)
+    return schedule
+
+
+def is_snapshot(filename):
+    """Полный бэкап: zip-архив или манифест хранилища с дедупликацией"""
+    return str(filename).endswith('.zip') or is_manifest(filename)
+
+
+def _journal_records(snapshot_path):
+    """Сколько изменений записано в журнал снимка (без строки base)"""
+    path = journal_path(snapshot_path)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def write_snapshot(snapshot_path, state, schedule, compression=DEFAULT_COMPRESSION):
+    """Полный снимок; возвращает путь, где лежит это состояние.
+
+    *.zip — архив с temp_data.json (данные «💾 Сохранить», расписание столбцами
+    списками), сжатый deflate уровня compression. *.manifest.json — манифест
+    BackupStore; если состояние не изменилось с последнего манифеста и в его
+    журнале пусто, новый снимок не пишется и возвращается старый путь.
+    """
+    if is_manifest(snapshot_path):
+        store = BackupStore(os.path.dirname(str(snapshot_path)), compression)
+        manifests = store.manifests()
+        reuse = manifests[-1] if manifests and not _journal_records(manifests[-1]) else None
+        return store.save(snapshot_path, state, schedule, reuse=reuse)
+    data = {key: state.get(key, {} if key == 'settings' else []) for key in STATE_KEYS}
+    data['schedule'] = schedule_to_lists(schedule)
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=python_value).encode('utf-8')
+    # Архив собирается рядом и подменяет старый целиком: оборванная запись не портит бэкап
+    tmp_path = str(snapshot_path) + '.tmp'
+    if compression:
+        archive = zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compression)
+    else:
+        archive = zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED)
+    with archive:
+        archive.writestr(SNAPSHOT_MEMBER, payload)
+    os.replace(tmp_path, snapshot_path)
+    return str(snapshot_path)
+
+
+def delete_backup(snapshot_path):
+    """Удаляет снимок с журналом; части, нужные только ему, — тоже"""
+    os.remove(snapshot_path)
+    if os.path.exists(journal_path(snapshot_path)):
+        os.remove(journal_path(snapshot_path))
+    if is_manifest(snapshot_path):
+        BackupStore(os.path.dirname(str(snapshot_path))).collect_garbage()
+
+
+def prune_backups(backup_dir, keep):
+    """Удаляет старые снимки (и их журналы), оставляя keep последних"""
+    backup_files = [os.path.join(backup_dir, f) for f in os.listdir(backup_dir) if is_snapshot(f)]
+    backup_files.sort(key=os.path.getctime)
+    removed_manifests = False
+    while len(backup_files) > keep:
+        oldest_file = backup_files.pop(0)
+        os.remove(oldest_file)
+        if os.path.exists(journal_path(oldest_file)):
+            os.remove(journal_path(oldest_file))
+        removed_manifests = removed_manifests or is_manifest(oldest_file)
+    if removed_manifests:
+        BackupStore(backup_dir).collect_garbage()
+
+
+def read_snapshot(snapshot_path):
+    """Состояние из снимка (zip или манифест): (data, schedule) без учета журнала"""
+    if is_manifest(snapshot_path):
+        return BackupStore(os.path.dirname(str(snapshot_path))).load(snapshot_path)
+    with zipfile.ZipFile(snapshot_path, 'r') as zf:
+        data = json.loads(zf.read(SNAPSHOT_MEMBER).decode('utf-8'))
+    for key in STATE_KEYS:
+        data.setdefault(key, {} if key == 'settings' else [])
+    schedule = schedule_from_json(data.pop('schedule', []), data['settings'])
+    return data, schedule
+
+
+def restore_backup(snapshot_path):
+    """Снимок плюс его журнал: последнее состояние перед следующим снимком"""
+    data, schedule = read_snapshot(snapshot_path)
+    return replay(journal_path(snapshot_path), data, schedule)
@@ -0,0 +1,88 @@
+"""Журнал нагрузки преподавателей: счетчики подтвержденных занятий.
+
+Счетчики ведутся по предметам, неделям и дням (неделя, день) для каждого
+преподавателя и обновляются по измененным строкам (refresh), а не пересчетом
+всего расписания: вклад каждой подтвержденной строки запоминается, поэтому
+подтверждение, перенос, замена или освобождение занятия стоит O(1) на строку,
+а запросы план/факт/остаток — обращение к словарю.
+
+Журнал привязан к одному объекту расписания; при замене расписания или
+массовой записи в него (assign_*) строится новый LoadLedger.
+"""
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+from .constants import STATUS_CONFIRMED
+
+LEDGER_COLUMNS = ['teacher_id', 'subject_name', 'week', 'day', 'status']
+
+
+class LoadLedger:
+    def __init__(self, schedule=None):
+        self.schedule = schedule
+        self.by_subject = defaultdict(Counter)
+        self.by_week = defaultdict(Counter)
+        self.by_day = defaultdict(Counter)
+        self.totals = Counter()
+        # {метка строки: (преподаватель, предмет, неделя, день)} для подтвержденных строк
+        self._rows = {}
+        if schedule is None or schedule.empty or not set(LEDGER_COLUMNS) <= set(schedule.columns):
+            return
+        confirmed = schedule.loc[(schedule['status'] == STATUS_CONFIRMED) & schedule['teacher_id'].notna(),
+                                 LEDGER_COLUMNS[:-1]]
+        for row, teacher_id, subject, week, day in zip(confirmed.index, *(confirmed[c] for c in confirmed.columns)):
+            self._add(row, (int(teacher_id), subject, int(week), day))
+
+    def _add(self, row, entry):
+        teacher_id, subject, week, day = entry
+        self._rows[row] = entry
+        self.by_subject[teacher_id][subject] += 1
+        self.by_week[teacher_id][week] += 1
+        self.by_day[teacher_id][(week, day)] += 1
+        self.totals[teacher_id] += 1
+
+    def _remove(self, row):
+        teacher_id, subject, week, day = self._rows.pop(row)
+        for counter, key in ((self.by_subject[teacher_id], subject), (self.by_week[teacher_id], week),
+                             (self.by_day[teacher_id], (week, day)), (self.totals, teacher_id)):
+            counter[key] -= 1
+            if not counter[key]:
+                del counter[key]
+
+    def refresh(self, rows):
+        """Пересчитывает вклад строк rows (метка, список меток или маска) после записи в них"""
+        if self.schedule is None or self.schedule.empty:
+            return
+        subset = self.schedule.loc[rows, LEDGER_COLUMNS]
+        if isinstance(subset, pd.Series):
+            subset = subset.to_frame().T
+        for row, teacher_id, subject, week, day, status in zip(subset.index, *(subset[c] for c in LEDGER_COLUMNS)):
+            if row in self._rows:
+                self._remove(row)
+            if status == STATUS_CONFIRMED and not pd.isna(teacher_id):
+                self._add(row, (int(teacher_id), subject, int(week), day))
+
+    # --- Запросы ---
+    def fact(self, teacher_id):
+        """Подтвержденных занятий преподавателя всего"""
+        return self.totals.get(teacher_id, 0)
+
+    def fact_by_subject(self, teacher_id):
+        """{предмет: занятий} по убыванию числа занятий"""
+        return dict(self.by_subject[teacher_id].most_common()) if teacher_id in self.by_subject else {}
+
+    def week_load(self, teacher_id, week):
+        return self.by_week[teacher_id].get(week, 0) if teacher_id in self.by_week else 0
+
+    def day_load(self, teacher_id, week, day):
+        return self.by_day[teacher_id].get((week, day), 0) if teacher_id in self.by_day else 0
+
+    def remaining(self, teacher):
+        """Остаток плана преподавателя (сумма subject_hours минус факт, не меньше нуля)"""
+        plan = sum((teacher.get('subject_hours') or {}).values())
+        return max(0, plan - self.fact(teacher['id']))
+
+    def fact_hours(self):
+        """{id преподавателя: {предмет: занятий}} — как teacher_fact_hours, без прохода по расписанию"""
+        return {teacher_id: self.fact_by_subject(teacher_id) for teacher_id in self.totals}
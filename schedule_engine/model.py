@@ -0,0 +1,97 @@
+"""Разбор входных данных: настройки, звонки, праздники, предметы преподавателей."""
+import json
+from datetime import datetime, timedelta
+
+from .constants import DAYS, DEFAULT_BELL_SCHEDULE, STATUS_CONFIRMED
+
+STATE_KEYS = ['settings', 'groups', 'teachers', 'classrooms', 'subjects', 'holidays', 'substitutions']
+
+
+def load_state(path):
+    """Читает JSON-файл в формате save_data/save_current_schedule"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for key in STATE_KEYS:
+        data.setdefault(key, {} if key == 'settings' else [])
+    return data
+
+
+def get_days(settings):
+    return DAYS[:int(settings.get('days_per_week', 5))]
+
+
+def get_times(settings):
+    bell_schedule = settings.get('bell_schedule') or DEFAULT_BELL_SCHEDULE
+    return [slot.strip() for slot in bell_schedule.split(',') if slot.strip()]
+
+
+def get_weeks(settings):
+    return list(range(1, int(settings.get('weeks', 2)) + 1))
+
+
+def get_holiday_dates(holidays):
+    holiday_dates = set()
+    for h in holidays or []:
+        try:
+            holiday_dates.add(datetime.strptime(h['date'], '%Y-%m-%d').date())
+        except (KeyError, TypeError, ValueError):
+            # Пропускаем некорректные даты
+            continue
+    return holiday_dates
+
+
+def working_days(settings, holidays=None):
+    """Список (неделя, день) без праздничных дат"""
+    days = get_days(settings)
+    holiday_dates = get_holiday_dates(holidays)
+    try:
+        start_date = datetime.strptime(settings.get('start_date', ''), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        start_date = None
+    result = []
+    for week in get_weeks(settings):
+        for day_index, day in enumerate(days):
+            if start_date and holiday_dates:
+                current_date = start_date + timedelta(weeks=week - 1, days=day_index)
+                if current_date in holiday_dates:
+                    continue
+            result.append((week, day))
+    return result
+
+
+def teacher_subjects(teacher):
+    """Названия предметов преподавателя (subject_hours в Qt, строка subjects в Tk)"""
+    subject_hours = teacher.get('subject_hours')
+    if subject_hours:
+        return set(subject_hours)
+    subjects = teacher.get('subjects', '')
+    if isinstance(subjects, str):
+        return {s.strip() for s in subjects.split(',') if s.strip()}
+    return set(subjects or [])
+
+
+def teacher_fact_hours(schedule):
+    """{id преподавателя: {предмет: число подтвержденных занятий}} — одна группировка по расписанию.
+
+    Предметы каждого преподавателя идут по убыванию числа занятий (как value_counts).
+    """
+    if schedule is None or schedule.empty:
+        return {}
+    confirmed = schedule.loc[schedule['status'] == STATUS_CONFIRMED, ['teacher_id', 'subject_name']]
+    counts = confirmed.groupby(['teacher_id', 'subject_name'], observed=True, sort=False).size()
+    result = {}
+    for (teacher_id, subject), count in counts[counts > 0].sort_values(ascending=False, kind='stable').items():
+        result.setdefault(int(teacher_id), {})[subject] = int(count)
+    return result
+
+
+def group_subjects(group, subjects):
+    return [s for s in subjects if s.get('group_type') in [group.get('type'), 'общий']]
+
+
+def schedule_to_records(schedule):
+    """Строки расписания в виде списка словарей, пригодного для json.dump"""
+    if schedule is None or schedule.empty:
+        return []
+    frame = schedule.astype(object).where(schedule.notna(), None)
+    return frame.to_dict(orient='records')
@@ -0,0 +1,145 @@
+"""Индекс занятости преподавателей, аудиторий и групп.
+
+Плотные массивы numpy размером ресурс × неделя × день × пара: проверка
+«свободен ли преподаватель в (w, d, t)» и «сколько пар у него сегодня» —
+O(1), поиск всех свободных аудиторий на слот — одна векторная операция.
+Хранятся счетчики, а не флаги, чтобы освобождение слота с конфликтом
+(двойным назначением) не теряло второе занятие.
+"""
+import numpy as np
+
+from .constants import STATUS_CONFIRMED
+from .model import get_days, get_times, get_weeks, teacher_subjects
+
+
+class OccupancyIndex:
+    def __init__(self, weeks, days, times, teachers=(), classrooms=(), groups=()):
+        self.weeks = list(weeks)
+        self.days = list(days)
+        self.times = list(times)
+        self.week_pos = {w: i for i, w in enumerate(self.weeks)}
+        self.day_pos = {d: i for i, d in enumerate(self.days)}
+        self.time_pos = {t: i for i, t in enumerate(self.times)}
+        shape = (len(self.weeks), len(self.days), len(self.times))
+
+        self.teacher_ids = [t['id'] for t in teachers]
+        self.classroom_ids = [c['id'] for c in classrooms]
+        self.group_ids = [g['id'] for g in groups]
+        self.teacher_pos = {tid: i for i, tid in enumerate(self.teacher_ids)}
+        self.classroom_pos = {cid: i for i, cid in enumerate(self.classroom_ids)}
+        self.group_pos = {gid: i for i, gid in enumerate(self.group_ids)}
+
+        self.teacher = np.zeros((len(self.teacher_ids),) + shape, dtype=np.int8)
+        self.classroom = np.zeros((len(self.classroom_ids),) + shape, dtype=np.int8)
+        self.group = np.zeros((len(self.group_ids),) + shape, dtype=np.int8)
+        self.teacher_day = np.zeros((len(self.teacher_ids),) + shape[:2], dtype=np.int16)
+
+        # Статические свойства ресурсов
+        self.capacity = np.array([c.get('capacity', 0) or 0 for c in classrooms], dtype=np.int32)
+        self.max_per_day = np.array([t.get('max_lessons_per_day', 10) or 10 for t in teachers], dtype=np.int16)
+        self.allowed_day = np.ones((len(self.teacher_ids), len(self.days)), dtype=bool)
+        for i, teacher in enumerate(teachers):
+            forbidden_days = teacher.get('forbidden_days', '') or ''
+            for d, day in enumerate(self.days):
+                if day in forbidden_days:
+                    self.allowed_day[i, d] = False
+        self._subject_teachers = {}
+        for i, teacher in enumerate(teachers):
+            for subject_name in teacher_subjects(teacher):
+                self._subject_teachers.setdefault(subject_name, []).append(i)
+        self._subject_teachers = {k: np.array(v, dtype=np.intp) for k, v in self._subject_teachers.items()}
+
+    @classmethod
+    def for_data(cls, data):
+        settings = data.get('settings', {})
+        return cls(get_weeks(settings), get_days(settings), get_times(settings),
+                   data.get('teachers', []), data.get('classrooms', []), data.get('groups', []))
+
+    @classmethod
+    def from_schedule(cls, schedule, data):
+        """Индекс по подтвержденным занятиям расписания"""
+        index = cls.for_data(data)
+        index.load(schedule)
+        return index
+
+    # --- Координаты ---
+    def slot(self, week, day, time):
+        """(неделя, день, время) -> индексы (w, d, t) или None, если слот вне сетки"""
+        try:
+            return self.week_pos[week], self.day_pos[day], self.time_pos[time]
+        except KeyError:
+            return None
+
+    def _row(self, pos, resource_id):
+        if resource_id is None:
+            return None
+        try:
+            return pos.get(resource_id, pos.get(int(resource_id)))
+        except (TypeError, ValueError):
+            return None
+
+    # --- Изменение ---
+    def load(self, schedule):
+        if schedule is None or schedule.empty:
+            return
+        confirmed = schedule[schedule['status'] == STATUS_CONFIRMED]
+        for week, day, time, teacher_id, classroom_id, group_id in zip(
+                confirmed['week'], confirmed['day'], confirmed['time'],
+                confirmed['teacher_id'], confirmed['classroom_id'], confirmed['group_id']):
+            slot = self.slot(week, day, time)
+            if slot is not None:
+                self.occupy(slot, teacher_id, classroom_id, group_id)
+
+    def _change(self, slot, teacher_id, classroom_id, group_id, delta):
+        w, d, t = slot
+        row = self._row(self.teacher_pos, teacher_id)
+        if row is not None:
+            self.teacher[row, w, d, t] += delta
+            self.teacher_day[row, w, d] += delta
+        row = self._row(self.classroom_pos, classroom_id)
+        if row is not None:
+            self.classroom[row, w, d, t] += delta
+        row = self._row(self.group_pos, group_id)
+        if row is not None:
+            self.group[row, w, d, t] += delta
+
+    def occupy(self, slot, teacher_id=None, classroom_id=None, group_id=None):
+        self._change(slot, teacher_id, classroom_id, group_id, 1)
+
+    def release(self, slot, teacher_id=None, classroom_id=None, group_id=None):
+        self._change(slot, teacher_id, classroom_id, group_id, -1)
+
+    # --- Запросы O(1) ---
+    def is_teacher_free(self, teacher_id, slot):
+        row = self._row(self.teacher_pos, teacher_id)
+        return row is None or self.teacher[(row,) + tuple(slot)] == 0
+
+    def is_classroom_free(self, classroom_id, slot):
+        row = self._row(self.classroom_pos, classroom_id)
+        return row is None or self.classroom[(row,) + tuple(slot)] == 0
+
+    def is_group_free(self, group_id, slot):
+        row = self._row(self.group_pos, group_id)
+        return row is None or self.group[(row,) + tuple(slot)] == 0
+
+    def teacher_lessons_on_day(self, teacher_id, week_pos, day_pos):
+        row = self._row(self.teacher_pos, teacher_id)
+        return 0 if row is None else int(self.teacher_day[row, week_pos, day_pos])
+
+    # --- Векторные запросы ---
+    def free_classrooms(self, slot, min_capacity=0):
+        """ID всех свободных аудиторий нужной вместимости на слот"""
+        w, d, t = slot
+        rows = np.flatnonzero((self.classroom[:, w, d, t] == 0) & (self.capacity >= min_capacity))
+        return [self.classroom_ids[i] for i in rows]
+
+    def available_teachers(self, subject_name, slot):
+        """ID преподавателей предмета, свободных на слот и не превысивших max_lessons_per_day"""
+        rows = self._subject_teachers.get(subject_name)
+        if rows is None or not len(rows):
+            return []
+        w, d, t = slot
+        ok = ((self.teacher[rows, w, d, t] == 0)
+              & self.allowed_day[rows, d]
+              & (self.teacher_day[rows, w, d] < self.max_per_day[rows]))
+        return [self.teacher_ids[i] for i in rows[ok]]
@@ -0,0 +1,366 @@
+"""Локальный поиск (имитация отжига) по готовому расписанию.
+
+Минимизируется взвешенная стоимость:
+  * жесткие конфликты — преподаватель или аудитория заняты дважды в слот;
+  * аудитория меньше группы, занятие без аудитории;
+  * превышение max_lessons_per_day, занятия в forbidden_days;
+  * занятия вне preferred_days (если они заданы);
+  * «окна» групп — пустые пары между первой и последней парой дня.
+
+Ходы: перенос занятия в свободный слот своей группы в той же неделе,
+обмен двух занятий группы, смена аудитории. Стоимость после хода
+пересчитывается только по затронутым счетчикам (delta evaluation), поэтому
+за минуту проверяются миллионы ходов. Лучшее найденное решение хранится
+отдельно: результат никогда не хуже исходного, а сообщаемая через progress
+стоимость не возрастает.
+"""
+import math
+import random
+import time
+
+from .constants import LESSON_FIELDS, STATUS_CONFIRMED, STATUS_FREE
+from .generator import check_cancel
+from .model import get_days, get_times, get_weeks
+from .storage import clear_lesson, set_lesson
+
+DEFAULT_WEIGHTS = {
+    'conflict': 1000,
+    'capacity': 200,
+    'no_room': 50,
+    'overload': 100,
+    'forbidden_day': 100,
+    'preferred_day': 1,
+    'gap': 3,
+}
+
+CHECK_EVERY = 2000
+
+
+class OptimizeResult:
+    def __init__(self, schedule, initial_cost, cost, moves, accepted, elapsed):
+        self.schedule = schedule
+        self.initial_cost = initial_cost
+        self.cost = cost
+        self.moves = moves
+        self.accepted = accepted
+        self.elapsed = elapsed
+
+
+class LocalSearch:
+    def __init__(self, schedule, data, weights=None, rng=None):
+        self.schedule = schedule
+        self.rng = rng or random.Random()
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        settings = data.get('settings', {})
+        days = get_days(settings)
+        times = get_times(settings)
+        weeks = get_weeks(settings)
+        self.n_days = D = len(days)
+        self.n_times = n_times = len(times)
+        self.n_slots = S = D * n_times
+        self.n_weeks = W = len(weeks)
+        week_pos = {w: i for i, w in enumerate(weeks)}
+        day_pos = {d: i for i, d in enumerate(days)}
+        time_pos = {t: i for i, t in enumerate(times)}
+
+        teachers = data.get('teachers', [])
+        classrooms = data.get('classrooms', [])
+        groups = data.get('groups', [])
+        teacher_pos = {t['id']: i for i, t in enumerate(teachers)}
+        room_pos = {c['id']: i for i, c in enumerate(classrooms)}
+        group_pos = {g['id']: i for i, g in enumerate(groups)}
+        self.room_ids = [c['id'] for c in classrooms]
+        self.room_names = [c['name'] for c in classrooms]
+        self.capacity = [c.get('capacity', 0) or 0 for c in classrooms]
+        self.group_size = [g.get('students', 0) or 0 for g in groups]
+        self.max_per_day = [t.get('max_lessons_per_day', 10) or 10 for t in teachers]
+        self.forbidden = [[day in (t.get('forbidden_days', '') or '') for day in days] for t in teachers]
+        self.preferred = []
+        for t in teachers:
+            preferred_days = t.get('preferred_days', '') or ''
+            flags = [day in preferred_days for day in days]
+            # Без предпочтений все дни одинаково хороши
+            self.preferred.append(flags if any(flags) else [True] * D)
+        self.fitting_rooms = []
+        for size in self.group_size:
+            rooms = [r for r, cap in enumerate(self.capacity) if cap >= size]
+            self.fitting_rooms.append(rooms or list(range(len(classrooms))))
+
+        # Счетчики занятости
+        self.t_slot = [0] * (len(teachers) * W * S)
+        self.r_slot = [0] * (len(classrooms) * W * S)
+        self.t_day = [0] * (len(teachers) * W * D)
+        self.g_day = [0] * (len(groups) * W * D)  # битовая маска занятых пар группы за день
+        self.g_free = [0] * (len(groups) * W)  # битовая маска свободных строк группы за неделю
+
+        def to_index(pos, value):
+            if value is None:
+                return -1
+            try:
+                return pos.get(value, pos.get(int(value), -1))
+            except (TypeError, ValueError):
+                return -1
+
+        self.row_of = {}
+        self.lessons = []  # [group, week, slot, teacher, room] — индексы
+        self.lesson_rows = []
+        for idx, week, day, t, group_id, status, teacher_id, classroom_id in zip(
+                schedule.index, schedule['week'], schedule['day'], schedule['time'], schedule['group_id'],
+                schedule['status'], schedule['teacher_id'], schedule['classroom_id']):
+            g = to_index(group_pos, group_id)
+            if g < 0 or week not in week_pos or day not in day_pos or t not in time_pos:
+                continue
+            w = week_pos[week]
+            s = day_pos[day] * n_times + time_pos[t]
+            self.row_of[(g, w, s)] = idx
+            if status == STATUS_FREE:
+                self.g_free[g * W + w] |= 1 << s
+            elif status == STATUS_CONFIRMED:
+                lesson = [g, w, s, to_index(teacher_pos, teacher_id), to_index(room_pos, classroom_id)]
+                self.lessons.append(lesson)
+                self.lesson_rows.append(idx)
+                self._place(lesson, 1)
+            else:
+                # Запланированные без преподавателя занимают слот группы, но не двигаются
+                self.g_day[(g * W + w) * D + s // n_times] |= 1 << (s % n_times)
+        self.original = [tuple(lesson) for lesson in self.lessons]
+        self.cost = self.total_cost()
+
+    # --- счетчики ---
+    def _place(self, lesson, sign):
+        g, w, s, teacher, room = lesson
+        W, S, D, n_times = self.n_weeks, self.n_slots, self.n_days, self.n_times
+        d = s // n_times
+        if teacher >= 0:
+            self.t_slot[(teacher * W + w) * S + s] += sign
+            self.t_day[(teacher * W + w) * D + d] += sign
+        if room >= 0:
+            self.r_slot[(room * W + w) * S + s] += sign
+        key = (g * W + w) * D + d
+        if sign > 0:
+            self.g_day[key] |= 1 << (s % n_times)
+        else:
+            self.g_day[key] &= ~(1 << (s % n_times))
+
+    # --- составляющие стоимости ---
+    @staticmethod
+    def _gaps(mask):
+        if not mask:
+            return 0
+        return mask.bit_length() - (mask & -mask).bit_length() + 1 - bin(mask).count('1')
+
+    def _lesson_cost(self, lesson):
+        """Стоимость, зависящая только от самого занятия"""
+        g, w, s, teacher, room = lesson
+        wt = self.weights
+        cost = 0
+        if room < 0:
+            cost += wt['no_room']
+        elif self.capacity[room] < self.group_size[g]:
+            cost += wt['capacity']
+        if teacher >= 0:
+            d = s // self.n_times
+            if self.forbidden[teacher][d]:
+                cost += wt['forbidden_day']
+            if not self.preferred[teacher][d]:
+                cost += wt['preferred_day']
+        return cost
+
+    def _t_slot_cost(self, key):
+        c = self.t_slot[key]
+        return (c - 1) * self.weights['conflict'] if c > 1 else 0
+
+    def _r_slot_cost(self, key):
+        c = self.r_slot[key]
+        return (c - 1) * self.weights['conflict'] if c > 1 else 0
+
+    def _t_day_cost(self, key, teacher):
+        over = self.t_day[key] - self.max_per_day[teacher]
+        return over * self.weights['overload'] if over > 0 else 0
+
+    def _g_day_cost(self, key):
+        return self._gaps(self.g_day[key]) * self.weights['gap']
+
+    def total_cost(self):
+        W, D = self.n_weeks, self.n_days
+        cost = sum(self._lesson_cost(lesson) for lesson in self.lessons)
+        cost += sum((c - 1) * self.weights['conflict'] for c in self.t_slot if c > 1)
+        cost += sum((c - 1) * self.weights['conflict'] for c in self.r_slot if c > 1)
+        for key, count in enumerate(self.t_day):
+            teacher = key // (W * D)
+            if count > self.max_per_day[teacher]:
+                cost += (count - self.max_per_day[teacher]) * self.weights['overload']
+        cost += sum(self._gaps(mask) for mask in self.g_day) * self.weights['gap']
+        return cost
+
+    def _local_cost(self, placed, lessons):
+        """Стоимость размещенных занятий placed и всех счетчиков, которых касаются lessons"""
+        W, S, D, n_times = self.n_weeks, self.n_slots, self.n_days, self.n_times
+        t_keys, r_keys, d_keys, g_keys = set(), set(), set(), set()
+        cost = 0
+        for lesson in placed:
+            cost += self._lesson_cost(lesson)
+        for lesson in lessons:
+            g, w, s, teacher, room = lesson
+            d = s // n_times
+            if teacher >= 0:
+                t_keys.add((teacher * W + w) * S + s)
+                d_keys.add(((teacher * W + w) * D + d, teacher))
+            if room >= 0:
+                r_keys.add((room * W + w) * S + s)
+            g_keys.add((g * W + w) * D + d)
+        for key in t_keys:
+            cost += self._t_slot_cost(key)
+        for key in r_keys:
+            cost += self._r_slot_cost(key)
+        for key, teacher in d_keys:
+            cost += self._t_day_cost(key, teacher)
+        for key in g_keys:
+            cost += self._g_day_cost(key)
+        return cost
+
+    # --- ходы ---
+    def _propose(self):
+        """Возвращает (затронутые занятия до хода, новые значения) или None"""
+        rng = self.rng
+        i = rng.randrange(len(self.lessons))
+        lesson = self.lessons[i]
+        g, w, s, teacher, room = lesson
+        kind = rng.random()
+        if kind < 0.5:
+            free = self.g_free[g * self.n_weeks + w]
+            if not free:
+                return None
+            s2 = self._random_bit(free)
+            return [(i, [g, w, s2, teacher, room])]
+        if kind < 0.8:
+            j = rng.randrange(len(self.lessons))
+            other = self.lessons[j]
+            if j == i or other[0] != g or other[1] != w:
+                return None
+            return [(i, [g, w, other[2], teacher, room]), (j, [g, w, s, other[3], other[4]])]
+        rooms = self.fitting_rooms[g]
+        if not rooms:
+            return None
+        room2 = rooms[rng.randrange(len(rooms))]
+        if room2 == room:
+            return None
+        return [(i, [g, w, s, teacher, room2])]
+
+    def _random_bit(self, mask):
+        count = bin(mask).count('1')
+        k = self.rng.randrange(count)
+        while k:
+            mask &= mask - 1
+            k -= 1
+        return (mask & -mask).bit_length() - 1
+
+    def _apply(self, changes):
+        W = self.n_weeks
+        for i, new in changes:
+            old = self.lessons[i]
+            self._place(old, -1)
+            self.g_free[old[0] * W + old[1]] |= 1 << old[2]
+        for i, new in changes:
+            self._place(new, 1)
+            self.g_free[new[0] * W + new[1]] &= ~(1 << new[2])
+        olds = [self.lessons[i] for i, _ in changes]
+        for i, new in changes:
+            self.lessons[i] = new
+        return olds
+
+    def _revert(self, changes, olds):
+        self._apply([(i, old) for (i, _), old in zip(changes, olds)])
+
+    def run(self, time_limit=10.0, progress=None, cancel=None, t_start=None, t_end=0.5):
+        if not self.lessons:
+            return 0, 0
+        started = time.monotonic()
+        deadline = started + time_limit
+        best_cost = self.cost
+        best = [tuple(lesson) for lesson in self.lessons]
+        if t_start is None:
+            t_start = max(1.0, self.weights['gap'] * 2)
+        temperature = t_start
+        moves = accepted = 0
+        rng = self.rng
+        while True:
+            moves += 1
+            if moves % CHECK_EVERY == 0:
+                check_cancel(cancel)
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                # Геометрическое охлаждение по доле израсходованного времени
+                temperature = t_start * (t_end / t_start) ** ((now - started) / time_limit)
+                if progress is not None:
+                    progress(best_cost, min(1.0, (now - started) / time_limit))
+            changes = self._propose()
+            if changes is None:
+                continue
+            touched = [self.lessons[i] for i, _ in changes]
+            news = [new for _, new in changes]
+            before = self._local_cost(touched, touched + news)
+            olds = self._apply(changes)
+            after = self._local_cost(news, olds + news)
+            delta = after - before
+            if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+                self.cost += delta
+                accepted += 1
+                if self.cost < best_cost:
+                    best_cost = self.cost
+                    best = [tuple(lesson) for lesson in self.lessons]
+            else:
+                self._revert(changes, olds)
+        if self.cost != best_cost:
+            self._restore(best)
+            self.cost = best_cost
+        return moves, accepted
+
+    def _restore(self, lessons):
+        W = self.n_weeks
+        for lesson in self.lessons:
+            self._place(lesson, -1)
+            self.g_free[lesson[0] * W + lesson[1]] |= 1 << lesson[2]
+        self.lessons = [list(lesson) for lesson in lessons]
+        for lesson in self.lessons:
+            self._place(lesson, 1)
+            self.g_free[lesson[0] * W + lesson[1]] &= ~(1 << lesson[2])
+
+    def write_back(self):
+        """Переносит измененные занятия в DataFrame (одна массовая запись на столбец)"""
+        schedule = self.schedule
+        changed = [i for i, lesson in enumerate(self.lessons) if tuple(lesson) != self.original[i]]
+        if not changed:
+            return 0
+        source_rows = [self.lesson_rows[i] for i in changed]
+        contents = schedule.loc[source_rows, LESSON_FIELDS].to_numpy(copy=True)
+        target_rows = []
+        for k, i in enumerate(changed):
+            g, w, s, teacher, room = self.lessons[i]
+            target_rows.append(self.row_of[(g, w, s)])
+            if room != self.original[i][4]:
+                contents[k, 4] = self.room_ids[room] if room >= 0 else None
+                contents[k, 5] = self.room_names[room] if room >= 0 else ''
+        clear_lesson(schedule, source_rows)
+        set_lesson(schedule, target_rows, status=STATUS_CONFIRMED,
+                   **{field: list(contents[:, col]) for col, field in enumerate(LESSON_FIELDS)})
+        return len(changed)
+
+
+def optimize_schedule(schedule, data, time_limit=10.0, seed=None, rng=None, weights=None,
+                      progress=None, cancel=None):
+    """Улучшает расписание локальным поиском за time_limit секунд.
+
+    Возвращает OptimizeResult с новым DataFrame (исходный не меняется).
+    progress(лучшая_стоимость, доля_времени) вызывается периодически.
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    schedule = schedule.copy()
+    search = LocalSearch(schedule, data, weights=weights, rng=rng)
+    initial_cost = search.cost
+    started = time.monotonic()
+    moves, accepted = search.run(time_limit, progress=progress, cancel=cancel)
+    search.write_back()
+    return OptimizeResult(schedule, initial_cost, search.cost, moves, accepted, time.monotonic() - started)
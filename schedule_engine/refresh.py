@@ -0,0 +1,55 @@
+"""Отложенное обновление представлений окна по флагам «устарело».
+
+Обработчики правок не перерисовывают сетку, отчеты и вкладки сами, а
+отмечают устаревшие представления: mark('grid', 'reports', 'backup').
+Планировщик один раз за оборот цикла событий (defer — QTimer.singleShot(0, ...)
+в Qt, root.after_idle в Tk) вызывает обновление каждого отмеченного
+представления, причем только если его вкладка сейчас открыта; остальные
+остаются отмеченными до переключения на их вкладку (tab_changed). Серия
+правок в одном действии дает по одному обновлению каждого представления.
+
+Не зависит от GUI: вкладка — любой объект, который возвращает current_tab().
+"""
+
+
+class RefreshScheduler:
+    def __init__(self, defer, current_tab=None):
+        self.defer = defer
+        self.current_tab = current_tab
+        self._views = {}
+        self._dirty = set()
+        self._scheduled = False
+
+    def register(self, name, callback, tabs=None):
+        """Представление name: callback обновляет его, tabs — вкладки, на которых оно видно (None — всегда)"""
+        self._views[name] = (callback, None if tabs is None else tuple(tabs))
+
+    def mark(self, *names):
+        """Отмечает представления устаревшими; обновление — в следующем обороте цикла событий"""
+        self._dirty.update(names)
+        self._schedule()
+
+    def tab_changed(self, *args):
+        """Переключение вкладки: обновить то, что на ней устарело (аргументы сигнала игнорируются)"""
+        if self._dirty:
+            self._schedule()
+
+    def is_dirty(self, name):
+        return name in self._dirty
+
+    def _schedule(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self.defer(self.flush)
+
+    def _visible(self, tabs):
+        return tabs is None or self.current_tab is None or self.current_tab() in tabs
+
+    def flush(self):
+        """Обновляет отмеченные видимые представления в порядке регистрации"""
+        self._scheduled = False
+        for name, (callback, tabs) in list(self._views.items()):
+            if name in self._dirty and self._visible(tabs):
+                # Флаг снимается до вызова: обновление может снова отметить представление
+                self._dirty.discard(name)
+                callback()
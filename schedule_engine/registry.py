@@ -0,0 +1,71 @@
+"""Списки сущностей с индексами по id и по имени.
+
+EntityRegistry — обычный list словарей (JSON, копирование и срезы работают
+как раньше), у которого есть by_id и by_name за O(1) вместо
+next(x for x in items if ...). Индексы строятся при первом поиске после
+изменения состава списка; методы list, меняющие состав, их сбрасывают.
+Правку полей сущности на месте (переименование, смену id) нужно отметить
+touch(). Найденная сущность дополнительно сверяется с ключом, поэтому
+забытый touch() не вернет чужую сущность, а лишь перестроит индекс.
+"""
+
+
+def _resets_index(method):
+    def wrapper(self, *args, **kwargs):
+        self.touch()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class EntityRegistry(list):
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._by_id = None
+        self._by_name = None
+
+    def touch(self):
+        """Сбрасывает индексы: поля сущностей изменены на месте"""
+        self._by_id = self._by_name = None
+
+    def _build(self):
+        by_id, by_name = {}, {}
+        # При повторах — первая сущность, как у next(...)
+        for entity in self:
+            by_id.setdefault(entity.get('id'), entity)
+            by_name.setdefault(entity.get('name'), entity)
+        self._by_id, self._by_name = by_id, by_name
+
+    def _lookup(self, key, value):
+        if self._by_id is None:
+            self._build()
+        index = self._by_id if key == 'id' else self._by_name
+        entity = index.get(value)
+        if entity is not None and entity.get(key) != value:
+            self._build()
+            entity = (self._by_id if key == 'id' else self._by_name).get(value)
+        return entity
+
+    def by_id(self, entity_id, default=None):
+        entity = self._lookup('id', entity_id)
+        return default if entity is None else entity
+
+    def by_name(self, name, default=None):
+        entity = self._lookup('name', name)
+        return default if entity is None else entity
+
+    def __reduce__(self):
+        # copy/deepcopy/pickle — без индексов, они построятся заново
+        return type(self), (list(self),)
+
+    append = _resets_index(list.append)
+    extend = _resets_index(list.extend)
+    insert = _resets_index(list.insert)
+    remove = _resets_index(list.remove)
+    pop = _resets_index(list.pop)
+    clear = _resets_index(list.clear)
+    sort = _resets_index(list.sort)
+    reverse = _resets_index(list.reverse)
+    __setitem__ = _resets_index(list.__setitem__)
+    __delitem__ = _resets_index(list.__delitem__)
+    __iadd__ = _resets_index(list.__iadd__)
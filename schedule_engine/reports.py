@@ -0,0 +1,53 @@
+"""Данные вкладки «Отчеты»: нагрузка преподавателей и групп, счетчики статусов.
+
+report_cube считает все за один проход по подтвержденным занятиям:
+число часов — одна группировка, списки групп, предметов и преподавателей —
+drop_duplicates пар (ключ, значение) в порядке появления. ReportCache
+хранит результат, пока не заменено расписание и не изменилась его версия
+(schedule_version), поэтому повторное открытие вкладки ничего не считает.
+"""
+from .constants import STATUS_CONFIRMED
+from .storage import schedule_version
+
+
+def _load_rows(confirmed, key, lists):
+    """[(ключ, часов, 'знач1, знач2', ...)] по ключу key; для каждого столбца lists — уникальные значения"""
+    hours = confirmed.groupby(key, observed=True).size()
+    joined = []
+    for column in lists:
+        pairs = confirmed[[key, column]].drop_duplicates()
+        joined.append(pairs.groupby(key, observed=True, sort=False)[column]
+                      .agg(lambda values: ', '.join(map(str, values))).to_dict())
+    return [(str(name), int(count), *(values.get(name, '') for values in joined))
+            for name, count in hours.items() if count > 0]
+
+
+def report_cube(schedule):
+    """{'teachers': [(преподаватель, часов, группы, предметы)],
+        'groups': [(группа, часов, предметы, преподаватели)],
+        'statuses': {статус: занятий}}"""
+    if schedule is None or schedule.empty or 'status' not in schedule.columns:
+        return {'teachers': [], 'groups': [], 'statuses': {}}
+    statuses = {str(status): int(count) for status, count in schedule['status'].value_counts().items()}
+    confirmed = schedule.loc[schedule['status'] == STATUS_CONFIRMED, ['teacher_name', 'group_name', 'subject_name']]
+    return {
+        'teachers': _load_rows(confirmed, 'teacher_name', ('group_name', 'subject_name')),
+        'groups': _load_rows(confirmed, 'group_name', ('subject_name', 'teacher_name')),
+        'statuses': statuses,
+    }
+
+
+class ReportCache:
+    """report_cube последнего расписания; пересчет — только после замены расписания или записи в него"""
+
+    def __init__(self):
+        self.schedule = None
+        self.version = None
+        self.cube = None
+
+    def get(self, schedule):
+        version = schedule_version(schedule)
+        if self.cube is None or schedule is not self.schedule or version != self.version:
+            self.cube = report_cube(schedule)
+            self.schedule, self.version = schedule, version
+        return self.cube
@@ -0,0 +1,86 @@
+"""Независимые перезапуски генерации с выбором лучшего результата.
+
+Каждый запуск получает свое зерно и выполняется в отдельном процессе;
+результаты сравниваются по score_schedule, победитель воспроизводится
+вызовом generate_schedule(data, seed=<зерно>, mode=<режим>).
+"""
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .conflicts import score_schedule
+from .generator import check_cancel, generate_schedule
+
+CANCEL_POLL_INTERVAL = 0.2
+
+_worker_data = None
+
+
+class RestartResult:
+    def __init__(self, schedule, seed, score, scores):
+        self.schedule = schedule
+        self.seed = seed
+        self.score = score
+        self.scores = scores  # {зерно: оценка} по всем запускам
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _run_seed(seed, mode):
+    schedule = generate_schedule(_worker_data, seed=seed, mode=mode)
+    return seed, score_schedule(schedule), schedule
+
+
+def make_seeds(restarts, base_seed=None):
+    if base_seed is None:
+        base_seed = random.SystemRandom().randrange(2 ** 31)
+    return [base_seed + i for i in range(restarts)]
+
+
+def best_of_n(data, restarts, mode='random', workers=None, base_seed=None, progress=None, cancel=None):
+    """Запускает restarts генераций (по процессу на ядро) и возвращает лучшую.
+
+    progress(done, total) — после каждого завершенного запуска; если cancel()
+    вернул True, оставшиеся запуски отменяются и выбрасывается
+    GenerationCancelled. Ошибка любого запуска тоже отменяет оставшиеся.
+    """
+    seeds = make_seeds(max(1, restarts), base_seed)
+    workers = min(workers or os.cpu_count() or 1, len(seeds))
+    best = None
+    scores = {}
+
+    def consider(seed, score, schedule):
+        nonlocal best
+        scores[seed] = score
+        if best is None or (score, seed) < (best[1], best[0]):
+            best = (seed, score, schedule)
+
+    if workers <= 1:
+        _init_worker(data)
+        for done, seed in enumerate(seeds, 1):
+            check_cancel(cancel)
+            consider(*_run_seed(seed, mode))
+            if progress is not None:
+                progress(done, len(seeds))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,))
+        try:
+            pending = {pool.submit(_run_seed, seed, mode) for seed in seeds}
+            while pending:
+                # Короткий таймаут, чтобы отмена срабатывала и во время долгих запусков
+                finished, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    consider(*future.result())
+                if finished and progress is not None:
+                    progress(len(seeds) - len(pending), len(seeds))
+                check_cancel(cancel)
+        except BaseException:
+            # Отмена, ошибка в запуске или прерывание: оставшиеся в очереди запуски не нужны
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+    seed, score, schedule = best
+    return RestartResult(schedule, seed, score, scores)
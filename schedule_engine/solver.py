@@ -0,0 +1,513 @@
+"""Режим решателя: распространение ограничений вместо случайной раскладки.
+
+Переменные — часы предметов группы на неделю (группа, предмет, неделя),
+домен — множество слотов (день, пара), где одновременно свободны группа,
+хотя бы один преподаватель предмета (с учетом forbidden_days,
+max_lessons_per_day и max_hours) и хотя бы одна подходящая аудитория.
+Домены хранятся битовыми масками (бит = день * число_пар + пара), после
+каждого назначения пересчитываются только затронутые переменные (forward
+checking). Порядок — MRV (минимальный запас слотов), при равенстве —
+degree (меньше преподавателей, больше часов). При тупике выполняется
+возврат к последнему связанному решению (backjumping) с запретом
+неудачного слота; бюджет возвратов ограничен, после его исчерпания
+оставшиеся часы переменной помечаются как неразмещенные.
+
+Недели независимы, поэтому каждая решается отдельно, а решение недели без
+закрепленных занятий переиспользуется для недель с тем же набором рабочих
+дней.
+"""
+import logging
+import random
+
+from .constants import STATUS_CONFIRMED, STATUS_FREE
+from .generator import PROGRESS_STEP, check_cancel, create_schedule_structure
+from .model import get_days, get_times, get_weeks, group_subjects, teacher_subjects, working_days
+from .storage import set_lesson
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKTRACK_LIMIT = 2000
+BACKTRACKS_PER_UNIT = 25
+
+
+class _Unit:
+    __slots__ = ('group', 'subject', 'need', 'teachers', 'level', 'size', 'tabu', 'placed_teacher')
+
+    def __init__(self, group, subject, need, teachers, level, size):
+        self.group = group
+        self.subject = subject
+        self.need = need
+        self.teachers = teachers
+        self.level = level
+        self.size = size
+        self.tabu = []  # [(глубина стека, бит)]
+        self.placed_teacher = None
+
+
+class _WeekState:
+    """Занятость ресурсов одной недели в виде битовых масок"""
+
+    def __init__(self, solver, day_mask):
+        n_slots = solver.n_slots
+        self.solver = solver
+        self.day_mask = day_mask
+        self.group_free = {g: day_mask for g in solver.group_ids}
+        self.teacher_free = {t: day_mask for t in solver.teacher_ids}
+        self.teacher_day = {t: [0] * solver.n_days for t in solver.teacher_ids}
+        self.teacher_week = {t: 0 for t in solver.teacher_ids}
+        self.avail = {t: day_mask & solver.teacher_allowed[t] for t in solver.teacher_ids}
+        self.room_free = {c: day_mask for c in solver.classroom_ids}
+        self.level_count = {}
+        for level, rooms in solver.level_rooms.items():
+            self.level_count[level] = [len(rooms) if day_mask >> b & 1 else 0 for b in range(n_slots)]
+
+    # --- маски ---
+    def teacher_avail(self, t):
+        return self.avail[t]
+
+    def update_teacher(self, t):
+        """Пересчет доступности преподавателя после изменения его занятости"""
+        solver = self.solver
+        if self.teacher_week[t] >= solver.teacher_max_week[t]:
+            self.avail[t] = 0
+            return
+        mask = self.teacher_free[t] & solver.teacher_allowed[t]
+        cap = solver.teacher_max_day[t]
+        for d, count in enumerate(self.teacher_day[t]):
+            if count >= cap:
+                mask &= ~solver.day_bits[d]
+        self.avail[t] = mask
+
+    def subject_union(self, subject_name):
+        avail = self.avail
+        mask = 0
+        for t in self.solver.subject_teachers.get(subject_name, ()):
+            mask |= avail[t]
+        return mask
+
+    def room_union(self, level):
+        if level is None:
+            return self.day_mask
+        counts = self.level_count[level]
+        mask = 0
+        for b, count in enumerate(counts):
+            if count:
+                mask |= 1 << b
+        return mask
+
+    # --- изменение ---
+    def take(self, group, teacher, room, bit, sign):
+        solver = self.solver
+        flag = 1 << bit
+        d = bit // solver.n_times
+        if sign > 0:
+            self.group_free[group] &= ~flag
+            self.teacher_free[teacher] &= ~flag
+        else:
+            self.group_free[group] |= flag
+            self.teacher_free[teacher] |= flag
+        self.teacher_day[teacher][d] += sign
+        self.teacher_week[teacher] += sign
+        self.update_teacher(teacher)
+        if room is not None:
+            if sign > 0:
+                self.room_free[room] &= ~flag
+            else:
+                self.room_free[room] |= flag
+            capacity = solver.capacity[room]
+            for level in solver.levels:
+                if level <= capacity:
+                    self.level_count[level][bit] -= sign
+
+
+class ScheduleSolver:
+    def __init__(self, data, rng=None, backtrack_limit=DEFAULT_BACKTRACK_LIMIT, progress=None, cancel=None):
+        self.data = data
+        self.rng = rng or random.Random()
+        self.backtrack_limit = backtrack_limit
+        self.progress = progress
+        self.cancel = cancel
+        self._progress_base = 0
+        self._progress_total = 1
+        settings = data.get('settings', {})
+        self.days = get_days(settings)
+        self.times = get_times(settings)
+        self.weeks = get_weeks(settings)
+        self.n_days = len(self.days)
+        self.n_times = len(self.times)
+        self.n_slots = self.n_days * self.n_times
+        self.day_bits = [((1 << self.n_times) - 1) << (d * self.n_times) for d in range(self.n_days)]
+
+        groups = data.get('groups', [])
+        teachers = data.get('teachers', [])
+        classrooms = data.get('classrooms', [])
+        self.groups = {g['id']: g for g in groups}
+        self.group_ids = list(self.groups)
+        self.teacher_ids = [t['id'] for t in teachers]
+        self.teacher_names = {t['id']: t['name'] for t in teachers}
+        self.classroom_ids = [c['id'] for c in classrooms]
+        self.classroom_names = {c['id']: c['name'] for c in classrooms}
+        self.capacity = {c['id']: c.get('capacity', 0) or 0 for c in classrooms}
+
+        self.teacher_allowed = {}
+        self.teacher_max_day = {}
+        self.teacher_max_week = {}
+        self.teacher_preferred = {}
+        self.subject_teachers = {}
+        for teacher in teachers:
+            t = teacher['id']
+            forbidden_days = teacher.get('forbidden_days', '') or ''
+            preferred_days = teacher.get('preferred_days', '') or ''
+            allowed = 0
+            preferred = 0
+            for d, day in enumerate(self.days):
+                if day not in forbidden_days:
+                    allowed |= self.day_bits[d]
+                if day in preferred_days:
+                    preferred |= self.day_bits[d]
+            self.teacher_allowed[t] = allowed
+            self.teacher_preferred[t] = preferred
+            self.teacher_max_day[t] = teacher.get('max_lessons_per_day', 10) or 10
+            self.teacher_max_week[t] = teacher.get('max_hours') or self.n_slots
+            for subject_name in teacher_subjects(teacher):
+                self.subject_teachers.setdefault(subject_name, []).append(t)
+
+        # Уровни вместимости: для каждого размера группы — подходящие аудитории
+        self.level_rooms = {}
+        for group in groups:
+            size = group.get('students', 0) or 0
+            rooms = [c for c in self.classroom_ids if self.capacity[c] >= size]
+            if rooms:
+                self.level_rooms[size] = sorted(rooms, key=lambda c: self.capacity[c])
+        self.levels = sorted(self.level_rooms)
+        self.unplaced = []
+        self.backtracks = 0
+
+    def _report(self, done):
+        if self.progress is not None:
+            self.progress(min(done, self._progress_total), self._progress_total)
+
+    # --- подготовка ---
+    def _week_units(self, week, fixed_hours, groups=None, demand=None):
+        units = []
+        subjects = self.data.get('subjects', [])
+        for group in self.groups.values():
+            if groups is not None and group['id'] not in groups:
+                continue
+            size = group.get('students', 0) or 0
+            level = size if size in self.level_rooms else None
+            for subject in group_subjects(group, subjects):
+                if demand is not None:
+                    need = demand.get((group['id'], subject['id'], week), 0)
+                else:
+                    need = int(subject.get('hours_per_week', 0) or 0)
+                    need -= fixed_hours.get((group['id'], subject['id'], week), 0)
+                if need <= 0:
+                    continue
+                teachers = self.subject_teachers.get(subject['name'], [])
+                units.append(_Unit(group['id'], subject, need, teachers, level, size))
+        return units
+
+    def _bits(self, week_days):
+        mask = 0
+        for day in week_days:
+            d = self.days.index(day)
+            mask |= self.day_bits[d]
+        return mask
+
+    # --- решение одной недели ---
+    def solve_week(self, state, units):
+        """Возвращает список назначений (group, subject, bit, teacher, room)"""
+        pending = [u for u in units if u.need > 0]
+        for unit in pending:
+            if not unit.teachers:
+                self.unplaced.append((unit.group, unit.subject['id'], unit.need, 'нет преподавателя'))
+                unit.need = 0
+        pending = [u for u in pending if u.need > 0]
+        by_group = {}
+        by_teacher = {}
+        for unit in pending:
+            by_group.setdefault(unit.group, []).append(unit)
+            for t in unit.teachers:
+                by_teacher.setdefault(t, []).append(unit)
+
+        subject_cache = {}
+        room_cache = {}
+        domain = {}
+
+        def subject_mask(name):
+            if name not in subject_cache:
+                subject_cache[name] = state.subject_union(name)
+            return subject_cache[name]
+
+        def room_mask(level):
+            if level not in room_cache:
+                room_cache[level] = state.room_union(level)
+            return room_cache[level]
+
+        def unit_domain(unit):
+            mask = state.group_free[unit.group] & subject_mask(unit.subject['name']) & room_mask(unit.level)
+            for _, bit in unit.tabu:
+                mask &= ~(1 << bit)
+            return mask
+
+        for unit in pending:
+            domain[unit] = unit_domain(unit)
+            # Часы сверх исходного домена не разместит никакой перебор
+            excess = unit.need - bin(domain[unit]).count('1')
+            if excess > 0:
+                self.unplaced.append((unit.group, unit.subject['id'], excess, 'нет свободного слота'))
+                unit.need -= excess
+        pending = [u for u in pending if u.need > 0]
+
+        def refresh(group, teacher, room):
+            for name in {u.subject['name'] for u in by_teacher.get(teacher, ())}:
+                subject_cache.pop(name, None)
+            affected = set(by_group.get(group, ())) | set(by_teacher.get(teacher, ()))
+            if room is not None:
+                capacity = self.capacity[room]
+                for level in self.levels:
+                    if level <= capacity and level in room_cache:
+                        old = room_cache.pop(level)
+                        if room_mask(level) != old:
+                            affected.update(u for u in pending if u.level == level)
+            for unit in affected:
+                if unit.need > 0:
+                    domain[unit] = unit_domain(unit)
+
+        stack = []  # [(unit, bit, teacher, room)]
+        result = []  # решения, не подлежащие пересмотру
+        # Бюджет возвратов на неделю: не больше лимита и пропорционален числу переменных
+        budget = min(self.backtrack_limit, BACKTRACKS_PER_UNIT * len(pending))
+        week_hours = max(1, sum(u.need for u in pending))
+        n_groups = max(1, len(self.groups))
+        steps = 0
+
+        def place(unit, bit, teacher, room):
+            state.take(unit.group, teacher, room, bit, 1)
+            unit.need -= 1
+            stack.append((unit, bit, teacher, room))
+            refresh(unit.group, teacher, room)
+
+        def undo():
+            unit, bit, teacher, room = stack.pop()
+            state.take(unit.group, teacher, room, bit, -1)
+            unit.need += 1
+            if unit.need == 1:
+                pending.append(unit)
+            refresh(unit.group, teacher, room)
+            return unit, bit
+
+        while True:
+            pending[:] = [u for u in pending if u.need > 0]
+            if not pending:
+                break
+            steps += 1
+            if steps % PROGRESS_STEP == 0:
+                check_cancel(self.cancel)
+                self._report(self._progress_base + (len(result) + len(stack)) * n_groups // week_hours)
+            unit = min(pending, key=lambda u: (bin(domain[u]).count('1') - u.need, len(u.teachers), -u.need))
+            dom = domain[unit]
+            if bin(dom).count('1') >= unit.need:
+                bit, teacher, room = self._choose(state, unit, dom)
+                place(unit, bit, teacher, room)
+                continue
+            # Тупик: возврат к последнему связанному решению
+            target = self._related_decision(stack, unit) if budget > 0 else None
+            if target is None:
+                self._give_up(state, unit, dom, place)
+                # Размещенное до отказа больше не пересматривается
+                result.extend(stack)
+                stack.clear()
+                for u in domain:
+                    if u.tabu:
+                        u.tabu = []
+                        domain[u] = unit_domain(u)
+                continue
+            budget -= 1
+            self.backtracks += 1
+            while len(stack) > target + 1:
+                undo()
+            failed_unit, failed_bit = undo()
+            depth = len(stack)
+            for u in domain:
+                if u.tabu and u.tabu[-1][0] > depth:
+                    u.tabu = [(dpt, b) for dpt, b in u.tabu if dpt <= depth]
+                    domain[u] = unit_domain(u)
+            failed_unit.tabu.append((depth, failed_bit))
+            domain[failed_unit] = unit_domain(failed_unit)
+
+        result.extend(stack)
+        return [(unit.group, unit.subject, bit, teacher, room) for unit, bit, teacher, room in result]
+
+    def _related_decision(self, stack, unit):
+        teachers = set(unit.teachers)
+        for i in range(len(stack) - 1, -1, -1):
+            other, _, teacher, room = stack[i]
+            if other.group == unit.group or teacher in teachers:
+                return i
+            if unit.level is not None and room is not None and self.capacity[room] >= unit.size:
+                return i
+        return None
+
+    def _give_up(self, state, unit, dom, place):
+        """Размещает то, что помещается, остаток часов — в список неразмещенных"""
+        while dom and unit.need > 0:
+            bit, teacher, room = self._choose(state, unit, dom)
+            place(unit, bit, teacher, room)
+            dom = (state.group_free[unit.group] & state.subject_union(unit.subject['name'])
+                   & state.room_union(unit.level))
+        if unit.need > 0:
+            self.unplaced.append((unit.group, unit.subject['id'], unit.need, 'нет свободного слота'))
+            unit.need = 0
+
+    def _choose(self, state, unit, dom):
+        """Выбор слота (наименее ограничивающий), преподавателя и аудитории"""
+        n_times = self.n_times
+        group_taken = ~state.group_free[unit.group] & state.day_mask
+        best = None
+        for bit in range(self.n_slots):
+            if not dom >> bit & 1:
+                continue
+            d, t = divmod(bit, n_times)
+            day_bits = self.day_bits[d]
+            lessons_today = bin(group_taken & day_bits).count('1')
+            candidates = [tid for tid in unit.teachers if state.avail[tid] >> bit & 1]
+            if not candidates:
+                continue
+            preferred = any(self.teacher_preferred[tid] >> bit & 1 for tid in candidates)
+            # Меньше пар у группы в этот день, предпочтительные дни, без окон — раньше
+            key = (lessons_today, not preferred, t, self.rng.random())
+            if best is None or key < best[0]:
+                best = (key, bit, candidates)
+        _, bit, candidates = best
+        if unit.placed_teacher in candidates:
+            teacher = unit.placed_teacher
+        else:
+            teacher = max(candidates, key=lambda tid: (bool(self.teacher_preferred[tid] >> bit & 1),
+                                                       -state.teacher_week[tid]))
+            unit.placed_teacher = teacher
+        room = None
+        if unit.level is not None:
+            room = next((c for c in self.level_rooms[unit.level] if state.room_free[c] >> bit & 1), None)
+        return bit, teacher, room
+
+    # --- полный прогон ---
+    def solve(self, schedule=None, weeks=None, groups=None, demand=None):
+        """Заполняет свободные слоты расписания; подтвержденные занятия считаются закрепленными.
+
+        weeks и groups ограничивают область решения (остальное не меняется),
+        demand — {(group_id, subject_id, week): часы} вместо недобора до
+        hours_per_week.
+        """
+        if schedule is None:
+            schedule = create_schedule_structure(self.data)
+        if schedule.empty:
+            return schedule
+        settings = self.data.get('settings', {})
+        week_days = {}
+        for week, day in working_days(settings, self.data.get('holidays')):
+            week_days.setdefault(week, []).append(day)
+
+        confirmed = schedule[schedule['status'] == STATUS_CONFIRMED]
+        fixed_hours = {}
+        fixed_weeks = set()
+        for group_id, subject_id, week in zip(confirmed['group_id'], confirmed['subject_id'], confirmed['week']):
+            key = (group_id, subject_id, week)
+            fixed_hours[key] = fixed_hours.get(key, 0) + 1
+            fixed_weeks.add(week)
+        time_pos = {t: i for i, t in enumerate(self.times)}
+        day_pos = {d: i for i, d in enumerate(self.days)}
+
+        if demand is not None:
+            groups = {key[0] for key in demand} if groups is None else groups & {key[0] for key in demand}
+            weeks = {key[2] for key in demand} if weeks is None else set(weeks) & {key[2] for key in demand}
+        free_rows = {}
+        group_masks = {}
+        free = schedule[schedule['status'] == STATUS_FREE]
+        if groups is not None:
+            free = free[free['group_id'].isin(groups)]
+        for idx, week, day, time, group_id in zip(free.index, free['week'], free['day'], free['time'], free['group_id']):
+            if day in day_pos and time in time_pos:
+                bit = day_pos[day] * self.n_times + time_pos[time]
+                free_rows[(group_id, week, bit)] = idx
+                masks = group_masks.setdefault(week, {})
+                masks[group_id] = masks.get(group_id, 0) | 1 << bit
+
+        templates = {}
+        rows, subject_ids, subject_names, teacher_ids, teacher_names, room_ids, room_names = [], [], [], [], [], [], []
+        solve_weeks = [w for w in self.weeks if week_days.get(w) and (weeks is None or w in weeks)]
+        # Ход работы — в «группах»: каждая неделя добавляет по единице на группу
+        self._progress_total = max(1, len(solve_weeks) * len(self.groups))
+        for week_index, week in enumerate(solve_weeks):
+            check_cancel(self.cancel)
+            self._progress_base = week_index * len(self.groups)
+            days = week_days[week]
+            key = tuple(days)
+            if week not in fixed_weeks and demand is None and key in templates:
+                assignments, unplaced = templates[key]
+                self.unplaced.extend(unplaced)
+            else:
+                state = _WeekState(self, self._bits(days))
+                # Группа свободна только там, где у нее есть свободная строка расписания
+                masks = group_masks.get(week, {})
+                for group_id in state.group_free:
+                    state.group_free[group_id] = masks.get(group_id, 0)
+                for row in confirmed[confirmed['week'] == week].itertuples():
+                    if row.day in day_pos and row.time in time_pos:
+                        bit = day_pos[row.day] * self.n_times + time_pos[row.time]
+                        teacher = row.teacher_id if row.teacher_id in state.teacher_free else None
+                        room = row.classroom_id if row.classroom_id in state.room_free else None
+                        self._fix(state, row.group_id, teacher, room, bit)
+                unplaced_before = len(self.unplaced)
+                assignments = self.solve_week(state, self._week_units(week, fixed_hours, groups, demand))
+                if week not in fixed_weeks:
+                    templates[key] = assignments, self.unplaced[unplaced_before:]
+            for group_id, subject, bit, teacher, room in assignments:
+                idx = free_rows.get((group_id, week, bit))
+                if idx is None:
+                    continue
+                rows.append(idx)
+                subject_ids.append(subject['id'])
+                subject_names.append(subject['name'])
+                teacher_ids.append(teacher)
+                teacher_names.append(self.teacher_names[teacher])
+                room_ids.append(room)
+                room_names.append(self.classroom_names.get(room, ''))
+            self._report((week_index + 1) * len(self.groups))
+        if rows:
+            set_lesson(schedule, rows,
+                       subject_id=subject_ids, subject_name=subject_names,
+                       teacher_id=teacher_ids, teacher_name=teacher_names,
+                       classroom_id=room_ids, classroom_name=room_names,
+                       status=STATUS_CONFIRMED)
+        for group_id, subject_id, hours, reason in self.unplaced:
+            logger.warning("Группа %s, предмет %s: не размещено %s ч (%s)",
+                           self.groups[group_id]['name'], subject_id, hours, reason)
+        return schedule
+
+    def _fix(self, state, group, teacher, room, bit):
+        flag = 1 << bit
+        state.group_free[group] = state.group_free.get(group, 0) & ~flag
+        if teacher is not None:
+            state.teacher_free[teacher] &= ~flag
+            state.teacher_day[teacher][bit // self.n_times] += 1
+            state.teacher_week[teacher] += 1
+            state.update_teacher(teacher)
+        if room is not None:
+            state.room_free[room] &= ~flag
+            capacity = self.capacity[room]
+            for level in self.levels:
+                if level <= capacity:
+                    state.level_count[level][bit] -= 1
+
+
+def solve_schedule(data, seed=None, rng=None, schedule=None, backtrack_limit=DEFAULT_BACKTRACK_LIMIT,
+                   progress=None, cancel=None):
+    """Генерация в режиме решателя. Неразмещенные часы — в schedule.attrs['unplaced']"""
+    if rng is None:
+        rng = random.Random(seed)
+    solver = ScheduleSolver(data, rng=rng, backtrack_limit=backtrack_limit, progress=progress, cancel=cancel)
+    schedule = solver.solve(schedule)
+    schedule.attrs['unplaced'] = sum(hours for _, _, hours, _ in solver.unplaced)
+    return schedule
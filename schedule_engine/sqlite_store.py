@@ -0,0 +1,257 @@
+"""Хранение данных и расписания в SQLite вместо одного JSON-файла.
+
+Сущности лежат в своих таблицах (основные поля — отдельными столбцами для
+запросов, полная запись — в attrs), расписание — в таблице lessons с
+индексами по слоту группы, дню преподавателя и слоту аудитории. Правка
+одного занятия — это UPDATE нескольких строк, а не перезапись всего файла.
+Разделы состояния (настройки, каждая таблица сущностей, праздники, замены)
+save_state перезаписывает, только если они изменились с последней записи
+или загрузки, поэтому синхронизация после правки занятий в них не пишет.
+
+Названия в lessons не хранятся: при загрузке они подставляются из таблиц
+сущностей, а день и время хранятся номерами (day — индекс в DAYS, slot —
+номер урока по расписанию звонков).
+"""
+import json
+import sqlite3
+
+import pandas as pd
+
+from .constants import DAYS, LESSON_COLUMNS, STATUS_FREE
+from .model import STATE_KEYS, get_times
+from .storage import compact_schedule, python_value
+
+SCHEMA_VERSION = 1
+
+# Разделы состояния, которые save_state пишет по отдельности
+STATE_SECTIONS = ['settings', 'groups', 'teachers', 'classrooms', 'subjects', 'holidays', 'substitutions']
+
+# Поля сущностей, вынесенные в столбцы для запросов; запись целиком — в attrs
+ENTITY_COLUMNS = {
+    'groups': ['type', 'students', 'course', 'specialty'],
+    'teachers': ['max_hours', 'max_lessons_per_day', 'forbidden_days', 'preferred_days'],
+    'classrooms': ['capacity'],
+    'subjects': ['group_type', 'hours_per_week'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+    type TEXT, students INTEGER, course TEXT, specialty TEXT, attrs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teachers (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+    max_hours INTEGER, max_lessons_per_day INTEGER, forbidden_days TEXT, preferred_days TEXT, attrs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS teacher_subjects (
+    teacher_id INTEGER NOT NULL REFERENCES teachers(id) ON DELETE CASCADE,
+    subject_name TEXT NOT NULL, hours INTEGER,
+    PRIMARY KEY (teacher_id, subject_name)
+);
+CREATE TABLE IF NOT EXISTS classrooms (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, capacity INTEGER, attrs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, group_type TEXT, hours_per_week INTEGER, attrs TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS holidays (date TEXT, name TEXT, type TEXT, attrs TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS substitutions (id INTEGER PRIMARY KEY AUTOINCREMENT, attrs TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS lessons (
+    id INTEGER PRIMARY KEY,
+    week INTEGER NOT NULL, day INTEGER NOT NULL, slot INTEGER NOT NULL, time TEXT NOT NULL,
+    group_id INTEGER, subject_id INTEGER, teacher_id INTEGER, classroom_id INTEGER,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lessons_group_slot ON lessons (week, day, slot, group_id);
+CREATE INDEX IF NOT EXISTS lessons_teacher_day ON lessons (teacher_id, week, day);
+CREATE INDEX IF NOT EXISTS lessons_classroom_slot ON lessons (classroom_id, week, day, slot);
+"""
+
+LESSON_QUERY = """
+SELECT l.id, l.week, l.day, l.time, l.group_id, g.name, l.subject_id, s.name,
+       l.teacher_id, t.name, l.classroom_id, c.name, l.status
+FROM lessons l
+LEFT JOIN groups g ON g.id = l.group_id
+LEFT JOIN subjects s ON s.id = l.subject_id
+LEFT JOIN teachers t ON t.id = l.teacher_id
+LEFT JOIN classrooms c ON c.id = l.classroom_id
+"""
+
+
+class SQLiteStore:
+    """Данные приложения в файле SQLite.
+
+    save_state пишет изменившиеся разделы состояния и расписание целиком
+    (после генерации или загрузки), update_lessons — только измененные
+    строки расписания.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        # {раздел: JSON последнего записанного или загруженного значения}
+        self._written = {}
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Координаты слота ---
+    def _times(self):
+        return get_times(self.load_settings())
+
+    @staticmethod
+    def _lesson_row(record, slot_of):
+        day = record['day']
+        time = record['time']
+        return (
+            int(record['id']), int(record['week']),
+            DAYS.index(day) if day in DAYS else -1,
+            slot_of.get(time, -1), time,
+            python_value(record['group_id']), python_value(record['subject_id']),
+            python_value(record['teacher_id']), python_value(record['classroom_id']),
+            record['status'] if not pd.isna(record['status']) else STATUS_FREE,
+        )
+
+    # --- Запись ---
+    def save_state(self, data, schedule=None):
+        """Перезаписывает изменившиеся настройки и сущности; расписание — если передано"""
+        written = {}
+        with self.conn:
+            for section in STATE_SECTIONS:
+                text = _section_text(data, section)
+                if self._written.get(section) != text:
+                    self._save_section(section, data.get(section) or ({} if section == 'settings' else []))
+                    written[section] = text
+            if schedule is not None:
+                self.conn.execute('DELETE FROM lessons')
+                self._insert_lessons(schedule, get_times(data.get('settings', {})))
+        # Только после успешной транзакции: при откате раздел запишется в следующий раз
+        self._written.update(written)
+
+    def _save_section(self, section, items):
+        conn = self.conn
+        if section == 'settings':
+            conn.execute('DELETE FROM settings')
+            conn.executemany('INSERT INTO settings VALUES (?, ?)',
+                             [(key, json.dumps(value, ensure_ascii=False)) for key, value in items.items()])
+        elif section in ENTITY_COLUMNS:
+            columns = ENTITY_COLUMNS[section]
+            if section == 'teachers':
+                conn.execute('DELETE FROM teacher_subjects')
+            conn.execute(f'DELETE FROM {section}')
+            placeholders = ', '.join('?' * (len(columns) + 3))
+            conn.executemany(
+                f"INSERT INTO {section} (id, name, {', '.join(columns)}, attrs) VALUES ({placeholders})",
+                [(item['id'], item.get('name', ''), *[_column_value(item.get(col)) for col in columns],
+                  json.dumps(item, ensure_ascii=False)) for item in items])
+            if section == 'teachers':
+                conn.executemany(
+                    'INSERT INTO teacher_subjects VALUES (?, ?, ?)',
+                    [(teacher['id'], subject, _column_value(hours))
+                     for teacher in items
+                     for subject, hours in (teacher.get('subject_hours') or {}).items()])
+        elif section == 'holidays':
+            conn.execute('DELETE FROM holidays')
+            conn.executemany('INSERT INTO holidays VALUES (?, ?, ?, ?)',
+                             [(h.get('date'), h.get('name'), h.get('type'), json.dumps(h, ensure_ascii=False))
+                              for h in items])
+        elif section == 'substitutions':
+            conn.execute('DELETE FROM substitutions')
+            conn.executemany('INSERT INTO substitutions (attrs) VALUES (?)',
+                             [(json.dumps(s, ensure_ascii=False, default=python_value),) for s in items])
+
+    def _insert_lessons(self, schedule, times):
+        if schedule is None or schedule.empty:
+            return
+        slot_of = {time: i for i, time in enumerate(times)}
+        records = schedule[LESSON_COLUMNS].to_dict(orient='records')
+        self.conn.executemany('INSERT OR REPLACE INTO lessons VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              [self._lesson_row(record, slot_of) for record in records])
+
+    def update_lessons(self, schedule, rows):
+        """Сохраняет строки rows (метки индекса schedule) — точечные UPDATE по id занятия"""
+        subset = schedule.loc[rows]
+        if isinstance(subset, pd.Series):
+            subset = subset.to_frame().T
+        with self.conn:
+            self._insert_lessons(subset, self._times())
+
+    # --- Чтение ---
+    def load_settings(self):
+        return {key: json.loads(value) for key, value in self.conn.execute('SELECT key, value FROM settings')}
+
+    def load_state(self):
+        """(данные в формате save_data, расписание в компактном виде)"""
+        data = {key: [] for key in STATE_KEYS}
+        data['settings'] = self.load_settings()
+        for table in ENTITY_COLUMNS:
+            data[table] = [json.loads(attrs) for (attrs,) in
+                           self.conn.execute(f'SELECT attrs FROM {table} ORDER BY id')]
+        data['holidays'] = [json.loads(attrs) for (attrs,) in self.conn.execute('SELECT attrs FROM holidays')]
+        data['substitutions'] = [json.loads(attrs) for (attrs,) in
+                                 self.conn.execute('SELECT attrs FROM substitutions ORDER BY id')]
+        self._written = {section: _section_text(data, section) for section in STATE_SECTIONS}
+        return data, self.load_schedule(data['settings'])
+
+    def load_schedule(self, settings=None):
+        rows = self.conn.execute(LESSON_QUERY + ' ORDER BY l.id').fetchall()
+        if not rows:
+            return pd.DataFrame()
+        frame = pd.DataFrame(rows, columns=LESSON_COLUMNS)
+        frame['day'] = [DAYS[d] if 0 <= d < len(DAYS) else '' for d in frame['day']]
+        return compact_schedule(frame, settings if settings is not None else self.load_settings())
+
+    def has_state(self):
+        return self.conn.execute('SELECT 1 FROM settings LIMIT 1').fetchone() is not None
+
+    # --- Запросы по индексам ---
+    def slot_lessons(self, week, day, time):
+        """Занятия всех групп в слот (индекс lessons_group_slot)"""
+        times = self._times()
+        slot = times.index(time) if time in times else -1
+        return self._query('WHERE l.week = ? AND l.day = ? AND l.slot = ?', (week, DAYS.index(day), slot))
+
+    def teacher_lessons(self, teacher_id, week, day=None):
+        """Занятия преподавателя за неделю или день (индекс lessons_teacher_day)"""
+        if day is None:
+            return self._query('WHERE l.teacher_id = ? AND l.week = ?', (teacher_id, week))
+        return self._query('WHERE l.teacher_id = ? AND l.week = ? AND l.day = ?', (teacher_id, week, DAYS.index(day)))
+
+    def classroom_busy(self, classroom_id, week, day, time):
+        """Занята ли аудитория в слот (индекс lessons_classroom_slot)"""
+        times = self._times()
+        row = self.conn.execute(
+            "SELECT 1 FROM lessons WHERE classroom_id = ? AND week = ? AND day = ? AND slot = ? AND status != ? LIMIT 1",
+            (classroom_id, week, DAYS.index(day), times.index(time) if time in times else -1, STATUS_FREE)).fetchone()
+        return row is not None
+
+    def _query(self, where, params):
+        rows = self.conn.execute(f'{LESSON_QUERY} {where} ORDER BY l.id', params).fetchall()
+        frame = pd.DataFrame(rows, columns=LESSON_COLUMNS)
+        frame['day'] = [DAYS[d] if 0 <= d < len(DAYS) else '' for d in frame['day']]
+        return frame
+
+
+def _column_value(value):
+    """Значение для столбца-проекции: числа и строки как есть, остальное — JSON"""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _section_text(data, section):
+    """Отпечаток раздела состояния для сравнения с записанным"""
+    return json.dumps(data.get(section), ensure_ascii=False, sort_keys=True, default=python_value)
@@ -0,0 +1,165 @@
+"""Компактное хранение расписания.
+
+Дни, время, статусы и названия хранятся как pandas Categorical (целые
+коды плюс таблица значений), идентификаторы — как Int32 с пропусками,
+неделя — int16. Фильтр вида schedule['status'] == 'подтверждено'
+сравнивает коды, а не строки, и таблица на год для сотен групп занимает
+в разы меньше памяти. Строки подставляются только при выводе.
+
+В категориальный столбец нельзя записать значение, которого нет среди
+категорий, поэтому все изменения расписания идут через write_column,
+set_lesson и clear_lesson.
+"""
+import pandas as pd
+
+from .constants import DAYS, LESSON_COLUMNS, LESSON_FIELDS, STATUS_CONFIRMED, STATUS_FREE, STATUS_PLANNED
+from .model import get_times
+
+STATUSES = [STATUS_FREE, STATUS_PLANNED, STATUS_CONFIRMED]
+ID_COLUMNS = ['group_id', 'subject_id', 'teacher_id', 'classroom_id']
+NAME_COLUMNS = ['group_name', 'subject_name', 'teacher_name', 'classroom_name']
+
+
+def _ordered(values, known):
+    """Все известные значения в заданном порядке (и отсутствующие в values), затем прочие по алфавиту"""
+    present = set(pd.Series(values).dropna().astype(str))
+    return list(known) + sorted(present - set(known))
+
+
+def is_compact(schedule):
+    return isinstance(schedule.get('status', pd.Series(dtype=object)).dtype, pd.CategoricalDtype)
+
+
+def compact_schedule(schedule, settings=None):
+    """Приводит столбцы расписания к компактным типам (повторный вызов безопасен)"""
+    if schedule is None:
+        return pd.DataFrame(columns=LESSON_COLUMNS)
+    if schedule.empty and not len(schedule.columns):
+        return schedule
+    frame = schedule.copy()
+    for col in LESSON_COLUMNS:
+        if col not in frame.columns:
+            frame[col] = None
+    if frame['id'].isna().all():
+        frame['id'] = range(1, len(frame) + 1)
+    if frame['id'].notna().all():
+        frame['id'] = frame['id'].astype('int32')
+    frame['week'] = pd.to_numeric(frame['week'], errors='coerce').fillna(0).astype('int16')
+    times = get_times(settings or {})
+    frame['day'] = pd.Categorical(frame['day'], categories=_ordered(frame['day'], DAYS), ordered=True)
+    frame['time'] = pd.Categorical(frame['time'], categories=_ordered(frame['time'], times), ordered=True)
+    frame['status'] = pd.Categorical(frame['status'].fillna(STATUS_FREE),
+                                     categories=_ordered(frame['status'], STATUSES))
+    for col in ID_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors='coerce').astype('Int32')
+    for col in NAME_COLUMNS:
+        values = frame[col].fillna('').astype(str)
+        frame[col] = pd.Categorical(values, categories=sorted(set(values) | {''}))
+    return frame
+
+
+def _is_list_like(values):
+    return not isinstance(values, str) and pd.api.types.is_list_like(values)
+
+
+# Без этих столбцов строку расписания нельзя привязать к слоту
+REQUIRED_COLUMNS = ['week', 'day', 'time', 'group_id']
+
+
+def schedule_from_json(schedule_data, settings=None):
+    """Расписание из JSON за один проход.
+
+    Принимает список записей (save_current_schedule, schedule_to_records),
+    столбцы в формате DataFrame.to_dict() ({'столбец': {'индекс': значение}})
+    и столбцы списками ({'столбец': [значения]}, schedule_to_lists — так
+    пишутся снимки бэкапов). Недостающие необязательные столбцы заполняются
+    пустыми значениями; без столбцов REQUIRED_COLUMNS — ValueError.
+    """
+    if not schedule_data:
+        return pd.DataFrame()
+    if isinstance(schedule_data, dict) and isinstance(next(iter(schedule_data.values())), list):
+        frame = pd.DataFrame({column: values for column, values in schedule_data.items() if column in LESSON_COLUMNS})
+    elif isinstance(schedule_data, dict):
+        # После JSON индексы стали строками: восстанавливаем исходный порядок строк
+        first = next(iter(schedule_data.values()))
+        keys = sorted(first, key=lambda key: int(key) if str(key).lstrip('-').isdigit() else key)
+        frame = pd.DataFrame({column: [values.get(key) for key in keys]
+                              for column, values in schedule_data.items() if column in LESSON_COLUMNS})
+    elif isinstance(schedule_data, list):
+        frame = pd.DataFrame.from_records(schedule_data)
+        frame = frame[[column for column in LESSON_COLUMNS if column in frame.columns]]
+    else:
+        raise ValueError(f"Неизвестный формат расписания: {type(schedule_data).__name__}")
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"В расписании нет столбцов: {', '.join(missing)}")
+    return compact_schedule(frame, settings)
+
+
+def _add_categories(schedule, column, values):
+    series = schedule[column]
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return
+    if _is_list_like(values):
+        candidates = pd.unique(pd.Series(list(values), dtype=object).dropna())
+    else:
+        candidates = [] if values is None else [values]
+    new = [v for v in candidates if v not in series.cat.categories]
+    if new:
+        schedule[column] = series.cat.add_categories(new)
+
+
+def write_column(schedule, rows, column, values):
+    """schedule.loc[rows, column] = values с добавлением недостающих категорий"""
+    _add_categories(schedule, column, values)
+    if column in ID_COLUMNS and schedule[column].dtype == 'Int32':
+        if _is_list_like(values):
+            values = pd.array([None if pd.isna(v) else int(v) for v in values], dtype='Int32')
+        elif values is not None and not pd.isna(values):
+            values = int(values)
+    schedule.loc[rows, column] = values
+    schedule.attrs['version'] = schedule_version(schedule) + 1
+
+
+def schedule_version(schedule):
+    """Счетчик записей в расписание через write_column: кэши сравнивают его, чтобы не пересчитываться"""
+    return schedule.attrs.get('version', 0)
+
+
+def set_lesson(schedule, rows, **fields):
+    """Записывает поля занятия (subject_id=..., teacher_name=..., status=...) в строки rows"""
+    for column, value in fields.items():
+        write_column(schedule, rows, column, value)
+
+
+def clear_lesson(schedule, rows):
+    """Освобождает слот: пустые поля занятия и статус 'свободно'"""
+    set_lesson(schedule, rows, **{field: (None if field.endswith('_id') else '') for field in LESSON_FIELDS})
+    write_column(schedule, rows, 'status', STATUS_FREE)
+
+
+def python_value(value):
+    """Значение ячейки в виде, пригодном для json.dump (NA -> None, numpy -> int/str)"""
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def schedule_to_columns(schedule):
+    """Расписание в формате DataFrame.to_dict() (по столбцам) для json.dump"""
+    if schedule is None or schedule.empty:
+        return {}
+    return schedule.astype(object).where(schedule.notna(), None).to_dict()
+
+
+def schedule_to_lists(schedule):
+    """Расписание столбцами-списками ({'столбец': [значения]}): самый короткий JSON без ключей строк"""
+    if schedule is None or schedule.empty:
+        return {}
+    return {column: schedule[column].astype(object).where(schedule[column].notna(), None).tolist()
+            for column in schedule.columns}
+
+
+def memory_usage(schedule):
+    """Объем расписания в байтах (с учетом строк в object-столбцах)"""
+    return int(schedule.memory_usage(deep=True).sum())